@@ -5,5 +5,5 @@
 source /home/pmpls13/python-virtual-environments/kucoin/bin/activate
 # Leave line commented if not using virtualenv
 
-python3 ../kucoin/kucoin/runner.py "false" &
-python3 ../gateio/gateio/runner.py "false"
\ No newline at end of file
+# Kucoin and Gate.io are run in a single process
+python3 ../kucoin/kucoin/exchanges.py "false"
\ No newline at end of file
@@ -4,5 +4,5 @@
 # example : source /home/pmpls13/python-virtual-environments/kucoin/bin/activate
 # Leave line commented if not using virtualenv
 
-python3 ../kucoin/kucoin/runner.py "true" &
-python3 ../gateio/gateio/runner.py "true"
\ No newline at end of file
+# Kucoin and Gate.io are run in a single process
+python3 ../kucoin/kucoin/exchanges.py "true"
\ No newline at end of file
@@ -0,0 +1,70 @@
+"""Benchmark of the backtest of the strategies
+
+Compares, on synthetic candles, evaluating the rules of the strategies on
+every candle of every symbol at once with shifted arrays (strategies.rules
+and backtest) against running them like live on the window ending at
+every candle, and checks both give the same signals. The rules reading
+the Stochastic RSI are left out of the check, its exponential average
+depends on the first candle of the window.
+
+Usage (from the gateio/gateio folder):
+
+    python3 -m benchmarks.backtest [symbols] [bars]
+
+"""
+
+import sys
+import time
+import numpy as np
+from backtest import STRATEGIES, Backtest, replay
+from exchange.helpers import MIN_CANDLES
+from strategies.rules import Rule
+from ta_lib import engine
+from benchmarks.helpers import synthetic_candles
+
+
+def run(symbols: int =100, bars: int =400):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    """
+
+    data = synthetic_candles(symbols, bars)
+    panel = engine.Panel(data)
+    rules = {name: rule for name, rule in STRATEGIES.items()
+             if isinstance(rule, Rule) and not any(name.startswith('stoch') for name in rule.indicators)}
+
+    start = time.perf_counter()
+    vectorized = {name: rule.signals(rule.history(data, panel)) for name, rule in rules.items()}
+    shifted = time.perf_counter() - start
+
+    def live(rule):
+        def symbols_of(window):
+            tails = rule.tails(window)
+            return tails.symbols[rule.mask(tails)]
+        return symbols_of
+
+    start = time.perf_counter()
+    replayed = {name: replay(live(rule), panel, step=1) for name, rule in rules.items()}
+    loop = time.perf_counter() - start
+
+    # The replay starts at the first candle with enough candles before it
+    warm = slice(MIN_CANDLES - 1, None)
+    for name in rules:
+        assert np.array_equal(vectorized[name][warm], replayed[name][warm]), name
+
+    backtest = Backtest(STRATEGIES, '1hour')
+    backtest.run(data)
+    print(backtest)
+    print("{} symbols x {} bars, {} rules".format(symbols, bars, len(rules)))
+    print("window by window {:.3f}s | shifted arrays {:.3f}s | {:.0f}x".format(loop, shifted, loop / shifted))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
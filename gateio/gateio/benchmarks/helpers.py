@@ -0,0 +1,148 @@
+"""Helpers shared by the benchmarks
+
+This file can be imported as a module and contains the following functions:
+
+    * synthetic_candles - Random walk candles of many symbols
+    * gbm_candles - Geometric Brownian motion candles with volume regimes
+    * timeit - Best wall time of several calls of a function
+
+"""
+
+import time
+import numpy as np
+import pandas as pd
+from exchange.helpers import TIMEFRAME_SECONDS
+
+
+# Volume regimes of gbm_candles: quiet, normal and active markets, with their
+# volatility multiplier and log volume offset
+REGIME_VOLATILITY = np.array([0.5, 1.0, 2.0])
+REGIME_VOLUME = np.array([-1.0, 0.0, 1.5])
+
+
+def synthetic_candles(symbols: int, bars: int, timeframe: str ='1hour', seed: int =0) -> pd.DataFrame:
+    """
+    Random walk candles of many symbols, laid out like the downloaded ones
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    timeframe : str
+        Timeframe written in the timeframe column
+    seed : int
+        Seed of the random generator
+
+    Returns
+    -------
+    pd.DataFrame
+        Candles of all symbols, in chronological order for every symbol
+    """
+
+    rng = np.random.default_rng(seed)
+    close = np.cumprod(1 + rng.normal(0, 0.01, (symbols, bars)), axis=1) * rng.uniform(0.01, 100, (symbols, 1))
+    open_ = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    spread = np.abs(rng.normal(0, 0.005, (symbols, bars)))
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = rng.lognormal(10, 1, (symbols, bars))
+
+    data = pd.DataFrame({
+        'time': np.tile(np.arange(bars, dtype='int64') * 3600, symbols),
+        'open': open_.ravel(), 'close': close.ravel(), 'high': high.ravel(), 'low': low.ravel(),
+        'volume': volume.ravel(),
+        'symbol': np.repeat(['SYM{}-USDT'.format(i) for i in range(symbols)], bars),
+    })
+    data['timeframe'] = timeframe
+    return data
+
+
+def gbm_candles(symbols: int, bars: int, timeframe: str ='1hour', seed: int =0, drift: float =0.0,
+                volatility: float =0.02, switch: float =0.02) -> pd.DataFrame:
+    """
+    Geometric Brownian motion candles of many symbols, in volume regimes
+
+    Every symbol moves between a quiet, a normal and an active regime, the
+    regime changing with the given probability at every candle. The
+    volatility and the volume of a candle depend on its regime, the
+    volume also grows with the size of the move. The same seed gives the
+    same candles.
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    timeframe : str
+        The timeframe of the candles, their times are its number of seconds apart
+    seed : int
+        Seed of the random generator
+    drift : float
+        Mean log return of a candle
+    volatility : float
+        Standard deviation of the log return of a candle in the normal regime
+    switch : float
+        Probability of a change of regime at every candle
+
+    Returns
+    -------
+    pd.DataFrame
+        Candles of all symbols laid out like the downloaded ones, in
+        chronological order for every symbol
+    """
+
+    rng = np.random.default_rng(seed)
+    # Regime of every candle, the one drawn at the last change
+    changes = rng.random((symbols, bars)) < switch
+    changes[:, 0] = True
+    drawn = rng.integers(0, len(REGIME_VOLATILITY), (symbols, bars))
+    last_change = np.maximum.accumulate(np.where(changes, np.arange(bars), 0), axis=1)
+    regime = np.take_along_axis(drawn, last_change, axis=1)
+
+    sigma = volatility * REGIME_VOLATILITY[regime]
+    shocks = rng.standard_normal((symbols, bars))
+    returns = drift - sigma ** 2 / 2 + sigma * shocks
+    close = np.exp(np.cumsum(returns, axis=1)) * rng.uniform(0.01, 100, (symbols, 1))
+    open_ = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    spread = np.abs(rng.normal(0, 0.5, (symbols, bars))) * sigma
+    high = np.maximum(open_, close) * (1 + spread)
+    low = np.minimum(open_, close) * (1 - spread)
+    volume = np.exp(10 + REGIME_VOLUME[regime] + rng.normal(0, 0.5, (symbols, bars))) * (1 + np.abs(shocks))
+
+    step = TIMEFRAME_SECONDS[timeframe]
+    data = pd.DataFrame({
+        'time': np.tile(np.arange(bars, dtype='int64') * step, symbols),
+        'open': open_.ravel(), 'close': close.ravel(), 'high': high.ravel(), 'low': low.ravel(),
+        'volume': volume.ravel(),
+        'symbol': np.repeat(['SYM{}-USDT'.format(i) for i in range(symbols)], bars),
+    })
+    data['timeframe'] = timeframe
+    return data
+
+
+def timeit(func, repeat: int =3) -> float:
+    """
+    Best wall time of several calls of a function
+
+    Parameters
+    ----------
+    func : callable
+        Function without arguments
+    repeat : int
+        Number of calls
+
+    Returns
+    -------
+    float
+        Seconds taken by the fastest call
+    """
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
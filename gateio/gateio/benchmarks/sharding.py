@@ -0,0 +1,69 @@
+"""Benchmark of the strategies run on shards of symbols in processes
+
+Runs, on synthetic candles, the strategies of a timeframe of the runner
+in a pool of an increasing number of processes, from 1 (the strategies
+run in the calling thread) to the number of cores, and checks every run
+gives the same breakouts in the same order. Also compares writing the candles to shared memory against pickling the
+dataframe of every shard.
+
+Usage (from the gateio/gateio folder):
+
+    python3 -m benchmarks.sharding [symbols] [bars] [timeframe]
+
+"""
+
+import os
+import sys
+import time
+import pickle
+from runner import breakout_strategies
+from sharding import ShardPool, shard_bounds, share, read_shared
+from benchmarks.helpers import synthetic_candles, timeit
+
+
+def run(symbols: int =1000, bars: int =160, timeframe: str ='4hour'):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    timeframe : str
+        Timeframe of the runner whose strategies are run
+    """
+
+    strategies = {timeframe: breakout_strategies('GATEIO')[timeframe]}
+    data = synthetic_candles(symbols, bars, timeframe)
+
+    timings, results = {}, {}
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        with ShardPool(strategies, workers) as pool:
+            start = time.perf_counter()
+            results[workers] = pool.evaluate(timeframe, data)
+            timings[workers] = time.perf_counter() - start
+    assert all(result == results[1] for result in results.values())
+
+    # What the processes are given and read back of the candles of every shard
+    bounds = shard_bounds(data['symbol'].to_numpy())
+
+    def shared():
+        block, layout = share(data)
+        for start, end in bounds:
+            read_shared(block.name, layout, start, end)
+        block.close()
+        block.unlink()
+
+    pickled = timeit(lambda: [pickle.loads(pickle.dumps(data.iloc[start:end])) for start, end in bounds])
+
+    print("{} symbols x {} bars, {} strategies on {}, {} breakouts, {} shards, {} cores".format(
+        symbols, bars, len(strategies[timeframe]), timeframe, len(results[1]), len(bounds), os.cpu_count()))
+    print(" | ".join("{} workers {:.2f}s ({:.1f}x)".format(workers, elapsed, timings[1] / elapsed)
+                     for workers, elapsed in timings.items()))
+    print("candles through shared memory {:.3f}s | pickled shards {:.3f}s".format(timeit(shared), pickled))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]], *sys.argv[3:4])
@@ -0,0 +1,58 @@
+"""Benchmark of the incremental indicators
+
+Compares, on synthetic candles, the time taken to get the indicators of
+every symbol after a new candle closes by calculating them again over the
+whole history with ta_lib.engine, against updating the state kept by
+ta_lib.streaming with the new candle only.
+
+Usage (from the gateio/gateio folder):
+
+    python3 -m benchmarks.streaming [symbols] [bars]
+
+"""
+
+import sys
+import time
+from ta_lib import engine
+from ta_lib.streaming import StreamingIndicators
+from benchmarks.helpers import synthetic_candles, timeit
+
+
+def run(symbols: int =1000, bars: int =160):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    """
+
+    data = synthetic_candles(symbols, bars + 1)
+    history = data[data.time < bars * 3600]
+    new_candles = data[data.time == bars * 3600]
+
+    def recalculated():
+        panel = engine.Panel(data)
+        return [engine.sma(panel, 'close', 25), engine.sma(panel, 'open', 25), engine.tenkan_sen(panel),
+                engine.kinjun_sen(panel), engine.senkou_span_a(panel), engine.senkou_span_b(panel),
+                engine.bollinger_bands(panel), engine.stoch_rsi(panel)]
+
+    streaming = StreamingIndicators()
+    start = time.perf_counter()
+    streaming.warm_up(history)
+    warm_up = time.perf_counter() - start
+
+    start = time.perf_counter()
+    streaming.warm_up(new_candles)
+    update = time.perf_counter() - start
+
+    print("{} symbols x {} bars".format(symbols, bars))
+    print("whole history {:.3f}s | one candle per symbol {:.4f}s | warm up once {:.2f}s".format(
+        timeit(recalculated), update, warm_up))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,269 @@
+"""Benchmark suite of every stage of a run, written as JSON
+
+Times separately, on candles of gbm_candles, every stage a run goes
+through once the candles are downloaded:
+
+    * parse - the bodies of the responses of the candles endpoint into
+      the dataframe, with parse_candles and with exchange.parsing, also
+      reported in candles per second
+    * panel - the panel the indicators are calculated on
+    * indicator - every indicator of ta_lib.engine
+    * strategy - every strategy of strategies.strategies
+    * sr - the support and resistance detection
+    * pipeline - the strategies of the runner on chunks of 100 symbols,
+      through the pipeline without downloads
+
+for every number of symbols at the first number of bars, and for every
+number of bars at the first number of symbols, 100 to 5000 symbols and
+160 to 5000 bars by default. The results are written to a JSON file,
+data/benchmarks/suite-gateio-<commit>.json by default, and compared with the
+ones of another commit when given.
+
+Usage (from the gateio/gateio folder):
+
+    python3 -m benchmarks.suite [--symbols 100 500 ...] [--bars 160 500 ...] [--compare file]
+
+This file can be imported as a module and contains the following:
+
+    * run - Times every stage for every size
+    * compare - Ratio of the timings of two suites
+
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import contextlib
+from functools import partial
+import numpy as np
+import pandas as pd
+from ta_lib import engine
+from exchange.helpers import parse_candles, EXCHANGE, COLUMNS
+from exchange.parsing import decode_candles, candle_frame
+from strategies import strategies
+from pipeline import Pipeline, chunks
+from runner import breakout_strategies
+from benchmarks.helpers import gbm_candles, timeit
+
+
+SYMBOLS=[100, 500, 1000, 2000, 5000]       # Symbols of the scaling over the symbols
+BARS=[160, 500, 1000, 2000, 5000]          # Bars of the scaling over the bars
+REPEAT=3                                   # Calls of a stage, the fastest one is kept
+THRESHOLD=0.10                             # Slowdown shown as a regression by compare
+SUITE_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'data', 'benchmarks')
+
+INDICATORS_TIMED: dict = {
+    'sma': partial(engine.sma, column='close', period=25),
+    'tenkan_sen': engine.tenkan_sen,
+    'kinjun_sen': engine.kinjun_sen,
+    'senkou_span_a': engine.senkou_span_a,
+    'senkou_span_b': engine.senkou_span_b,
+    'chikou_span': engine.chikou_span,
+    'bollinger_bands': engine.bollinger_bands,
+    'stoch_rsi': engine.stoch_rsi,
+}
+STRATEGIES_TIMED: dict = {
+    'ichimoku_breakout': partial(strategies.ichimoku_breakout, timeframe='1h', exchange=EXCHANGE),
+    'bb_rsi_breakout': partial(strategies.bb_rsi_breakout, exchange=EXCHANGE),
+    'ma_vol_breakout': partial(strategies.ma_vol_breakout, exchange=EXCHANGE),
+    'sr_breakout': partial(strategies.sr_breakout, exchange=EXCHANGE),
+}
+
+
+def responses(data: pd.DataFrame) -> list:
+    """Bodies of the responses of the candles endpoint of every symbol, oldest first and as strings"""
+
+    return [(symbol, json.dumps([[str(value) for value in row] for row in
+                                 group[COLUMNS].to_numpy(dtype=object).tolist()]).encode())
+            for symbol, group in data.groupby('symbol', sort=False)]
+
+
+def parse_bodies(raw: list) -> pd.DataFrame:
+    """Candles of the bodies decoded to strings and converted a symbol at a time"""
+
+    return pd.concat([parse_candles(symbol, json.loads(body), 0) for symbol, body in raw], ignore_index=True)
+
+
+def decode_bodies(raw: list) -> pd.DataFrame:
+    """Candles of the bodies decoded to floats and written into one block"""
+
+    return candle_frame([symbol for symbol, _ in raw], [decode_candles(body) for _, body in raw])
+
+
+def run_pipeline(data: pd.DataFrame):
+    """Runs the strategies of the runner on chunks of the candles, every timeframe on the same candles"""
+
+    timeframes = breakout_strategies(EXCHANGE)
+    symbols = data.symbol.unique().tolist()
+    bounds = np.searchsorted(data.symbol.to_numpy(), [chunk[0] for chunk in chunks(symbols)])
+
+    def fetch():
+        for start, end in zip(bounds, list(bounds[1:]) + [len(data)]):
+            chunk = data.iloc[start:end]
+            for timeframe in timeframes:
+                yield timeframe, chunk.assign(timeframe=timeframe)
+
+    Pipeline(fetch, timeframes, lambda breakout: None).run()
+
+
+def time_stages(symbols: int, bars: int, seed: int =0, repeat: int =REPEAT) -> list:
+    """
+    Times every stage on candles of a size
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    seed : int
+        Seed of the candles
+    repeat : int
+        Calls of every stage, the fastest one is kept
+
+    Returns
+    -------
+    list of dicts
+        Stage, name, symbols, bars and seconds of every timing, and the
+        candles per second of the parse stages
+    """
+
+    data = gbm_candles(symbols, bars, seed=seed)
+    # The symbols sort like their rows, chunks of them are found with searchsorted
+    data = data.sort_values(['symbol', 'time'], kind='stable').reset_index(drop=True)
+    raw = responses(data)
+    panel = engine.Panel(data)
+
+    stages = [('parse', 'parse_candles', partial(parse_bodies, raw)),
+              ('parse', 'decode_candles', partial(decode_bodies, raw)),
+              ('panel', 'Panel', lambda: engine.Panel(data))]
+    stages += [('indicator', name, partial(indicator, panel)) for name, indicator in INDICATORS_TIMED.items()]
+    stages += [('strategy', name, partial(strategy, data, [])) for name, strategy in STRATEGIES_TIMED.items()]
+    stages += [('sr', 'sr_signals', lambda: strategies.sr_signals(data)),
+               ('pipeline', 'breakout_strategies', partial(run_pipeline, data))]
+
+    results = []
+    for stage, name, func in stages:
+        # The strategies print their signals
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            seconds = timeit(func, repeat)
+        results.append({'stage': stage, 'name': name, 'symbols': symbols, 'bars': bars, 'seconds': seconds})
+        rate = ''
+        if stage == 'parse':
+            results[-1]['candles_per_second'] = symbols * bars / seconds
+            rate = " {:>12,.0f} candles/s".format(results[-1]['candles_per_second'])
+        print("{:>5} symbols x {:>5} bars | {:<9} {:<20} {:>9.4f}s{}".format(symbols, bars, stage, name, seconds, rate))
+    return results
+
+
+def commit() -> str:
+    """Commit of the tree the suite runs on, None outside of git"""
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(symbols: list =SYMBOLS, bars: list =BARS, seed: int =0, repeat: int =REPEAT) -> dict:
+    """
+    Times every stage for every size
+
+    Parameters
+    ----------
+    symbols : list
+        Numbers of symbols, run with the first number of bars
+    bars : list
+        Numbers of bars, run with the first number of symbols
+    seed : int
+        Seed of the candles
+    repeat : int
+        Calls of every stage, the fastest one is kept
+
+    Returns
+    -------
+    dict
+        The environment of the run under meta, the timings under results
+    """
+
+    sizes = [(count, bars[0]) for count in symbols] + [(symbols[0], count) for count in bars[1:]]
+    results = []
+    for size in dict.fromkeys(sizes):
+        results += time_stages(*size, seed, repeat)
+
+    return {'meta': {'exchange': EXCHANGE, 'commit': commit(), 'time': int(time.time()), 'seed': seed,
+                     'repeat': repeat, 'python': platform.python_version(), 'numpy': np.__version__,
+                     'pandas': pd.__version__, 'cores': os.cpu_count()},
+            'results': results}
+
+
+def compare(old: dict, new: dict, threshold: float =THRESHOLD) -> list:
+    """
+    Ratio of the timings of two suites
+
+    Parameters
+    ----------
+    old : dict
+        Suite compared against
+    new : dict
+        Suite compared
+    threshold : float
+        Slowdown over which a timing is a regression
+
+    Returns
+    -------
+    list of dicts
+        Stage, name, symbols, bars, both timings and their ratio of every
+        timing in both suites, with whether it regressed
+    """
+
+    before = {(result['stage'], result['name'], result['symbols'], result['bars']): result['seconds']
+              for result in old['results']}
+    compared = []
+    for result in new['results']:
+        key = (result['stage'], result['name'], result['symbols'], result['bars'])
+        if key in before and before[key] > 0:
+            ratio = result['seconds'] / before[key]
+            compared.append({**result, 'before': before[key], 'ratio': ratio, 'regression': ratio > 1 + threshold})
+    return compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite of every stage of a run')
+    parser.add_argument('--symbols', type=int, nargs='+', default=SYMBOLS)
+    parser.add_argument('--bars', type=int, nargs='+', default=BARS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--output', help='JSON file of the results, in data/benchmarks by default')
+    parser.add_argument('--compare', help='JSON file of a previous suite to compare with')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    suite = run(args.symbols, args.bars, args.seed, args.repeat)
+    output = args.output or os.path.join(SUITE_PATH, 'suite-{}-{}.json'.format(
+        EXCHANGE.lower(), suite['meta']['commit'] or 'local'))
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(suite, file, indent=1)
+    print("Results written to {}".format(output))
+
+    if args.compare:
+        with open(args.compare) as file:
+            compared = compare(json.load(file), suite, args.threshold)
+        for result in compared:
+            print("{:>5} symbols x {:>5} bars | {:<9} {:<20} {:>9.4f}s -> {:>9.4f}s {:>6.2f}x{}".format(
+                result['symbols'], result['bars'], result['stage'], result['name'], result['before'],
+                result['seconds'], result['ratio'], ' REGRESSION' if result['regression'] else ''))
+        regressions = sum(result['regression'] for result in compared)
+        print("{} timings compared, {} regressions".format(len(compared), regressions))
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""Long running mode keeping the candles in memory between runs
+
+A scheduled run of find_breakouts starts from nothing: it downloads the
+list of symbols and the whole window of candles of every symbol again,
+although only the last candle changed since the previous run. This script
+keeps the symbols and the window of candles of every timeframe in memory
+from one candle close to the next, downloads only the new candles at
+every close and runs the strategies on the updated windows. The
+timeframes kept and their number of candles are the ones of the fetch
+plan (planner), compared with what every tick downloaded.
+
+The buffers are ring buffers holding a fixed number of candles per
+symbol (exchange.ring), and when the memory of the process goes over a
+ceiling they are dropped and rebuilt at the next close. Every tick
+reports its latency and the memory used.
+
+This file can be imported as a module and contains the following:
+
+    * CandleBuffer - Window of candles of a timeframe kept between ticks
+    * Daemon - Runs the strategies at every close on the buffered candles
+    * memory_usage - Resident memory of the process
+
+"""
+
+import gc
+import os
+import time
+import pandas as pd
+from exchange.exchange import get_all_symbols, get_all_candles, FetchStats, FetchSession
+from exchange.helpers import MIN_CANDLES, WINDOW, TIMEFRAME_SECONDS, window_start
+from exchange.store import CandleStore
+from exchange.ring import CandleRing
+from pipeline import Pipeline
+from planner import FetchPlan
+
+
+MAX_MEMORY=1024         # MB of resident memory before the buffers are dropped
+SYMBOLS_TTL=86400       # Seconds the list of symbols is kept before downloading it again
+
+
+def memory_usage() -> int:
+    """
+    Resident memory of the process
+
+    Returns
+    -------
+    int
+        Bytes, the peak resident memory where /proc is not available
+    """
+
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class CandleBuffer:
+    """
+    Window of candles of a timeframe kept between ticks
+
+    The candles are held in a CandleRing, adding the new candles of a tick
+    writes them in place instead of building a new frame.
+
+    Attributes
+    ----------
+    timeframe : str
+        The timeframe of the candles
+    bars : int
+        Number of candles kept for every symbol
+    ring : CandleRing
+        Candles of every symbol, None until the first download
+    symbols : list
+        Symbols listed on the exchange, in the order of the frames
+    """
+
+    def __init__(self, timeframe: str, bars: int =WINDOW):
+        self.timeframe = timeframe
+        self.bars = bars
+        self.ring = None
+        self.symbols = []
+
+    @property
+    def is_warm(self) -> bool:
+        return self.ring is not None
+
+    def last_times(self) -> dict:
+        """
+        Time of the last candle of every symbol
+
+        Returns
+        -------
+        dict
+            Symbol to unix timestamp of its last candle
+        """
+
+        return self.ring.last_times()
+
+    def update(self, new_data: pd.DataFrame, symbols: list):
+        """
+        Adds the new candles, replacing the held ones with the same time,
+        and drops the delisted symbols
+
+        Parameters
+        ----------
+        new_data : pd.DataFrame
+            Candles downloaded since the last update
+        symbols : list
+            Symbols listed on the exchange, the rows are kept in this order
+        """
+
+        if self.ring is None:
+            # One more candle than the window, the candle not closed yet
+            self.ring = CandleRing(self.bars + 1, len(symbols))
+        # The last candle held is downloaded again, it was not closed yet
+        self.ring.extend(new_data)
+        self.ring.retain(symbols)
+        self.symbols = list(symbols)
+
+    def window(self, bars: int =None, min_candles: int =None) -> pd.DataFrame:
+        """
+        Last candles of every symbol with enough of them for the indicators
+
+        Parameters
+        ----------
+        bars : int
+            Number of candles of the window, every candle kept if not given
+        min_candles : int
+            Symbols with fewer candles are left out, MIN_CANDLES (at most
+            the window) if not given
+
+        Returns
+        -------
+        pd.DataFrame
+            The candles inside the window
+        """
+
+        bars = bars if bars is not None else self.bars
+        min_candles = min_candles if min_candles is not None else min(MIN_CANDLES, bars)
+        data = self.ring.frame(self.symbols, bars + 1, window_start(self.timeframe, bars), min_candles)
+        data['timeframe'] = self.timeframe
+        return data
+
+    def memory(self) -> int:
+        """Bytes used by the candles"""
+
+        return self.ring.nbytes if self.ring is not None else 0
+
+    def clear(self):
+        self.ring = None
+
+
+class Daemon:
+    """
+    Runs the strategies at every close on the buffered candles
+
+    Attributes
+    ----------
+    plan : FetchPlan
+        Timeframes downloaded and their number of candles
+    buffers : dict
+        Timeframe to CandleBuffer of the downloaded timeframes
+    strategies : dict
+        Timeframe to list of strategies, as given to Pipeline
+    notify : callable
+        Called with every breakout found
+    frames : callable
+        Builds the candles given to the strategies from the buffers, every
+        buffer's window by default
+    caches : list
+        Caches printed and cleared after every tick
+    max_memory : float
+        MB of resident memory before the buffers are dropped
+    pool : ShardPool
+        Pool running the strategies on shards of symbols, in the calling
+        thread if not given
+    """
+
+    def __init__(self, plan: FetchPlan, strategies: dict, notify, frames=None, caches: list =(),
+                 max_memory: float =MAX_MEMORY, symbols_ttl: float =SYMBOLS_TTL, pool=None):
+        self.plan = plan
+        self.buffers = {timeframe: CandleBuffer(timeframe, bars) for timeframe, bars in plan.fetched.items()}
+        self.strategies = strategies
+        self.notify = notify
+        self.frames = frames if frames is not None else \
+            (lambda buffers: {timeframe: buffer.window() for timeframe, buffer in buffers.items()})
+        self.caches = list(caches)
+        self.max_memory = max_memory
+        self.symbols_ttl = symbols_ttl
+        self.pool = pool
+        self.symbols = None
+        self.symbols_time = 0.0
+        self.ticks = 0
+
+    def refresh_symbols(self):
+        """Downloads the list of symbols again once it is too old"""
+
+        if self.symbols is None or time.time() - self.symbols_time >= self.symbols_ttl:
+            self.symbols = get_all_symbols()
+            self.symbols_time = time.time()
+
+    def download(self):
+        """Downloads the new candles of every buffer, the whole window of a cold one"""
+
+        stats = {}
+        # One loop and pool of connections for the timeframes of the tick
+        with FetchSession() as session:
+            for timeframe, buffer in self.buffers.items():
+                stats[timeframe] = FetchStats(timeframe)
+                if buffer.is_warm:
+                    new_data = get_all_candles(self.symbols, timeframe, bars=buffer.bars, stats=stats[timeframe],
+                                               since=buffer.last_times(), session=session)
+                else:
+                    store = CandleStore()
+                    new_data = get_all_candles(self.symbols, timeframe, store, buffer.bars, stats[timeframe],
+                                               session=session)
+                    store.close()
+                buffer.update(new_data, self.symbols)
+                print(stats[timeframe])
+        print(self.plan.report(stats, len(self.symbols)))
+
+    def tick(self):
+        """Updates the buffers and runs the strategies on them"""
+
+        start = time.perf_counter()
+        seconds = min(TIMEFRAME_SECONDS[timeframe] for timeframe in self.strategies)
+        since_close = time.time() % seconds
+        self.ticks += 1
+        cold = [timeframe for timeframe, buffer in self.buffers.items() if not buffer.is_warm]
+
+        self.refresh_symbols()
+        self.download()
+        downloaded = time.perf_counter() - start
+
+        pipeline = Pipeline(lambda: iter(self.frames(self.buffers).items()), self.strategies, self.notify,
+                            pool=self.pool)
+        pipeline.run()
+        print(pipeline)
+
+        for cache in self.caches:
+            print(cache)
+            cache.clear()
+
+        memory = memory_usage() / 2**20
+        buffered = sum(buffer.memory() for buffer in self.buffers.values()) / 2**20
+        print("Tick {}{}: {} symbols, download {:.2f}s, tick {:.2f}s, started {:.1f}s after the close "
+              "| buffers {:.1f} MB, process {:.1f} MB".format(
+            self.ticks, " (cold: {})".format(', '.join(cold)) if cold else "", len(self.symbols),
+            downloaded, time.perf_counter() - start, since_close, buffered, memory))
+
+        if memory > self.max_memory:
+            # Dropped buffers are downloaded again at the next close
+            for buffer in self.buffers.values():
+                buffer.clear()
+            gc.collect()
+            print("Memory over {} MB, buffers dropped: process {:.1f} MB".format(
+                self.max_memory, memory_usage() / 2**20))
@@ -1,25 +1,25 @@
 """Implementation of functions to retrieve data from Kucoin API
 
-This script and its child (helpers.py) contains three functions to retrieve data from the Kucoin API.
+This script and its children (helpers.py, fetcher.py) contains four functions to retrieve data from the Kucoin API.
 
 This file can be imported as a module and contains the following functions:
 
     * get_all_symbols - Creates and returns the list of tradable USDT pairs on Kucoin spot
     * get_candles_for_symbol - Gets all candles for the given symbol and timeframe, putting them in a df
     * get_all_candles - Gets all candles for the given symbols and timeframe, putting them in a df
+    * get_all_candles_threaded - Same as get_all_candles using one thread per group of 10 symbols
+    * get_server_time - Gets the current time of the exchange server
     
 """
 
 import requests as rq
-import time
+import asyncio
 import pandas as pd
 import threading
-from exchange.helpers import get_candles_for_symbol
-
-# Constants
-BASE_URL="https://api.gateio.ws/api/v4"
-SYMBOLS_EP="/spot/currency_pairs"
-MARKET_EP="/spot/candlesticks"
+from exchange.helpers import *
+from exchange.fetcher import FetchStats, FetchSession, fetch_all_candles
+from exchange.store import CandleStore
+from exchange.ratelimit import call_with_retry
 
 
 def get_all_symbols() -> list:
@@ -43,8 +43,7 @@ def get_all_symbols() -> list:
         If the list of symbols is empty after the API call was succesful
     """
 
-    headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-    response: dict = rq.get(BASE_URL + SYMBOLS_EP, headers=headers)
+    response: dict = rq.get(BASE_URL + SYMBOLS_EP, headers=HEADERS)
     
     if response.status_code == 200:
         margin_values: tuple = ("3S", "3L", "5S", "5L", "10S", "10L")
@@ -61,10 +60,51 @@ def get_all_symbols() -> list:
         raise Exception("APICallError: {}".format(response.status_code))
     
     
-def get_all_candles(symbols: list, timeframe: str) -> pd.DataFrame:
+def get_all_candles(symbols: list, timeframe: str, store: CandleStore =None,
+                    bars: int =WINDOW, stats: FetchStats =None, since: dict =None,
+                    session: FetchSession =None) -> pd.DataFrame:
     """
     Gets all candles for the given symbols and timeframe, putting them in a df
 
+    Parameters
+    ----------
+    symbols : list
+        List of symbols to download data of
+    timeframe : str
+        The timeframe to download the candles for
+    store : CandleStore
+        Local store of candles, only the new candles are downloaded if given
+    bars : int
+        Number of candles to download for every symbol
+    stats : FetchStats
+        Counters to add to, printed here only when not given
+    since : dict
+        Time of the last candle already held of every symbol, only the
+        candles from it onwards are downloaded if given
+    session : FetchSession
+        Event loop and connections of the run, a loop and connections are
+        opened for this download only if not given
+
+    Returns
+    -------
+    pd.DataFrame : The dataframe with all candles
+    """
+    
+    shown = stats is None
+    stats = stats if stats is not None else FetchStats(timeframe)
+    download = fetch_all_candles(symbols, timeframe, stats=stats, store=store, bars=bars, since=since,
+                                 session=session)
+    data = session.run(download) if session is not None else asyncio.run(download)
+    if shown:
+        print(stats)
+    return data
+
+
+def get_all_candles_threaded(symbols: list, timeframe: str) -> pd.DataFrame:
+    """
+    Gets all candles for the given symbols and timeframe, putting them in a df,
+    using one thread per group of 10 symbols
+
     Parameters
     ----------
     symbols : list
@@ -108,23 +148,17 @@ def get_all_candles(symbols: list, timeframe: str) -> pd.DataFrame:
             data_lock : threading.Lock
                 Lock to prevent multiple accesses to memory
         """
-        columns: list = ['time', 'volume', 'close', 'high', 'low', 'open']
         for symbol in symbols:
-            while True:
-                try:
-                    candles: list = get_candles_for_symbol(symbol, timeframe)
-                    if isinstance(candles, list):
-                        break
-                    else:
-                        continue
-                except BaseException as e:
-                    print(e)
-                    time.sleep(10)
-                    continue
+            try:
+                candles: list = call_with_retry(lambda: get_candles_for_symbol(symbol, timeframe),
+                                                RATE_LIMITER, RETRY_POLICY, CANDLES_BREAKER)
+            except Exception as e:
+                print(e)
+                continue
             
-            if len(candles) >= 150:
-                new_data: pd.DataFrame = pd.DataFrame(candles, columns=columns)
-                new_data['symbol'] = symbol
+            new_data: pd.DataFrame = parse_candles(symbol, candles)
+            
+            if new_data is not None:
                 with data_lock:
                     data_list.append(new_data)
                     
@@ -133,9 +167,6 @@ def get_all_candles(symbols: list, timeframe: str) -> pd.DataFrame:
                     with data_lock:
                         symbols.remove(symbol)
                     
-    types: dict = {'time': 'int64', 'volume': 'float64', 'close': 'float64', 
-                    'high': 'float64', 'low': 'float64', 'open': 'float64', 
-                    'symbol': 'str'}
     data_lock = threading.Lock()
     data: pd.DataFrame = pd.DataFrame()
     data_list = []
@@ -151,7 +182,29 @@ def get_all_candles(symbols: list, timeframe: str) -> pd.DataFrame:
         t.join()
         
     data = pd.concat(data_list, ignore_index=True)
-    data = data.astype(types)
     data['timeframe'] = timeframe
     return data
-    
\ No newline at end of file
+    
+
+
+def get_server_time() -> float:
+    """
+    Gets the current time of the exchange server
+
+    Returns
+    -------
+    float
+        Unix timestamp in seconds
+
+    Raises
+    ------
+    APICallError
+        If the API call fails
+    """
+
+    response: dict = rq.get(BASE_URL + SERVER_TIME_EP, headers=HEADERS, timeout=REQUEST_TIMEOUT)
+
+    if response.status_code == 200:
+        return response.json()['server_time'] / 1000
+    else:
+        raise APICallError(response.status_code, retry_after(response.headers))
@@ -0,0 +1,275 @@
+"""Asynchronous download of candles from the Gate.io API
+
+This script downloads the candles of many symbols concurrently over a
+single pool of keep-alive connections, instead of starting one thread per
+group of symbols.
+
+This file can be imported as a module and contains the following:
+
+    * FetchStats - Throughput counters of a download run
+    * FetchSession - Event loop and connections kept for the downloads of a run
+    * fetch_candles - Coroutine downloading the candles of one symbol
+    * fetch_all_candles - Coroutine downloading the candles of the given symbols
+
+"""
+
+import asyncio
+import time
+import aiohttp
+import numpy as np
+import pandas as pd
+from exchange.helpers import *
+from exchange.store import CandleStore
+from exchange.ratelimit import call_with_retry_async
+from exchange.parsing import decode_candles, candle_frame
+from metrics import METRICS
+
+
+class FetchStats:
+    """
+    Throughput counters of a download run
+
+    Attributes
+    ----------
+    timeframe : str
+        The timeframe that was downloaded
+    symbols : int
+        Number of symbols whose candles were downloaded
+    requests : int
+        Number of HTTP requests sent, retries included
+    errors : int
+        Number of requests that failed
+    retries : int
+        Number of requests that were sent again after failing
+    candles : int
+        Number of candles downloaded
+    given_up : int
+        Number of symbols left out after exhausting their retries
+    bytes : int
+        Size of all response bodies
+    elapsed : float
+        Wall time of the run in seconds
+    """
+
+    def __init__(self, timeframe: str):
+        self.timeframe = timeframe
+        self.symbols = 0
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.candles = 0
+        self.given_up = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def symbols_per_second(self) -> float:
+        return self.symbols / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self) -> str:
+        return ("{}: {} symbols, {} requests ({} errors, {} retries, {} given up), {} candles in {:.2f}s "
+                "| {:.1f} symbols/s | {:.1f} KB/s").format(
+            self.timeframe, self.symbols, self.requests, self.errors, self.retries, self.given_up,
+            self.candles, self.elapsed, self.symbols_per_second, self.bytes_per_second / 1024)
+
+
+class FetchSession:
+    """
+    Event loop and connections kept for the downloads of a run
+
+    A run downloads its candles chunk by chunk and timeframe by timeframe.
+    Starting an event loop and opening a session for every download would
+    open new connections, and go through their TCP and TLS handshakes,
+    every time. The downloads given a session run in its loop and share its
+    keep-alive connections.
+
+    Attributes
+    ----------
+    loop : asyncio.AbstractEventLoop
+        The loop the downloads run in, from the thread using the session
+    timeout : float
+        Seconds before a single request is abandoned
+    """
+
+    def __init__(self, timeout: float =REQUEST_TIMEOUT):
+        self.timeout = timeout
+        self.loop = asyncio.new_event_loop()
+        self.client = None
+
+    def run(self, coroutine):
+        """Runs a coroutine in the loop of the session and returns its result"""
+
+        return self.loop.run_until_complete(coroutine)
+
+    async def connections(self) -> aiohttp.ClientSession:
+        """HTTP session shared by the downloads, opened by the first one"""
+
+        if self.client is None:
+            # Every download limits its own requests in flight, the pool is not limited
+            self.client = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0),
+                                                timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.client
+
+    def close(self):
+        """Closes the connections and the loop"""
+
+        if self.client is not None:
+            self.run(self.client.close())
+            self.client = None
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+async def fetch_candles(session: aiohttp.ClientSession, semaphore: asyncio.Semaphore,
+                        symbol: str, timeframe: str, stats: FetchStats, since: int =None,
+                        bars: int =WINDOW) -> np.ndarray:
+    """
+    Downloads the candles of one symbol under the rate limiter of the
+    exchange, retrying failed requests according to its retry policy
+
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        Session holding the pool of connections
+    semaphore : asyncio.Semaphore
+        Global limit of requests in flight
+    symbol : str
+        The symbol to download the candles for
+    timeframe : str
+        The timeframe to download the candles for
+    stats : FetchStats
+        Counters updated with every request
+    since : int
+        Timestamp of the last stored candle of the symbol, if any
+    bars : int
+        Number of candles of the window
+
+    Returns
+    -------
+    np.ndarray
+        The candles decoded into floats, in the order of the response, or
+        None if every attempt failed
+    """
+
+    async def request() -> np.ndarray:
+        async with semaphore:
+            stats.requests += 1
+            METRICS.inc('requests_total', exchange=EXCHANGE, timeframe=timeframe)
+            with METRICS.timer('request_seconds', exchange=EXCHANGE, timeframe=timeframe):
+                async with session.get(BASE_URL + MARKET_EP, headers=HEADERS,
+                                       params=candle_params(symbol, timeframe, since, bars)) as response:
+                    METRICS.inc('responses_total', exchange=EXCHANGE, status=response.status)
+                    body = await response.read()
+                    stats.bytes += len(body)
+                    if response.status != 200:
+                        raise APICallError(response.status, retry_after(response.headers))
+        # Decoded into floats from the raw body, TypeError if the response has no candles
+        return decode_candles(body)
+
+    def retried(error: Exception):
+        stats.errors += 1
+        stats.retries += 1
+        METRICS.inc('retries_total', exchange=EXCHANGE, timeframe=timeframe)
+
+    try:
+        candles = await call_with_retry_async(request, RATE_LIMITER, RETRY_POLICY, CANDLES_BREAKER, retried)
+    except Exception:
+        stats.errors += 1
+        stats.given_up += 1
+        METRICS.inc('given_up_total', exchange=EXCHANGE, timeframe=timeframe)
+        return None
+    stats.candles += len(candles)
+    return candles
+
+
+async def fetch_all_candles(symbols: list, timeframe: str, concurrency: int =MAX_CONCURRENCY,
+                            timeout: float =REQUEST_TIMEOUT, stats: FetchStats =None,
+                            store: CandleStore =None, bars: int =WINDOW, since: dict =None,
+                            session: FetchSession =None) -> pd.DataFrame:
+    """
+    Downloads the candles of the given symbols concurrently
+
+    Parameters
+    ----------
+    symbols : list
+        List of symbols to download data of
+    timeframe : str
+        The timeframe to download the candles for
+    concurrency : int
+        Maximum number of requests in flight at the same time
+    timeout : float
+        Seconds before a single request is abandoned, the one of the
+        session when a session is given
+    stats : FetchStats
+        Counters to add to, a new one is used if not given, so one
+        FetchStats can follow the downloads of several chunks of symbols
+    store : CandleStore
+        Local store of candles, when given only the candles after the last
+        stored one are downloaded and the window is read back from it
+    bars : int
+        Number of candles of the window
+    since : dict
+        Time of the last candle already held of every symbol, when given
+        without a store only the candles from it onwards are downloaded
+    session : FetchSession
+        Session whose connections are used, new connections are opened
+        and closed for this download if not given
+
+    Returns
+    -------
+    pd.DataFrame : The dataframe with all candles
+    """
+
+    stats = stats if stats is not None else FetchStats(timeframe)
+    start = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+    last_times = store.last_times(timeframe) if store is not None else (since or {})
+
+    def download(client: aiohttp.ClientSession):
+        return asyncio.gather(*[fetch_candles(client, semaphore, symbol, timeframe, stats,
+                                              last_times.get(symbol), bars)
+                                for symbol in symbols])
+
+    if session is not None:
+        results = await download(await session.connections())
+    else:
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector,
+                                         timeout=aiohttp.ClientTimeout(total=timeout)) as client:
+            results = await download(client)
+
+    # Results come back in the order of the symbols, so the frame is built
+    # in the same order whatever the completion order of the requests was
+    # A window shorter than MIN_CANDLES is all the strategies of the timeframe read
+    min_candles = min(MIN_CANDLES, bars) if store is None and since is None else 0
+    kept = [(symbol, candles) for symbol, candles in zip(symbols, results)
+            if candles is not None and len(candles) >= min_candles]
+    # The candles of every symbol are written into one block instead of a dataframe each
+    data = candle_frame(*zip(*kept)) if kept else pd.DataFrame(columns=list(TYPES))
+
+    if store is not None:
+        # Merge the new candles into the store and read the whole window back,
+        # only for the symbols that could be downloaded in this run
+        store.save(data, timeframe)
+        data = store.load([symbol for symbol, candles in kept if len(candles)],
+                          timeframe, window_start(timeframe, bars))
+        counts = data.groupby('symbol', sort=False).time.transform('size')
+        data = data[counts >= min(MIN_CANDLES, bars)].reset_index(drop=True)
+
+    stats.symbols += data.symbol.nunique()
+    elapsed = time.perf_counter() - start
+    stats.elapsed += elapsed
+    METRICS.observe('fetch_seconds', elapsed, exchange=EXCHANGE, timeframe=timeframe)
+
+    data['timeframe'] = timeframe
+    return data
+
@@ -0,0 +1,352 @@
+"""Rate limiting and retry policy of the requests sent to the exchange
+
+This script keeps the requests of a whole run under the public rate limit
+of the exchange and decides what to do when a request fails, instead of
+retrying every failure forever every 10 seconds.
+
+This file can be imported as a module and contains the following:
+
+    * APICallError - Error raised when the exchange answers with an error
+    * CircuitOpenError - Error raised when the endpoint is given up on
+    * TokenBucket - Token bucket shared by all requests to an exchange
+    * RetryPolicy - Bounded exponential backoff with jitter
+    * CircuitBreaker - Stops calling an endpoint failing over and over
+    * call_with_retry - Calls a function under the limiter, policy and breaker
+    * call_with_retry_async - Same as call_with_retry for coroutines
+
+"""
+
+import asyncio
+import random
+import threading
+import time
+import aiohttp
+import requests as rq
+
+
+# Failures of the connection rather than answers of the exchange, of the
+# asynchronous downloads (aiohttp) and of the threaded ones (requests)
+NETWORK_ERRORS: tuple = (aiohttp.ClientError, asyncio.TimeoutError, rq.ConnectionError, rq.Timeout)
+
+
+class APICallError(Exception):
+    """
+    Error raised when the exchange answers with an error
+
+    Attributes
+    ----------
+    status_code : int
+        HTTP status of the response
+    retry_after : float
+        Seconds the exchange asked to wait before retrying, if any
+    """
+
+    def __init__(self, status_code: int, retry_after: float =None):
+        super().__init__("APICallError: {}".format(status_code))
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    """Error raised when the endpoint is failing and is not called anymore"""
+
+
+class TokenBucket:
+    """
+    Token bucket shared by all requests to an exchange
+
+    Every request takes a token, tokens are refilled at a constant rate up to
+    the capacity of the bucket. A request that finds the bucket empty reserves
+    the next token and waits for it, so waiting requests are served in order.
+
+    Attributes
+    ----------
+    rate : float
+        Tokens added per second
+    capacity : float
+        Maximum number of tokens, i.e. size of a burst
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes a token
+
+        Returns
+        -------
+        float
+            Seconds to wait before the token can be used
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self):
+        """Blocks until a token is available"""
+
+        wait = self.reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Waits without blocking the event loop until a token is available"""
+
+        wait = self.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class RetryPolicy:
+    """
+    Bounded exponential backoff with jitter
+
+    Attributes
+    ----------
+    max_retries : int
+        Number of retries after the first attempt
+    base_delay : float
+        Delay before the first retry in seconds
+    max_delay : float
+        Maximum delay between two attempts in seconds
+    """
+
+    def __init__(self, max_retries: int, base_delay: float, max_delay: float):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: float =None) -> float:
+        """
+        Delay before the next attempt ("full jitter" backoff)
+
+        Parameters
+        ----------
+        attempt : int
+            Number of the attempt that failed, starting at 0
+        retry_after : float
+            Delay asked by the exchange, it is never waited less than that
+
+        Returns
+        -------
+        float
+            Seconds to wait
+        """
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """
+        Decides if a failed request is worth retrying: rate limits, server
+        errors and network errors are, any other answer of the exchange
+        (unknown symbol, bad parameters...) will not change by retrying, and
+        neither will any other error (a response that cannot be decoded, a
+        bug)
+
+        Parameters
+        ----------
+        error : Exception
+            The error raised by the request
+
+        Returns
+        -------
+        bool
+            True if the request should be retried
+        """
+
+        if isinstance(error, APICallError):
+            return error.status_code == 429 or error.status_code >= 500
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 429 or error.status >= 500
+        return isinstance(error, NETWORK_ERRORS)
+
+
+class CircuitBreaker:
+    """
+    Stops calling an endpoint that keeps failing
+
+    After `threshold` consecutive failures the circuit opens and every call
+    fails immediately. After `reset_timeout` seconds a single call is let
+    through as a probe while the other ones still fail, the circuit closes
+    again if it succeeds and stays open for another `reset_timeout` seconds
+    if it fails. A probe whose result never comes back is given up after
+    `reset_timeout` seconds and another one is let through.
+
+    Attributes
+    ----------
+    threshold : int
+        Consecutive failures opening the circuit
+    reset_timeout : float
+        Seconds the circuit stays open
+    probing : bool
+        True while the probe of the half open circuit has not come back
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """
+        Checks if a call can be sent
+
+        Returns
+        -------
+        bool
+            False while the circuit is open, True for a single call once
+            it is half open
+        """
+
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_timeout:
+                # Half open: this call is the probe, the other ones fail until
+                # its result is recorded or it is given up
+                self.opened_at = now
+                self.probing = True
+                return True
+            return False
+
+    def record(self, success: bool):
+        """
+        Records the result of a call
+
+        Parameters
+        ----------
+        success : bool
+            True if the call succeeded
+        """
+
+        with self.lock:
+            if success:
+                self.failures = 0
+                self.opened_at = None
+                self.probing = False
+            else:
+                self.failures += 1
+                if self.probing or (self.failures >= self.threshold and self.opened_at is None):
+                    # A failed probe opens the circuit again for reset_timeout seconds
+                    self.opened_at = time.monotonic()
+                    self.probing = False
+
+
+def call_with_retry(func, limiter: TokenBucket, policy: RetryPolicy, breaker: CircuitBreaker,
+                    on_retry=None):
+    """
+    Calls a function sending one request under the rate limiter, retrying it
+    according to the policy while the circuit is closed
+
+    Parameters
+    ----------
+    func : callable
+        Function without arguments sending the request
+    limiter : TokenBucket
+        Rate limiter of the exchange
+    policy : RetryPolicy
+        Retry policy of the exchange
+    breaker : CircuitBreaker
+        Circuit breaker of the endpoint
+    on_retry : callable
+        Called with the error every time the request is retried
+
+    Returns
+    -------
+    object
+        What func returned
+
+    Raises
+    ------
+    Exception
+        The last error once the retries are exhausted or not worth it
+    """
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError("CircuitOpenError: endpoint failing, not called")
+        limiter.acquire()
+        try:
+            result = func()
+        except Exception as e:
+            # An answer not worth retrying (unknown symbol...) still shows the endpoint is up
+            breaker.record(not policy.is_retryable(e))
+            if attempt >= policy.max_retries or not policy.is_retryable(e):
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            time.sleep(policy.delay(attempt, getattr(e, 'retry_after', None)))
+            attempt += 1
+        else:
+            breaker.record(True)
+            return result
+
+
+async def call_with_retry_async(func, limiter: TokenBucket, policy: RetryPolicy, breaker: CircuitBreaker,
+                                on_retry=None):
+    """
+    Same as call_with_retry for a coroutine function
+
+    Parameters
+    ----------
+    func : callable
+        Coroutine function without arguments sending the request
+    limiter : TokenBucket
+        Rate limiter of the exchange
+    policy : RetryPolicy
+        Retry policy of the exchange
+    breaker : CircuitBreaker
+        Circuit breaker of the endpoint
+    on_retry : callable
+        Called with the error every time the request is retried
+
+    Returns
+    -------
+    object
+        What func returned
+
+    Raises
+    ------
+    Exception
+        The last error once the retries are exhausted or not worth it
+    """
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise CircuitOpenError("CircuitOpenError: endpoint failing, not called")
+        await limiter.acquire_async()
+        try:
+            result = await func()
+        except Exception as e:
+            # An answer not worth retrying (unknown symbol...) still shows the endpoint is up
+            breaker.record(not policy.is_retryable(e))
+            if attempt >= policy.max_retries or not policy.is_retryable(e):
+                raise
+            if on_retry is not None:
+                on_retry(e)
+            await asyncio.sleep(policy.delay(attempt, getattr(e, 'retry_after', None)))
+            attempt += 1
+        else:
+            breaker.record(True)
+            return result
@@ -0,0 +1,260 @@
+"""Fixed size ring buffers of the candles of every symbol
+
+Keeping the candles as a long dataframe means concatenating, sorting and
+converting the whole frame every time candles are added. This script
+keeps them in one preallocated array per column, with a row per symbol:
+adding a candle writes one value per column, and the last candles of a
+symbol are always a view of the arrays, in chronological order.
+
+Every row is written twice, at its position and at its position plus the
+capacity, so that whatever the position of the last candle the last N
+candles of a symbol are contiguous.
+
+This file can be imported as a module and contains the following class:
+
+    * CandleRing - Ring buffers of the candles of every symbol, one array per column
+
+"""
+
+import numpy as np
+import pandas as pd
+from exchange.helpers import COLUMNS, TYPES
+
+
+NO_TIME = np.iinfo('int64').min     # Last time of a symbol without candles
+
+
+class CandleRing:
+    """
+    Ring buffers of the candles of every symbol, one array per column
+
+    Attributes
+    ----------
+    capacity : int
+        Number of candles kept for every symbol
+    index : dict
+        Symbol to row of the arrays
+    symbols : list
+        Symbol of every row
+    counts : np.ndarray
+        Number of candles added to every row since it was created
+    last_time : np.ndarray
+        Time of the last candle of every row
+    """
+
+    def __init__(self, capacity: int, rows: int =64):
+        self.capacity = capacity
+        self.index = {}
+        self.symbols = []
+        self.values = {column: np.zeros((rows, 2 * capacity), dtype=TYPES[column]) for column in COLUMNS}
+        self.counts = np.zeros(rows, dtype='int64')
+        self.last_time = np.full(rows, NO_TIME, dtype='int64')
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(values.nbytes for values in self.values.values()) + self.counts.nbytes + self.last_time.nbytes
+
+    def row(self, symbol: str) -> int:
+        """
+        Row of a symbol, added if it is not held yet
+
+        Parameters
+        ----------
+        symbol : str
+            The symbol
+
+        Returns
+        -------
+        int
+            Row of the arrays
+        """
+
+        if symbol not in self.index:
+            if len(self.symbols) == len(self.counts):
+                # Rows are added by doubling, so adding symbols is amortized O(1)
+                grow = max(len(self.counts), 1)
+                for column, values in self.values.items():
+                    self.values[column] = np.concatenate([values, np.zeros((grow, values.shape[1]), values.dtype)])
+                self.counts = np.concatenate([self.counts, np.zeros(grow, 'int64')])
+                self.last_time = np.concatenate([self.last_time, np.full(grow, NO_TIME, 'int64')])
+            self.index[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.index[symbol]
+
+    def append(self, symbol: str, candle: tuple):
+        """
+        Adds a candle to a symbol in O(1), replacing its last candle if it
+        has the same time and ignoring it if it is older
+
+        Parameters
+        ----------
+        symbol : str
+            The symbol of the candle
+        candle : tuple
+            Values of the candle, in the order of COLUMNS
+        """
+
+        row = self.row(symbol)
+        time = int(candle[0])
+        if time < self.last_time[row]:
+            return
+        if time > self.last_time[row]:
+            self.counts[row] += 1
+            self.last_time[row] = time
+        position = (self.counts[row] - 1) % self.capacity
+        for column, value in zip(COLUMNS, candle):
+            self.values[column][row, position] = value
+            self.values[column][row, position + self.capacity] = value
+
+    def extend(self, data: pd.DataFrame):
+        """
+        Adds the candles of a dataframe, like append for every candle in
+        chronological order
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles of any symbols, with the symbol column
+        """
+
+        if data.empty:
+            return
+
+        symbols = data.symbol.to_numpy()
+        for symbol in pd.unique(symbols):
+            self.row(symbol)
+        rows = pd.Series(symbols).map(self.index).to_numpy(dtype='int64')
+        time = data.time.to_numpy(dtype='int64')
+
+        order = np.lexsort((time, rows))
+        rows, time = rows[order], time[order]
+        keep = time >= self.last_time[rows]
+        # Of several candles with the same time the last one is kept
+        keep[:-1] &= (rows[1:] != rows[:-1]) | (time[1:] != time[:-1])
+        order, rows, time = order[keep], rows[keep], time[keep]
+        if len(rows) == 0:
+            return
+
+        new = time > self.last_time[rows]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        sizes = np.diff(np.r_[starts, len(rows)])
+        added = np.cumsum(new)
+        before = np.repeat(added[starts] - new[starts], sizes)
+        # Count of every candle, a candle replacing the last one takes its count
+        counts = self.counts[rows] + added - before - 1
+
+        group_rows = rows[starts]
+        totals = self.counts[group_rows] + np.add.reduceat(new.astype('int64'), starts)
+        # Candles pushed out by later ones of the same call are not written
+        written = counts >= np.repeat(totals, sizes) - self.capacity
+        rows, positions, order = rows[written], counts[written] % self.capacity, order[written]
+
+        for column in COLUMNS:
+            values = data[column].to_numpy(dtype=TYPES[column])[order]
+            self.values[column][rows, positions] = values
+            self.values[column][rows, positions + self.capacity] = values
+
+        self.counts[group_rows] = totals
+        self.last_time[group_rows] = np.maximum.reduceat(time, starts)
+
+    def last(self, column: str, symbol: str, n: int =None) -> np.ndarray:
+        """
+        Last candles of a symbol in chronological order, as a view of the
+        buffer
+
+        Parameters
+        ----------
+        column : str
+            Name of the column
+        symbol : str
+            The symbol
+        n : int
+            Number of candles, every held candle if not given
+
+        Returns
+        -------
+        np.ndarray
+            Read only view of at most n values, valid until the next candle
+            is added to the symbol
+        """
+
+        row = self.index[symbol]
+        held = min(self.counts[row], self.capacity)
+        n = held if n is None else min(n, held)
+        end = (self.counts[row] - 1) % self.capacity + self.capacity + 1
+        view = self.values[column][row, end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def last_times(self) -> dict:
+        """
+        Time of the last candle of every symbol
+
+        Returns
+        -------
+        dict
+            Symbol to unix timestamp of its last candle
+        """
+
+        return {symbol: int(self.last_time[row]) for symbol, row in self.index.items() if self.counts[row]}
+
+    def retain(self, symbols: list):
+        """
+        Drops the symbols that are not in the given list
+
+        Parameters
+        ----------
+        symbols : list
+            Symbols to keep
+        """
+
+        listed = set(symbols)
+        kept = [row for row, symbol in enumerate(self.symbols) if symbol in listed]
+        if len(kept) == len(self.symbols):
+            return
+        for column, values in self.values.items():
+            self.values[column] = values[kept]
+        self.counts = self.counts[kept]
+        self.last_time = self.last_time[kept]
+        self.symbols = [self.symbols[row] for row in kept]
+        self.index = {symbol: row for row, symbol in enumerate(self.symbols)}
+
+    def frame(self, symbols: list, n: int =None, since: int =None, min_candles: int =0) -> pd.DataFrame:
+        """
+        Last candles of the given symbols laid out like the downloaded ones,
+        gathered in one pass per column
+
+        Parameters
+        ----------
+        symbols : list
+            Symbols to read, the rows are returned in this order
+        n : int
+            Number of candles of every symbol, the capacity if not given
+        since : int
+            Only candles from this unix timestamp onwards are read
+        min_candles : int
+            Symbols with fewer candles are left out
+
+        Returns
+        -------
+        pd.DataFrame
+            Candles in chronological order for every symbol
+        """
+
+        n = self.capacity if n is None else min(n, self.capacity)
+        rows = np.array([self.index[symbol] for symbol in symbols if symbol in self.index], dtype='int64')
+        rows = rows[self.counts[rows] > 0]
+
+        end = (self.counts[rows] - 1) % self.capacity + self.capacity + 1
+        columns = end[:, None] - n + np.arange(n)
+        mask = np.arange(n) >= n - np.minimum(self.counts[rows], n)[:, None]
+        if since is not None:
+            mask &= self.values['time'][rows[:, None], columns] >= since
+        mask &= (mask.sum(axis=1) >= min_candles)[:, None]
+
+        data = pd.DataFrame({column: self.values[column][rows[:, None], columns][mask] for column in COLUMNS})
+        data['symbol'] = np.repeat(np.array(self.symbols, dtype=object)[rows], mask.sum(axis=1))
+        return data
@@ -0,0 +1,127 @@
+"""Persistent local store of downloaded candles
+
+This script keeps every downloaded candle in a SQLite database keyed by
+exchange, symbol, timeframe and time, so that a run only has to download
+the candles that closed since the previous one.
+
+This file can be imported as a module and contains the following class:
+
+    * CandleStore - SQLite backed store of candles
+
+"""
+
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from exchange.helpers import COLUMNS, TYPES, EXCHANGE, STORE_PATH
+
+
+MAX_VARIABLES=900       # Symbols given to a query, under the 999 parameters of older SQLite versions
+
+
+class CandleStore:
+    """
+    SQLite backed store of candles
+
+    Attributes
+    ----------
+    path : str
+        Path of the database file
+    exchange : str
+        Name of the exchange the candles belong to
+    """
+
+    def __init__(self, path: str =STORE_PATH, exchange: str =EXCHANGE):
+        self.path = path
+        self.exchange = exchange
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+
+        values = ', '.join('{} REAL'.format(column) for column in COLUMNS if column != 'time')
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS candles (exchange TEXT, symbol TEXT, timeframe TEXT, "
+            "time INTEGER, {}, PRIMARY KEY (exchange, timeframe, symbol, time)) WITHOUT ROWID".format(values))
+        self.connection.commit()
+
+    def last_times(self, timeframe: str) -> dict:
+        """
+        Time of the last stored candle of every symbol
+
+        Parameters
+        ----------
+        timeframe : str
+            The timeframe of the candles
+
+        Returns
+        -------
+        dict
+            Symbol to unix timestamp of its last candle
+        """
+
+        rows = self.connection.execute(
+            "SELECT symbol, MAX(time) FROM candles WHERE exchange = ? AND timeframe = ? GROUP BY symbol",
+            (self.exchange, timeframe))
+        return dict(rows.fetchall())
+
+    def save(self, data: pd.DataFrame, timeframe: str):
+        """
+        Inserts the given candles, replacing the stored ones with the same time
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles with the symbol column
+        timeframe : str
+            The timeframe of the candles
+        """
+
+        if data.empty:
+            return
+
+        columns = ['symbol'] + COLUMNS
+        rows = data[columns].itertuples(index=False, name=None)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO candles (exchange, timeframe, {}) VALUES (?, ?, {})".format(
+                    ', '.join(columns), ', '.join('?' * len(columns))),
+                ((self.exchange, timeframe, row[0], int(row[1])) + row[2:] for row in rows))
+
+    def load(self, symbols: list, timeframe: str, since: int =0) -> pd.DataFrame:
+        """
+        Reads the stored candles of the given symbols
+
+        Parameters
+        ----------
+        symbols : list
+            Symbols to read, the rows are returned in this order
+        timeframe : str
+            The timeframe of the candles
+        since : int
+            Only candles from this unix timestamp onwards are read
+
+        Returns
+        -------
+        pd.DataFrame
+            Candles in chronological order for every symbol
+        """
+
+        order = {symbol: i for i, symbol in enumerate(symbols)}
+        if len(order) <= MAX_VARIABLES:
+            # Only the rows of the symbols are read, through the primary key
+            query = "SELECT symbol, {} FROM candles WHERE exchange = ? AND timeframe = ? AND symbol IN ({}) " \
+                    "AND time >= ?".format(', '.join(COLUMNS), ', '.join('?' * len(order)))
+            params = (self.exchange, timeframe, *order, int(since))
+        else:
+            query = "SELECT symbol, {} FROM candles WHERE exchange = ? AND timeframe = ? AND time >= ?".format(
+                ', '.join(COLUMNS))
+            params = (self.exchange, timeframe, int(since))
+        data = pd.read_sql_query(query, self.connection, params=params)
+        data = data[data.symbol.isin(order)]
+        data = data.iloc[np.lexsort((data.time.values, data.symbol.map(order).values))]
+
+        return data[COLUMNS + ['symbol']].astype(TYPES).reset_index(drop=True)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,313 @@
+"""Counters, timers and histograms of the stages of a run
+
+When a run is slow, the time it took says nothing of where it went: the
+latency of the exchange, the retries of the downloads, a strategy or
+Telegram. This script keeps, for the whole process, counters (requests,
+retries, HTTP statuses, signals of every strategy) and histograms of
+durations (every request of candles, chunk downloaded, strategy call and
+Telegram message) and of the latency from the close of the candles to
+their alerts, every series keyed by its labels.
+
+The stages record into METRICS from their threads. In periodic mode they
+are served in the Prometheus text format on a local /metrics endpoint, in
+one-shot mode they are dumped to a JSON summary at the end of the run.
+The processes of a ShardPool record into their own copy, sent back and
+merged with every shard.
+
+This file can be imported as a module and contains the following:
+
+    * Metrics - Counters and histograms keyed by name and labels
+    * MetricsServer - Serves metrics in the Prometheus text format
+    * METRICS - Metrics of the process, the ones the stages record into
+
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+PREFIX="kucoinbot_"     # Prefix of the names of the metrics served
+METRICS_HOST="127.0.0.1"
+METRICS_PORT=int(os.environ.get('METRICS_PORT', 9109))
+METRICS_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'metrics.json')
+
+# Upper bounds of the buckets of the histograms, in seconds
+DURATION_BUCKETS: tuple = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LATENCY_BUCKETS: tuple = (5, 10, 30, 60, 120, 300, 600, 1800, 3600, 14400, 86400)
+BUCKETS: dict = {'alert_latency_seconds': LATENCY_BUCKETS}
+
+DESCRIPTIONS: dict = {
+    'requests_total': "Requests of candles sent, retries included",
+    'responses_total': "Responses of the candles endpoint by HTTP status",
+    'retries_total': "Requests of candles sent again after failing",
+    'given_up_total': "Symbols left out after exhausting their retries",
+    'request_seconds': "Duration of a request of candles",
+    'fetch_seconds': "Duration of the download of the candles of a chunk of symbols",
+    'strategy_seconds': "Duration of a strategy on the candles of a chunk or shard",
+    'strategy_errors_total': "Strategy calls that raised",
+    'signals_total': "Breakouts found by a strategy",
+    'notify_seconds': "Duration of the notification of a breakout by the pipeline",
+    'alerts_total': "Breakouts notified",
+    'telegram_seconds': "Duration of a Telegram message, its retries included",
+    'telegram_messages_total': "Telegram messages by outcome",
+    'alert_latency_seconds': "Seconds from the close of the candles to the notification of their breakout",
+}
+
+
+def label_value(value) -> str:
+    # The strategies of several exchanges are keyed by (exchange, timeframe)
+    return '/'.join(map(str, value)) if isinstance(value, tuple) else str(value)
+
+
+class Metrics:
+    """
+    Counters and histograms keyed by name and labels
+
+    Every method can be called from any thread.
+
+    Attributes
+    ----------
+    counters : dict
+        (name, labels) to count
+    histograms : dict
+        (name, labels) to [count per bucket, sum, max], the last bucket
+        counting the values above every bound
+    start : float
+        Unix timestamp of the creation or the last clear
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.start = time.time()
+
+    @staticmethod
+    def key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((label, label_value(value)) for label, value in labels.items()))
+
+    def inc(self, name: str, value: float =1, **labels):
+        """Adds to the counter of the name and labels"""
+
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Adds a value to the histogram of the name and labels"""
+
+        key = self.key(name, labels)
+        bounds = BUCKETS.get(name, DURATION_BUCKETS)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = [[0] * (len(bounds) + 1), 0.0, value]
+            histogram = self.histograms[key]
+            histogram[0][bisect.bisect_left(bounds, value)] += 1
+            histogram[1] += value
+            histogram[2] = max(histogram[2], value)
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        """Observes the seconds spent in the with block, also when it raises"""
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        """
+        Copy of the metrics, as sent back by the processes of a pool
+
+        Returns
+        -------
+        dict
+            Counters and histograms, keyed like the attributes
+        """
+
+        with self.lock:
+            return {'counters': dict(self.counters),
+                    'histograms': {key: [list(counts), total, peak]
+                                   for key, (counts, total, peak) in self.histograms.items()}}
+
+    def merge(self, snapshot: dict):
+        """Adds the metrics of a snapshot, taken in another process, to these ones"""
+
+        with self.lock:
+            for key, value in snapshot['counters'].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (counts, total, peak) in snapshot['histograms'].items():
+                if key not in self.histograms:
+                    self.histograms[key] = [[0] * len(counts), 0.0, peak]
+                histogram = self.histograms[key]
+                histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+                histogram[1] += total
+                histogram[2] = max(histogram[2], peak)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.start = time.time()
+
+    def prometheus(self) -> str:
+        """
+        Metrics in the Prometheus text exposition format
+
+        Returns
+        -------
+        str
+            Every series with its HELP and TYPE, the histograms with
+            cumulative buckets, their sum and their count
+        """
+
+        snapshot = self.snapshot()
+        families = {}
+        for (name, labels), value in snapshot['counters'].items():
+            families.setdefault((name, 'counter'), []).append((labels, value))
+        for (name, labels), value in snapshot['histograms'].items():
+            families.setdefault((name, 'histogram'), []).append((labels, value))
+
+        lines = []
+        for (name, kind), series in sorted(families.items()):
+            metric = PREFIX + name
+            lines.append("# HELP {} {}".format(metric, DESCRIPTIONS.get(name, name)))
+            lines.append("# TYPE {} {}".format(metric, kind))
+            for labels, value in sorted(series):
+                if kind == 'counter':
+                    lines.append("{}{} {}".format(metric, format_labels(labels), value))
+                    continue
+                counts, total, _ = value
+                cumulative = 0
+                for bound, count in zip(list(BUCKETS.get(name, DURATION_BUCKETS)) + ['+Inf'], counts):
+                    cumulative += count
+                    lines.append("{}_bucket{} {}".format(metric, format_labels(labels + (('le', str(bound)),)),
+                                                         cumulative))
+                lines.append("{}_sum{} {}".format(metric, format_labels(labels), total))
+                lines.append("{}_count{} {}".format(metric, format_labels(labels), cumulative))
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> dict:
+        """
+        Summary of the metrics, as dumped in one-shot mode
+
+        Returns
+        -------
+        dict
+            Every counter with its value, every histogram with its count,
+            sum, mean, max and buckets, under the name of the metric
+        """
+
+        snapshot = self.snapshot()
+        summary = {'start': self.start, 'end': time.time(), 'counters': {}, 'histograms': {}}
+        for (name, labels), value in sorted(snapshot['counters'].items()):
+            summary['counters'].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+        for (name, labels), (counts, total, peak) in sorted(snapshot['histograms'].items()):
+            count = sum(counts)
+            bounds = [str(bound) for bound in BUCKETS.get(name, DURATION_BUCKETS)] + ['+Inf']
+            summary['histograms'].setdefault(name, []).append({
+                'labels': dict(labels), 'count': count, 'sum': total, 'mean': total / count if count else 0.0,
+                'max': peak, 'buckets': dict(zip(bounds, counts))})
+        return summary
+
+    def dump(self, path: str =METRICS_PATH):
+        """Writes the summary of the metrics to a JSON file"""
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.summary(), file, indent=1)
+
+    def __str__(self) -> str:
+        with self.lock:
+            calls = sum(sum(counts) for counts, _, _ in self.histograms.values())
+            return "Metrics: {} counters, {} histograms of {} timings".format(
+                len(self.counters), len(self.histograms), calls)
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(label, value.replace('\\', '\\\\').replace('"', '\\"'))
+                          for label, value in labels) + '}'
+
+
+class MetricsServer:
+    """
+    Serves metrics in the Prometheus text format on /metrics, from a
+    thread of its own
+
+    Attributes
+    ----------
+    metrics : Metrics
+        The metrics served
+    host : str
+        Address listened on, the local one by default
+    port : int
+        Port listened on, 0 for any free one
+    """
+
+    def __init__(self, metrics, host: str =METRICS_HOST, port: int =METRICS_PORT):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.server = None
+
+    def start(self) -> str:
+        """
+        Starts serving in a daemon thread
+
+        Returns
+        -------
+        str
+            URL of the endpoint
+        """
+
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True).start()
+        return self.url
+
+    @property
+    def url(self) -> str:
+        return "http://{}:{}/metrics".format(self.host, self.port)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+METRICS = Metrics()
@@ -0,0 +1,266 @@
+"""Pipelined run of the strategies, from the download to the alerts
+
+A run downloads the candles, runs the strategies on them and sends the
+alerts. Instead of waiting for every candle of every timeframe before
+running the first strategy, and for every strategy before sending the
+first alert, this script runs the three stages in their own thread,
+connected by bounded queues: the symbols are downloaded in chunks, the
+strategies of a timeframe run on a chunk as soon as its candles arrive
+and every alert is sent as soon as it is found.
+
+The queues are bounded so that a slow stage holds back the one feeding
+it instead of piling candles up in memory.
+
+Given a ShardPool (sharding), the strategy stage hands every chunk to the
+processes of the pool and goes on with the next chunk, the breakouts are
+sent in the order of the chunks as they are done.
+
+When the strategy stage stops early, it tells the download stage to stop
+too, instead of leaving it blocked on a full queue nobody reads.
+
+This file can be imported as a module and contains the following:
+
+    * Pipeline - Download, strategy and alert stages run concurrently
+    * chunks - Splits the symbols into the chunks downloaded together
+    * last_close - Time of the last close of the candles of a chunk
+
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from exchange.helpers import TIMEFRAME_SECONDS
+from metrics import METRICS
+
+
+CHUNK_SIZE=100          # Symbols downloaded and evaluated together
+QUEUE_SIZE=4            # Items waiting between two stages before the first one blocks
+POLL_INTERVAL=0.05      # Seconds between two checks of the chunks evaluated by a pool, or of a stop
+
+DONE = None             # Sent down a queue when the stage feeding it is finished
+
+
+def chunks(symbols: list, size: int =CHUNK_SIZE) -> list:
+    """
+    Splits the symbols into the chunks downloaded together
+
+    Parameters
+    ----------
+    symbols : list
+        List of symbols
+    size : int
+        Number of symbols of every chunk
+
+    Returns
+    -------
+    list of lists
+        The chunks, in the order of the symbols
+    """
+
+    return [symbols[i:i + size] for i in range(0, len(symbols), size)]
+
+
+def last_close(data) -> float:
+    """
+    Time of the last close of the candles, the one their breakouts follow
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Candles of a chunk of symbols
+
+    Returns
+    -------
+    float
+        Unix timestamp in seconds of the close of the newest candle, or of
+        its open when it is still open, None if the candles have no
+        timeframe
+    """
+
+    if 'timeframe' not in data or data['timeframe'].iloc[0] not in TIMEFRAME_SECONDS:
+        return None
+    newest = float(data['time'].max())
+    close = newest + TIMEFRAME_SECONDS[data['timeframe'].iloc[0]]
+    return close if close <= time.time() else newest
+
+
+class Pipeline:
+    """
+    Download, strategy and alert stages run concurrently
+
+    Attributes
+    ----------
+    fetch : callable
+        Generator yielding (timeframe, candles) pairs as the candles of
+        every chunk of symbols are downloaded
+    strategies : dict
+        Timeframe to list of strategies, called with the candles and a list
+        of breakouts and returning the list with their breakouts appended
+    notify : callable
+        Called with every breakout found
+    pool : ShardPool
+        Pool of processes running the strategies, None to run them in the
+        strategy stage
+    stopped : threading.Event
+        Set when the strategy stage is finished, the download stage stops
+        waiting for room in the queue
+    alerts : int
+        Number of breakouts notified
+    first_alert : float
+        Seconds from the start of the run to the first breakout notified
+    elapsed : float
+        Wall time of the run in seconds
+    """
+
+    def __init__(self, fetch, strategies: dict, notify, queue_size: int =QUEUE_SIZE, pool=None):
+        self.fetch = fetch
+        self.strategies = strategies
+        self.notify = notify
+        self.pool = pool
+        self.candles = queue.Queue(queue_size)
+        self.breakouts = queue.Queue(queue_size)
+        self.stopped = threading.Event()
+        self.chunks = 0
+        self.alerts = 0
+        self.first_alert = None
+        self.elapsed = 0.0
+        self.start = None
+
+    def put(self, item) -> bool:
+        """Puts an item in the candles queue, unless the strategy stage stops first"""
+
+        while not self.stopped.is_set():
+            try:
+                self.candles.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def download(self):
+        """Download stage, puts the candles of every chunk in the queue"""
+
+        try:
+            for timeframe, data in self.fetch():
+                if timeframe in self.strategies and not data.empty and not self.put((timeframe, data)):
+                    print("Download stopped: the strategy stage stopped")
+                    break
+        except Exception as error:
+            print("Download stopped: {}".format(error))
+        finally:
+            self.put(DONE)
+
+    def evaluate(self):
+        """Strategy stage, runs the strategies of the timeframe on every chunk"""
+
+        if self.pool is not None:
+            return self.evaluate_shards()
+        try:
+            while True:
+                item = self.candles.get()
+                if item is DONE:
+                    break
+                timeframe, data = item
+                self.chunks += 1
+                data = data.reset_index(drop=True)
+                close = last_close(data)
+                for strategy in self.strategies[timeframe]:
+                    name = getattr(getattr(strategy, 'func', strategy), '__name__', strategy)
+                    try:
+                        with METRICS.timer('strategy_seconds', strategy=name, timeframe=timeframe):
+                            breakouts = strategy(data, [])
+                    except Exception as error:
+                        print("Strategy {} on {} failed: {}".format(name, timeframe, error))
+                        METRICS.inc('strategy_errors_total', strategy=name, timeframe=timeframe)
+                        breakouts = []
+                    METRICS.inc('signals_total', len(breakouts), strategy=name, timeframe=timeframe)
+                    for breakout in breakouts:
+                        self.breakouts.put((breakout, close))
+        finally:
+            self.stopped.set()
+            self.breakouts.put(DONE)
+
+    def evaluate_shards(self):
+        """Strategy stage on a pool, the chunks are evaluated in its processes"""
+
+        pending = deque()
+        try:
+            while True:
+                try:
+                    item = self.candles.get(timeout=POLL_INTERVAL) if pending else self.candles.get()
+                except queue.Empty:
+                    self.collect(pending, len(pending))
+                    continue
+                if item is DONE:
+                    break
+                timeframe, data = item
+                self.chunks += 1
+                pending.append((timeframe, last_close(data),
+                                self.pool.submit(timeframe, data.reset_index(drop=True))))
+                # At most a chunk per process waits, the others are held in the queue
+                self.collect(pending, self.pool.workers)
+            self.collect(pending, 0)
+        finally:
+            self.stopped.set()
+            self.breakouts.put(DONE)
+
+    def collect(self, pending: deque, limit: int):
+        """
+        Queues the breakouts of the chunks evaluated by the pool, in the
+        order of the chunks
+
+        Parameters
+        ----------
+        pending : deque
+            (timeframe, last close, Shards) of the chunks handed to the pool, the oldest first
+        limit : int
+            Chunks left pending, the oldest ones are waited for
+        """
+
+        while pending and (pending[0][2].done() or len(pending) > limit):
+            timeframe, close, shards = pending.popleft()
+            try:
+                for breakout in shards.result():
+                    self.breakouts.put((breakout, close))
+            except Exception as error:
+                print("Strategies on {} failed: {}".format(timeframe, error))
+
+    def send(self):
+        """Alert stage, notifies every breakout as soon as it is found"""
+
+        while True:
+            item = self.breakouts.get()
+            if item is DONE:
+                break
+            breakout, close = item
+            try:
+                with METRICS.timer('notify_seconds'):
+                    self.notify(breakout)
+            except Exception as error:
+                print("Alert {} failed: {}".format(breakout, error))
+                continue
+            self.alerts += 1
+            labels = {'exchange': breakout.get('exc'), 'timeframe': breakout.get('timeframe')}
+            METRICS.inc('alerts_total', **labels)
+            if close is not None:
+                METRICS.observe('alert_latency_seconds', time.time() - close, **labels)
+            if self.first_alert is None:
+                self.first_alert = time.perf_counter() - self.start
+
+    def run(self):
+        """Runs the three stages until every chunk is downloaded and evaluated"""
+
+        self.start = time.perf_counter()
+        stages = [threading.Thread(target=stage, name=stage.__name__)
+                  for stage in (self.download, self.evaluate, self.send)]
+        for stage in stages:
+            stage.start()
+        for stage in stages:
+            stage.join()
+        self.elapsed = time.perf_counter() - self.start
+
+    def __str__(self) -> str:
+        first = "{:.2f}s".format(self.first_alert) if self.first_alert is not None else "-"
+        return "Pipeline: {} chunks, {} alerts, first alert after {}, done in {:.2f}s".format(
+            self.chunks, self.alerts, first, self.elapsed)
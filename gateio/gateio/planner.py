@@ -0,0 +1,143 @@
+"""Plan of the candles downloaded for the strategies of the runner
+
+Every timeframe was downloaded with a window of 160 candles, whether its
+strategies read 26 candles (ma_vol_breakout) or 151 (ichimoku_breakout,
+the senkou span B over 120 candles shifted 30 forward), and whether any
+strategy was run on it or not. The strategies declare the number of candles of every
+symbol they read (strategies.strategies.lookback, Rule.bars for the
+rules), and the timeframes they need are the ones the runner lists them
+under. This script computes from them, before anything is downloaded, the
+timeframes to download and their number of candles.
+
+Given a base timeframe, a timeframe is built from its candles instead of
+being downloaded when one request of the base timeframe returns enough
+candles for it, and the base timeframe is downloaded anyway or two
+timeframes or more are built from it. The runner gives none, every
+timeframe is downloaded.
+
+The plan gives the number of requests and candles of a run starting
+without stored candles, printed next to what the run downloaded. With the
+candle store, or in daemon mode, only the new candles are downloaded.
+
+This file can be imported as a module and contains the following:
+
+    * FetchPlan - Timeframes downloaded and built, with their number of candles
+    * strategy_bars - Number of candles of every symbol a strategy reads
+
+"""
+
+import math
+from exchange.helpers import WINDOW, MAX_BARS, TIMEFRAME_SECONDS
+
+
+def strategy_bars(strategy) -> int:
+    """
+    Number of candles of every symbol a strategy reads
+
+    Parameters
+    ----------
+    strategy : callable
+        Strategy of the runner, or a partial of it
+
+    Returns
+    -------
+    int
+        The candles declared with strategies.strategies.lookback, the
+        whole window for a strategy declaring none
+    """
+
+    return getattr(getattr(strategy, 'func', strategy), 'bars', WINDOW)
+
+
+class FetchPlan:
+    """
+    Timeframes downloaded and built from the base timeframe, with their
+    number of candles
+
+    Attributes
+    ----------
+    bars : dict
+        Timeframe to number of candles read by its strategies, for every
+        timeframe with strategies
+    fetched : dict
+        Timeframe to number of candles downloaded, the base timeframe first
+    derived : dict
+        Timeframe to number of candles, for the timeframes built from the
+        base timeframe
+    base : str
+        Timeframe the derived ones are built from, None if none is built
+    max_bars : int
+        Candles returned by a request
+    """
+
+    def __init__(self, strategies: dict, base: str =None, max_bars: int =MAX_BARS):
+        self.bars = {timeframe: max(strategy_bars(strategy) for strategy in timeframe_strategies)
+                     for timeframe, timeframe_strategies in strategies.items() if timeframe_strategies}
+        self.max_bars = max_bars
+
+        ratios = {} if base is None else {
+            timeframe: TIMEFRAME_SECONDS[timeframe] // TIMEFRAME_SECONDS[base] for timeframe in self.bars
+            if timeframe != base and TIMEFRAME_SECONDS[timeframe] % TIMEFRAME_SECONDS[base] == 0}
+        # One more candle of a timeframe built, its first one is dropped when it starts before the base candles
+        derivable = {timeframe: self.bars[timeframe] for timeframe, ratio in ratios.items()
+                     if (self.bars[timeframe] + 1) * ratio <= max_bars}
+        # A timeframe built saves its request only if the base timeframe is downloaded anyway
+        self.derived = derivable if base in self.bars or len(derivable) > 1 else {}
+        self.base = base if self.derived else None
+
+        self.fetched = {}
+        if self.derived:
+            self.fetched[base] = max([self.bars.get(base, 0)] +
+                                     [(bars + 1) * ratios[timeframe] for timeframe, bars in self.derived.items()])
+        for timeframe, bars in self.bars.items():
+            if timeframe not in self.derived and timeframe not in self.fetched:
+                self.fetched[timeframe] = bars
+
+    def requests(self, timeframe: str, symbols: int =1) -> int:
+        """Requests downloading the candles of a timeframe for every symbol"""
+
+        return symbols * math.ceil(self.fetched[timeframe] / self.max_bars)
+
+    @property
+    def requests_per_symbol(self) -> int:
+        return sum(self.requests(timeframe) for timeframe in self.fetched)
+
+    def report(self, stats: dict, symbols: int) -> str:
+        """
+        Planned against downloaded requests and candles
+
+        Parameters
+        ----------
+        stats : dict
+            Timeframe to FetchStats of the downloads of the run
+        symbols : int
+            Number of symbols of the run
+
+        Returns
+        -------
+        str
+            One line per downloaded timeframe and one for the whole run
+        """
+
+        lines = []
+        planned = [0, 0]
+        downloaded = [0, 0]
+        for timeframe, bars in self.fetched.items():
+            requests, candles = self.requests(timeframe, symbols), bars * symbols
+            sent = stats[timeframe].requests if timeframe in stats else 0
+            received = stats[timeframe].candles if timeframe in stats else 0
+            lines.append("Plan {}: {} candles x {} symbols, {} requests, {} candles "
+                         "| downloaded {} requests, {} candles".format(
+                timeframe, bars, symbols, requests, candles, sent, received))
+            planned = [planned[0] + requests, planned[1] + candles]
+            downloaded = [downloaded[0] + sent, downloaded[1] + received]
+        lines.append("Plan: {} requests, {} candles | downloaded {} requests, {} candles".format(
+            *planned, *downloaded))
+        return '\n'.join(lines)
+
+    def __str__(self) -> str:
+        fetched = ', '.join("{} {} candles".format(timeframe, bars) for timeframe, bars in self.fetched.items())
+        derived = ', '.join("{} {} candles".format(timeframe, bars) for timeframe, bars in self.derived.items())
+        return "Fetch plan: download {}{} | {} requests and {} candles per symbol".format(
+            fetched, " | built from {}: {}".format(self.base, derived) if self.derived else "",
+            self.requests_per_symbol, sum(self.fetched.values()))
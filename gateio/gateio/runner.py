@@ -1,39 +1,172 @@
 from exchange.exchange import *
+from exchange.store import CandleStore
 from strategies.strategies import *
 from helpers import *
-from telegram_send import send
-import schedule
+from notifier import Notifier
+from scheduler import CandleScheduler
+from pipeline import Pipeline, chunks
+from daemon import Daemon, MAX_MEMORY
+from sharding import ShardPool, WORKERS
+from planner import FetchPlan
+from metrics import METRICS, MetricsServer, METRICS_PATH
+from functools import partial
+import contextlib
 from datetime import datetime as dt
 import time
 import pandas as pd
 
-def find_breakouts():
+# find_breakouts runs at every close of these timeframes
+SCHEDULED_TIMEFRAMES = ['4hour']
+
+
+def download_candles(symbols: list, plan: FetchPlan):
+    """
+    Downloads the candles of the symbols one chunk at a time
+
+    Parameters
+    ----------
+    symbols : list
+        List of symbols to download data of
+    plan : FetchPlan
+        Timeframes downloaded, with their number of candles
+
+    Yields
+    ------
+    tuple (str, pd.DataFrame)
+        Timeframe and candles of a chunk, as soon as they are ready
+    """
+
+    # The store is opened here as SQLite connections are used in the thread
+    # that opened them, the download stage of the pipeline
+    store = CandleStore()
+    session = FetchSession()
+    stats = {timeframe: FetchStats(timeframe) for timeframe in plan.fetched}
+    try:
+        for chunk in chunks(symbols):
+            for timeframe, bars in plan.fetched.items():
+                yield timeframe, get_all_candles(chunk, timeframe, store, bars, stats[timeframe], session=session)
+    finally:
+        store.close()
+        session.close()
+        for timeframe_stats in stats.values():
+            print(timeframe_stats)
+        print(plan.report(stats, len(symbols)))
+
+
+def breakout_message(breakout: dict) -> str:
+    """
+    Text of the Telegram alert of a breakout
+
+    Parameters
+    ----------
+    breakout : dict
+        Breakout found by a strategy
+
+    Returns
+    -------
+    str
+        Exchange, symbol, type and timeframe of the breakout
+    """
+
+    return "{} | {} | {} | {}".format(breakout['exc'], breakout['symbol'], breakout['type'], breakout['timeframe'])
+
+
+def breakout_strategies(exchange: str) -> dict:
+    """
+    Strategies run on the candles of every timeframe
+
+    Parameters
+    ----------
+    exchange : str
+        Name of the exchange
+
+    Returns
+    -------
+    dict
+        Timeframe to list of strategies
+    """
+
+    return {
+        '4hour': [partial(ichimoku_breakout, timeframe='4h', exchange=exchange),
+                  partial(bb_rsi_breakout, exchange=exchange),
+                  partial(ma_vol_breakout, exchange=exchange),
+                  partial(sr_breakout, exchange=exchange)],
+        '1day': [partial(ichimoku_breakout, timeframe='1d', exchange=exchange)],
+    }
+
+
+def find_breakouts(workers: int =WORKERS, pool: ShardPool =None):
     """
     Function which composes the whole program to find breakouts
+
+    The candles are downloaded, the strategies run and the alerts sent in
+    a pipeline, so the first alerts go out while the last symbols are still
+    being downloaded. The strategies run on shards of symbols in a pool of
+    workers processes.
+
+    Parameters
+    ----------
+    workers : int
+        Number of processes running the strategies, 1 runs them in the
+        pipeline's thread
+    pool : ShardPool
+        Pool opened by the caller before starting any thread, kept open
+        for its next runs, a pool of workers processes is opened for this
+        run if not given
     
     Returns
     -------
     None
     """
     exchange = 'GATEIO'
-    breakouts = []
-    
+    strategies = breakout_strategies(exchange)
+    # Planned before anything is downloaded
+    plan = FetchPlan(strategies)
+    print(plan)
     symbols = get_all_symbols()
 
-    data_4h = get_all_candles(symbols, '4hour')
-    data_1d = get_all_candles(symbols, '1day')
-    data_4h = data_4h.reset_index(drop=True)        # reset index because when downloading data, it is not in order
-    data_1d = data_1d.reset_index(drop=True)
+    # The processes are forked before the threads of the notifier and the pipeline start,
+    # a pool given was opened by the caller before any of its threads.
+    # The alerts are queued to the notifier, which sends them in digests
+    pool = contextlib.nullcontext(pool) if pool is not None else ShardPool(strategies, workers)
+    with pool as pool, Notifier.from_config() as notifier:
+        pipeline = Pipeline(lambda: download_candles(symbols, plan), strategies,
+                            lambda breakout: notifier.notify(breakout_message(breakout)), pool=pool)
+        pipeline.run()
+    print(pipeline)
+    print(notifier)
 
-    breakouts = ichimoku_breakout(data_4h, breakouts, '4h', exchange)
-    breakouts = ichimoku_breakout(data_1d, breakouts, '1d', exchange)
-    breakouts = bb_rsi_breakout(data_4h, breakouts, exchange)
-    breakouts = ma_vol_breakout(data_4h, breakouts, exchange)
-    breakouts = sr_breakout(data_4h, breakouts, exchange)
-    
-    for dic in breakouts:
-        send(messages=["{} | {} | {} | {}".format(dic['exc'], dic['symbol'], dic['type'], dic['timeframe'])])
-        time.sleep(0.1)
+
+def run_daemon(max_memory: float =MAX_MEMORY, workers: int =WORKERS, pool: ShardPool =None):
+    """
+    Keeps the candles in memory and runs the strategies at every close,
+    downloading only the new candles
+
+    Parameters
+    ----------
+    max_memory : float
+        MB of resident memory before the candles are dropped
+    workers : int
+        Number of processes running the strategies
+    pool : ShardPool
+        Pool opened by the caller before starting any thread, a pool of
+        workers processes is opened if not given
+    """
+
+    exchange = 'GATEIO'
+    strategies = breakout_strategies(exchange)
+    plan = FetchPlan(strategies)
+    print(plan)
+
+    pool = contextlib.nullcontext(pool) if pool is not None else ShardPool(strategies, workers)
+    with pool as pool, Notifier.from_config() as notifier:
+        daemon = Daemon(plan, strategies,
+                        lambda breakout: notifier.notify(breakout_message(breakout)),
+                        max_memory=max_memory, pool=pool)
+        scheduler = CandleScheduler(get_server_time)
+        for timeframe in SCHEDULED_TIMEFRAMES:
+            scheduler.every(timeframe, daemon.tick)
+        scheduler.run()
         
         
 def main():
@@ -41,25 +174,35 @@ def main():
     timeflow and execution
 
     Argv : list
-        List of arguments passed to the program (false, true, -h, --help)
+        List of arguments passed to the program (false, true, daemon, -h, --help)
     """
-    if len(sys.argv) == 2:
+    if len(sys.argv) in (2, 3):
         if sys.argv[1] == '-h' or sys.argv[1] == '--help':
-            print('Usage: python3 main.py <repeat>')
-            print('<repeat> can be true or false')
+            print('Usage: python3 main.py <repeat> [max memory in MB]')
+            print('<repeat> can be true, false or daemon')
             exit()
         elif sys.argv[1] == 'true':
-            schedule.every().hour.at(':00').do(find_breakouts)
-            while True:
-                if (hour_rounder(dt.now())).timestamp() % 14400 == 0:
-                    schedule.run_pending()
-                time.sleep(1)
+            # The processes are forked once, before the metrics server and the scheduler start a thread
+            with ShardPool(breakout_strategies('GATEIO'), WORKERS) as pool:
+                print("Metrics served on {}".format(MetricsServer(METRICS).start()))
+                # Runs a few seconds after every close of the exchange clock
+                scheduler = CandleScheduler(get_server_time)
+                for timeframe in SCHEDULED_TIMEFRAMES:
+                    scheduler.every(timeframe, partial(find_breakouts, pool=pool))
+                scheduler.run()
+
+        elif sys.argv[1] == 'daemon':
+            with ShardPool(breakout_strategies('GATEIO'), WORKERS) as pool:
+                print("Metrics served on {}".format(MetricsServer(METRICS).start()))
+                run_daemon(float(sys.argv[2]) if len(sys.argv) == 3 else MAX_MEMORY, pool=pool)
 
         elif sys.argv[1] == 'false':
             find_breakouts()
+            METRICS.dump(METRICS_PATH)
+            print("{} written to {}".format(METRICS, METRICS_PATH))
 
         else:
-            raise Exception('Invalid argument: should be either true or false')
+            raise Exception('Invalid argument: should be either true, false or daemon')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,194 @@
+"""Scheduler of the jobs run at every candle close
+
+Candles of a timeframe close at fixed times of the exchange clock (every
+hour, every 4 hours from 00:00 UTC, every day at 00:00 UTC). This script
+sleeps until the next close of the timeframes jobs are registered on,
+runs the jobs of the timeframes closing at that time once, and goes back
+to sleep, instead of waking up every second to check the local clock.
+
+The clock is synced to the time of the exchange server, so the jobs start
+a couple of seconds after the exchange closed the candle whatever the
+drift of the local clock.
+
+This file can be imported as a module and contains the following:
+
+    * CandleScheduler - Runs jobs at the close of the candles of their timeframe
+    * next_close - Time of the next close of the candles of a timeframe
+
+"""
+
+import time
+from exchange.helpers import TIMEFRAME_SECONDS
+
+
+CLOSE_DELAY=2           # Seconds waited after a close so the exchange has the candle
+SYNC_INTERVAL=3600      # Maximum seconds slept before syncing the clock again
+
+
+def next_close(timeframe: str, now: float) -> float:
+    """
+    Time of the next close of the candles of a timeframe
+
+    Parameters
+    ----------
+    timeframe : str
+        The timeframe of the candles
+    now : float
+        Unix timestamp in seconds
+
+    Returns
+    -------
+    float
+        Unix timestamp in seconds of the first close strictly after now
+    """
+
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    return (now // seconds + 1) * seconds
+
+
+class CandleScheduler:
+    """
+    Runs jobs at the close of the candles of their timeframe
+
+    Every timeframe has its queue of jobs, run in the order they were
+    registered. When several timeframes close at the same time (every 4
+    hours the 1 hour and 4 hour candles close together) their jobs are run
+    one after the other, a job registered on several of them only once.
+
+    Attributes
+    ----------
+    server_time : callable
+        Returns the time of the exchange server, in seconds
+    delay : float
+        Seconds waited after a close before running the jobs
+    offset : float
+        Seconds to add to the local clock to get the server time
+    jobs : dict
+        Queue of jobs of every timeframe
+    """
+
+    def __init__(self, server_time=None, delay: float =CLOSE_DELAY):
+        self.server_time = server_time
+        self.delay = delay
+        self.offset = 0.0
+        self.jobs = {}
+        self.fired = {}
+
+    def every(self, timeframe: str, job):
+        """
+        Registers a job to run at every close of a timeframe
+
+        Parameters
+        ----------
+        timeframe : str
+            The timeframe of the candles
+        job : callable
+            Function called without arguments
+        """
+
+        if timeframe not in TIMEFRAME_SECONDS:
+            raise ValueError("Unknown timeframe: {}".format(timeframe))
+        self.jobs.setdefault(timeframe, []).append(job)
+
+    def now(self) -> float:
+        """Time of the exchange server, from the local clock and the offset"""
+
+        return time.time() + self.offset
+
+    def sync(self):
+        """
+        Measures the offset between the local clock and the exchange server
+
+        The server time is taken as the time in the middle of the request.
+        When the request fails the previous offset is kept.
+        """
+
+        if self.server_time is None:
+            return
+        try:
+            sent = time.time()
+            server = self.server_time()
+            received = time.time()
+        except Exception as error:
+            print("Clock sync failed, keeping offset {:+.3f}s: {}".format(self.offset, error))
+            return
+        self.offset = server - (sent + received) / 2
+
+    def next_run(self) -> tuple:
+        """
+        Next close of the registered timeframes
+
+        Returns
+        -------
+        tuple (float, list)
+            Time of the close and the timeframes closing at that time
+        """
+
+        # A sync moving the clock back never brings an already run close back
+        now = max([self.now()] + list(self.fired.values()))
+        closes = {timeframe: next_close(timeframe, now) for timeframe in self.jobs}
+        close = min(closes.values())
+        return close, [timeframe for timeframe in self.jobs if closes[timeframe] == close]
+
+    def sleep_until(self, target: float):
+        """
+        Sleeps until the server time reaches target, syncing the clock
+        again during long sleeps
+
+        Parameters
+        ----------
+        target : float
+            Unix timestamp in seconds of the server time to wake up at
+        """
+
+        while True:
+            remaining = target - self.now()
+            if remaining <= 0:
+                return
+            if remaining > SYNC_INTERVAL:
+                time.sleep(SYNC_INTERVAL)
+                self.sync()
+            else:
+                time.sleep(remaining)
+
+    def run_pending(self, close: float, timeframes: list):
+        """
+        Runs once the jobs of the timeframes closing at close
+
+        Parameters
+        ----------
+        close : float
+            Unix timestamp in seconds of the close
+        timeframes : list
+            Timeframes closing at that time
+        """
+
+        done = []
+        for timeframe in timeframes:
+            if self.fired.get(timeframe) == close:
+                continue
+            self.fired[timeframe] = close
+            for job in self.jobs[timeframe]:
+                if job in done:
+                    continue
+                done.append(job)
+                try:
+                    job()
+                except Exception as error:
+                    print("Job {} of {} failed: {}".format(getattr(job, '__name__', job), timeframe, error))
+
+    def run(self):
+        """Sleeps until every close and runs its jobs, never returns"""
+
+        if not self.jobs:
+            raise ValueError("No job registered")
+        self.sync()
+        while True:
+            close, timeframes = self.next_run()
+            self.sleep_until(close + self.delay)
+            started = self.now()
+            self.run_pending(close, timeframes)
+            print("Ran {} close of {} UTC, {:.1f}s after the close, in {:.1f}s".format(
+                '/'.join(timeframes), time.strftime('%Y-%m-%d %H:%M', time.gmtime(close)),
+                started - close, self.now() - started))
+            self.sync()
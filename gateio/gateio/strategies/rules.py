@@ -0,0 +1,464 @@
+"""Conditions of the strategies written as rules
+
+A rule is a condition on the last candles of a symbol written like a
+Python expression, where close[0] is the close of the last candle,
+close[-1] the one before it and so on:
+
+    close[0] >= close[-1] and close[-1] > close[-2] and tenkan[0] > kijun[0]
+
+This script parses a rule once and compiles it into NumPy operations on
+strategies.tails, so it is evaluated on all symbols at once, on their last
+candle (Tails) or on every candle of their history (History). The
+indicators a rule refers to are found from their names and calculated on
+the candles before the rule is evaluated.
+
+Names of a rule:
+
+    * open, high, low, close, volume - Columns of the candles
+    * sma, sma_open, sma_volume... - SMA of a column (close if not given)
+      over sma_period candles, or over the period written after it (sma50)
+    * tenkan, kijun, senkou_a, senkou_b - Ichimoku lines
+    * bb_middle, bb_std - Middle band and standard deviation of the
+      Bollinger Bands
+    * stoch_rsi, stoch_k, stoch_d - Stochastic RSI and its K and D lines
+    * any parameter given to the rule, like the thresholds of a strategy
+
+and abs(x), max(x, y), min(x, y), numbers, + - * /, comparisons, and, or
+and not.
+
+The periods of the indicators are parameters too (INDICATOR_PARAMS), so a
+rule can be built again with other thresholds and periods:
+
+    Rule("bb_middle[0] - dev * bb_std[0] >= close[0]", dev=1.5, bb_period=20)
+
+A rule knows how many candles of every symbol it needs (Rule.bars): the
+candles it reads back plus the candles its indicators need before their
+first value, so the runner downloads no more of them.
+
+This file can be imported as a module and contains the following:
+
+    * Rule - Condition of a strategy compiled to NumPy masks
+    * indicator_of - Indicator of ta_lib.engine behind a name of a rule
+    * warmup - Candles before the first value of a name of a rule
+
+"""
+
+import ast
+import re
+import numpy as np
+import pandas as pd
+from ta_lib import engine
+from strategies.tails import Tails, History, DEPTH
+
+
+CANDLE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+EMA_WARMUP=100          # Candles before an exponential average forgets its first value
+
+# Parameters of the indicators and their default values
+INDICATOR_PARAMS: dict = {
+    'tenkan_period': 20,
+    'kijun_period': 60,
+    'senkou_period': 120,
+    'ichimoku_shift': 30,
+    'bb_period': 20,
+    'rsi_period': 14,
+    'stoch_k_period': 3,
+    'stoch_d_period': 3,
+    'sma_period': 25,
+}
+
+# Name of a rule to (function of ta_lib.engine, its arguments to the parameters
+# giving them, key of the result when it is a dict)
+ICHIMOKU_ARGUMENTS = {'tenkan_period': 'tenkan_period', 'kinjun_period': 'kijun_period', 'period': 'ichimoku_shift'}
+BOLLINGER_ARGUMENTS = {'period': 'bb_period'}
+STOCH_ARGUMENTS = {'period': 'rsi_period', 'k_period': 'stoch_k_period', 'd_period': 'stoch_d_period'}
+INDICATOR_NAMES: dict = {
+    'tenkan': ('tenkan_sen', {'period': 'tenkan_period'}, None),
+    'kijun': ('kinjun_sen', {'period': 'kijun_period'}, None),
+    'senkou_a': ('senkou_span_a', ICHIMOKU_ARGUMENTS, None),
+    'senkou_b': ('senkou_span_b', {'period': 'senkou_period', 'shift_period': 'ichimoku_shift'}, None),
+    'bb_middle': ('bollinger_bands', BOLLINGER_ARGUMENTS, 'bb_middle'),
+    'bb_std': ('bollinger_bands', BOLLINGER_ARGUMENTS, 'bb_std'),
+    'stoch_rsi': ('stoch_rsi', STOCH_ARGUMENTS, 'stoch_rsi'),
+    'stoch_k': ('stoch_rsi', STOCH_ARGUMENTS, 'stoch_rsi_k'),
+    'stoch_d': ('stoch_rsi', STOCH_ARGUMENTS, 'stoch_rsi_d'),
+}
+SMA_NAME = re.compile(r'sma(?:_(open|high|low|close|volume))?(\d*)$')
+
+COMPARISONS = {ast.Gt: np.greater, ast.GtE: np.greater_equal, ast.Lt: np.less,
+               ast.LtE: np.less_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal}
+OPERATORS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+
+
+def indicator_of(name: str, params: dict =INDICATOR_PARAMS) -> tuple:
+    """
+    Indicator of ta_lib.engine behind a name of a rule
+
+    Parameters
+    ----------
+    name : str
+        Name used in the rule
+    params : dict
+        Parameters of the indicators
+
+    Returns
+    -------
+    tuple (str, dict, str)
+        Function of ta_lib.engine, its parameters and the key of its
+        result when it returns a dict, None if the name is not an indicator
+    """
+
+    if name in INDICATOR_NAMES:
+        function, arguments, key = INDICATOR_NAMES[name]
+        return function, {argument: params[param] for argument, param in arguments.items()}, key
+    match = SMA_NAME.match(name)
+    if match:
+        period = int(match.group(2)) if match.group(2) else params['sma_period']
+        return 'sma', {'column': match.group(1) or 'close', 'period': period}, None
+    return None
+
+
+def warmup(name: str, params: dict =INDICATOR_PARAMS) -> int:
+    """
+    Candles of a symbol before the first value of a name of a rule
+
+    Parameters
+    ----------
+    name : str
+        Name used in the rule
+    params : dict
+        Parameters of the indicators
+
+    Returns
+    -------
+    int
+        Number of candles, 0 for a column of the candles
+    """
+
+    indicator = indicator_of(name, params)
+    if indicator is None:
+        return 0
+    function, arguments, key = indicator
+    if function == 'senkou_span_a':
+        return max(arguments['tenkan_period'], arguments['kinjun_period']) - 1 + arguments['period']
+    if function == 'senkou_span_b':
+        return arguments['period'] - 1 + arguments['shift_period']
+    if function == 'stoch_rsi':
+        # The RSI starts after period moves, its extremes over period RSIs, then the
+        # averages of K and D. The RSI is an exponential average of the moves
+        candles = 2 * arguments['period'] - 1 + EMA_WARMUP
+        if key != 'stoch_rsi':
+            candles += arguments['k_period'] - 1
+        if key == 'stoch_rsi_d':
+            candles += arguments['d_period'] - 1
+        return candles
+    # Rolling windows: sma, tenkan_sen, kinjun_sen and bollinger_bands
+    return arguments['period'] - 1
+
+
+def highest(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # Same as max(x, y), which keeps x when one of them is NaN
+    return np.where(y > x, y, x)
+
+
+def lowest(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # Same as min(x, y), which keeps x when one of them is NaN
+    return np.where(y < x, y, x)
+
+
+FUNCTIONS = {'abs': (np.abs, 1), 'max': (highest, 2), 'min': (lowest, 2)}
+
+
+class Rule:
+    """
+    Condition of a strategy compiled to NumPy masks
+
+    Attributes
+    ----------
+    text : str
+        The rule as written
+    params : dict
+        Parameters of the rule and of its indicators
+    lookback : dict
+        Name to number of candles read of every column the rule refers to
+    """
+
+    def __init__(self, text: str, **params):
+        self.text = text
+        self.source = ' '.join(text.split())
+        self.params = {**INDICATOR_PARAMS, **params}
+        self.lookback = {}
+        self.used = set()
+        try:
+            tree = ast.parse(self.source, mode='eval')
+        except SyntaxError as error:
+            raise ValueError("Invalid rule {!r}: {}".format(text, error.msg))
+        self.condition = self.compile(tree.body)
+
+        unknown = set(params) - set(INDICATOR_PARAMS) - self.used
+        if unknown:
+            raise ValueError("Parameters {} are not used by rule {!r}".format(', '.join(sorted(unknown)), text))
+
+    def with_params(self, **params):
+        """
+        The same rule with other parameters
+
+        Parameters
+        ----------
+        **params
+            Parameters replacing the ones of the rule
+
+        Returns
+        -------
+        Rule
+            New rule, the parameters not given are kept
+        """
+
+        return Rule(self.text, **{**self.params, **params})
+
+    @property
+    def depth(self) -> int:
+        """Number of candles of every symbol the rule reads"""
+
+        return max(self.lookback.values(), default=1)
+
+    @property
+    def bars(self) -> int:
+        """Number of candles of every symbol the rule needs, its indicators included"""
+
+        return max([read + warmup(name, self.params) for name, read in self.lookback.items()], default=1)
+
+    @property
+    def indicators(self) -> list:
+        """Names of the indicators the rule refers to"""
+
+        return [name for name in self.lookback if indicator_of(name, self.params) is not None]
+
+    def compile(self, node: ast.AST):
+        """
+        Compiles a node of the rule into a function of the tails
+
+        Parameters
+        ----------
+        node : ast.AST
+            Node of the parsed rule
+
+        Returns
+        -------
+        callable
+            Function of a Tails (or History) returning an array with one
+            value per symbol (per candle of every symbol), or a number
+
+        Raises
+        ------
+        ValueError
+            If the rule uses anything else than what a rule allows
+        """
+
+        if isinstance(node, ast.BoolOp):
+            operands = [self.compile(value) for value in node.values]
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return lambda tails: combine.reduce([operand(tails) for operand in operands])
+
+        if isinstance(node, ast.Compare):
+            # Chained comparisons: a < b < c is a < b and b < c
+            operands = [self.compile(node.left)] + [self.compile(value) for value in node.comparators]
+            comparisons = [COMPARISONS[type(op)] for op in node.ops if type(op) in COMPARISONS]
+            if len(comparisons) != len(node.ops):
+                raise ValueError("Invalid comparison in rule {!r}".format(self.text))
+
+            def compare(tails):
+                values = [operand(tails) for operand in operands]
+                return np.logical_and.reduce([comparison(left, right) for comparison, left, right
+                                              in zip(comparisons, values, values[1:])])
+            return compare
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self.compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda tails: np.logical_not(operand(tails))
+            if isinstance(node.op, ast.USub):
+                return lambda tails: -operand(tails)
+            if isinstance(node.op, ast.UAdd):
+                return operand
+
+        if isinstance(node, ast.BinOp) and type(node.op) in OPERATORS:
+            left, right = self.compile(node.left), self.compile(node.right)
+            operator = OPERATORS[type(node.op)]
+            return lambda tails: operator(left(tails), right(tails))
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS \
+                and not node.keywords:
+            function, arity = FUNCTIONS[node.func.id]
+            if len(node.args) != arity:
+                raise ValueError("{} takes {} arguments in rule {!r}".format(node.func.id, arity, self.text))
+            arguments = [self.compile(argument) for argument in node.args]
+            return lambda tails: function(*[argument(tails) for argument in arguments])
+
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            return lambda tails: node.value
+
+        if isinstance(node, ast.Name):
+            if node.id in self.params and node.id not in CANDLE_COLUMNS \
+                    and indicator_of(node.id, self.params) is None:
+                self.used.add(node.id)
+                value = self.params[node.id]
+                return lambda tails: value
+            return self.reference(node.id, 0)
+
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name):
+            index = node.slice.value if isinstance(node.slice, getattr(ast, 'Index', ())) else node.slice
+            try:
+                index = ast.literal_eval(index)
+            except ValueError:
+                index = None
+            if not isinstance(index, int) or index > 0:
+                raise ValueError("Candles are read with [0], [-1], [-2]... in rule {!r}".format(self.text))
+            return self.reference(node.value.id, index)
+
+        raise ValueError("Unsupported expression {!r} in rule {!r}".format(
+            ast.get_source_segment(self.source, node) or type(node).__name__, self.text))
+
+    def reference(self, name: str, index: int):
+        """
+        Compiles a reference to a value of a candle
+
+        Parameters
+        ----------
+        name : str
+            Name of a column or indicator
+        index : int
+            0 for the last candle, -1 for the one before...
+
+        Returns
+        -------
+        callable
+            Function of a Tails (or History) returning one value per
+            symbol (per candle of every symbol)
+        """
+
+        if name not in CANDLE_COLUMNS and indicator_of(name, self.params) is None:
+            raise ValueError("Unknown name {} in rule {!r}".format(name, self.text))
+        self.lookback[name] = max(self.lookback.get(name, 0), 1 - index)
+        return lambda tails: tails.last(name, 1 - index)
+
+    def columns(self, data: pd.DataFrame, panel: engine.Panel =None, compute=None) -> dict:
+        """
+        Indicators the rule refers to, calculated on the candles
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles of all symbols
+        panel : engine.Panel
+            Panel of the candles, built if not given
+        compute : callable
+            Called with the name and parameters of a function of ta_lib.engine
+            to get its result on the candles, the function is called on the
+            panel if not given
+
+        Returns
+        -------
+        dict of pd.Series
+            Name to values of every indicator of the rule, one per candle
+        """
+
+        if compute is None:
+            panel = panel if panel is not None else engine.Panel(data)
+            compute = lambda function, **params: getattr(engine, function)(panel, **params)
+
+        columns = {}
+        for name in self.indicators:
+            function, params, key = indicator_of(name, self.params)
+            result = compute(function, **params)
+            columns[name] = result[key] if key is not None else result
+        return columns
+
+    def tails(self, data: pd.DataFrame, panel: engine.Panel =None, compute=None) -> Tails:
+        """
+        Last candles of every symbol with the indicators of the rule
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles of all symbols
+        panel : engine.Panel
+            Panel of the candles, built if not given
+        compute : callable
+            Called like in Rule.columns
+
+        Returns
+        -------
+        Tails
+            Tails with a column named after every indicator of the rule
+        """
+
+        panel = panel if panel is not None else engine.Panel(data)
+        columns = self.columns(data, panel, compute)
+        # assign returns a new dataframe, the one of the caller is left unchanged
+        return Tails(data.assign(**columns) if columns else data, panel, max(DEPTH, self.depth))
+
+    def history(self, data: pd.DataFrame, panel: engine.Panel =None, compute=None) -> History:
+        """
+        Every candle of every symbol with the indicators of the rule
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles of all symbols
+        panel : engine.Panel
+            Panel of the candles, built if not given
+        compute : callable
+            Called like in Rule.columns
+
+        Returns
+        -------
+        History
+            History with a column named after every indicator of the rule
+        """
+
+        panel = panel if panel is not None else engine.Panel(data)
+        columns = self.columns(data, panel, compute)
+        return History(data.assign(**columns) if columns else data, panel, self.depth)
+
+    def mask(self, tails: Tails) -> np.ndarray:
+        """
+        Symbols meeting the rule
+
+        Parameters
+        ----------
+        tails : Tails
+            Tails returned by Rule.tails
+
+        Returns
+        -------
+        np.ndarray
+            One boolean per symbol of the tails
+        """
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.broadcast_to(np.asarray(self.condition(tails), dtype=bool), tails.symbols.shape)
+
+    def signals(self, history: History) -> np.ndarray:
+        """
+        Candles of every symbol meeting the rule
+
+        Parameters
+        ----------
+        history : History
+            History returned by Rule.history
+
+        Returns
+        -------
+        np.ndarray
+            Booleans of shape (candles, symbols), True where the rule is met
+            with the candle as the last one
+        """
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.broadcast_to(np.asarray(self.condition(history), dtype=bool), history.shape)
+
+    def __repr__(self) -> str:
+        params = {name: value for name, value in self.params.items() if INDICATOR_PARAMS.get(name) != value}
+        return "Rule({!r}{})".format(self.text, ''.join(', {}={!r}'.format(*item) for item in params.items()))
@@ -236,25 +236,13 @@ def fractal_detection(data: pd.DataFrame) -> list:
     list of tuples (int, float)
         List of tuples containing the index and value of the support and resistance levels
     """
-    levels = []
-    data_low = data.low
-    data_high = data.high
-    
-    for i in range(2, data_high.shape[0]-2):
-        if is_support(data_low, i):
-            l = data_low.iloc[i]
-            if is_far_from_level(l, levels, data_high, data_low):
-                levels.append((i, l))
-                
-        elif is_resistance(data_high, i):
-            l = data_high.iloc[i]
-            if is_far_from_level(l, levels, data_high, data_low):
-                levels.append((i, l))
-                
-    return levels
+
+    average = (data.high - data.low).mean()
+    return fractal_levels(data.high.to_numpy(dtype='float64')[:, None],
+                          data.low.to_numpy(dtype='float64')[:, None], [average])[0]
 
 
-def window_detection(data: pd.DataFrame) -> list:
+def window_detection(data: pd.DataFrame, high_window: int =9, low_window: int =10, repeat: int =5) -> list:
     """
     Search for support and resistance levels using window shifting
 
@@ -262,34 +250,123 @@ def window_detection(data: pd.DataFrame) -> list:
     ----------
     data : pd.DataFrame
         Dataframe containing the data the user wants to search levels on
+    high_window : int
+        Number of candles of the windows the highs are searched on
+    low_window : int
+        Number of candles of the windows the lows are searched on
+    repeat : int
+        Number of consecutive windows an extreme has to stay the same
 
     Returns
     -------
     list of tuples (int, float)
         List of tuples containing the index and value of the support and resistance levels
     """
-    
-    levels = []
-    max_list = []
-    min_list = []
-    data_high = data.high
-    data_low = data.low
-    
-    for i in range(5, len(data_high)-5):
-        high_range = data_high.iloc[i-5:i+4]
-        current_max = high_range.max()
-        if current_max not in max_list:
-            max_list = []
-        max_list.append(current_max)
-        if len(max_list) == 5 and is_far_from_level(current_max, levels, data_high, data_low):
-            levels.append((high_range.idxmax(), current_max))
-
-        low_range = data_low.iloc[i-5:i+5]
-        current_min = low_range.min()
-        if current_min not in min_list:
-            min_list = []
-        min_list.append(current_min)
-        if len(min_list) == 5 and is_far_from_level(current_min, levels, data_high, data_low):
-            levels.append((low_range.idxmin(), current_min))
-            
+
+    average = (data.high - data.low).mean()
+    levels = window_levels(data.high.to_numpy(dtype='float64')[:, None],
+                           data.low.to_numpy(dtype='float64')[:, None], [average],
+                           high_window=high_window, low_window=low_window, repeat=repeat)[0]
+    return [(data.index[i], l) for i, l in levels]
+
+
+def fractal_levels(high: np.ndarray, low: np.ndarray, averages: list) -> list:
+    """
+    Fractal support and resistance levels of every symbol of a panel
+
+    Parameters
+    ----------
+    high : np.ndarray
+        Time x symbols panel of the highs, padded with NaN at the end
+    low : np.ndarray
+        Time x symbols panel of the lows, padded with NaN at the end
+    averages : list
+        Average range of the candles of every symbol
+
+    Returns
+    -------
+    list of lists of tuples (int, float)
+        Position (inside the symbol) and value of the levels of every symbol
+    """
+
+    # Every 5 candle pivot is found at once, a candle that is both a support
+    # and a resistance counts as a support. The NaN padding is never a pivot.
+    support = supports(low)
+    pivots = support | resistances(high)
+    values = np.where(support, low, high)
+
+    # The spacing filter depends on the levels kept before, so the pivots of
+    # a symbol are gone through in order
+    levels = [[] for _ in range(high.shape[1])]
+    rows, columns = np.nonzero(pivots.T)
+    for symbol, i in zip(rows, columns):
+        l = values[i, symbol]
+        if is_far_from_level(l, levels[symbol], average=averages[symbol]):
+            levels[symbol].append((int(i), l))
+
+    return levels
+
+
+def window_levels(high: np.ndarray, low: np.ndarray, averages: list, lengths: np.ndarray =None,
+                  high_window: int =9, low_window: int =10, repeat: int =5) -> list:
+    """
+    Window support and resistance levels of every symbol of a panel
+
+    At every step i the highest high of the high_window candles and the
+    lowest low of the low_window candles starting on candle i - window // 2
+    (window being the largest of both) are taken. An extreme that stays the
+    same for exactly `repeat` consecutive steps is a level. The extremes of
+    all windows come from two rolling passes, so the detection runs in
+    linear time.
+
+    Parameters
+    ----------
+    high : np.ndarray
+        Time x symbols panel of the highs, padded with NaN at the end
+    low : np.ndarray
+        Time x symbols panel of the lows, padded with NaN at the end
+    averages : list
+        Average range of the candles of every symbol
+    lengths : np.ndarray
+        Number of candles of every symbol, all rows of the panel by default
+    high_window : int
+        Number of candles of the windows the highs are searched on
+    low_window : int
+        Number of candles of the windows the lows are searched on
+    repeat : int
+        Number of consecutive windows an extreme has to stay the same
+
+    Returns
+    -------
+    list of lists of tuples (int, float)
+        Position (inside the symbol) and value of the levels of every symbol
+    """
+
+    candles, symbols = high.shape
+    lengths = np.full(symbols, candles) if lengths is None else np.asarray(lengths)
+    start = max(high_window, low_window) // 2
+    steps = np.arange(start, max(candles - start, start))
+
+    # Rolling max/min skipping NaN like Series.max and Series.min, the
+    # window of step i ends on candle i - start + window - 1
+    highs = pd.DataFrame(high).rolling(window=high_window, min_periods=1).max().to_numpy()
+    lows = pd.DataFrame(low).rolling(window=low_window, min_periods=1).min().to_numpy()
+    current_max = highs[steps - start + high_window - 1]
+    current_min = lows[steps - start + low_window - 1]
+    valid = steps[:, None] < lengths - start
+
+    events = []
+    for kind, current in enumerate([current_max, current_min]):
+        found = (run_lengths(current) == repeat) & valid
+        for step, symbol in zip(*np.nonzero(found)):
+            events.append((symbol, steps[step], kind, current[step, symbol]))
+    events.sort(key=lambda event: event[:3])
+
+    levels = [[] for _ in range(symbols)]
+    for symbol, i, kind, l in events:
+        if is_far_from_level(l, levels[symbol], average=averages[symbol]):
+            # Position of the first candle of the window holding the extreme
+            window = (high if kind == 0 else low)[i - start:i - start + (high_window, low_window)[kind], symbol]
+            levels[symbol].append((int(i - start + np.flatnonzero(window == l)[0]), l))
+
     return levels
@@ -0,0 +1,300 @@
+"""Backtest of the strategies over the history of candles
+
+The live runner only evaluates the strategies on the last candle of every
+symbol. This script evaluates them on every candle of the history of
+every symbol, as if that candle was the last one, and measures the return
+of the close a number of candles later (the horizons) after every signal.
+
+The strategies written as rules (strategies.rules) are evaluated on every
+candle of every symbol at once: every candle read by a rule is the whole
+panel of a column shifted by its position, so a rule is a few NumPy
+operations over arrays of candles x symbols. The support and resistance
+strategy depends on the levels found over a whole window of candles, it
+is run like live on the window ending at every step-th candle instead.
+
+The history is read from the candle store or from a CSV (or parquet) file
+with the columns of the candles and the symbol, and evaluated in chunks of
+symbols so that the memory does not grow with the number of symbols. The
+indicators are calculated over the whole history of a symbol instead of
+the window of the live runner, the indicators based on an exponential
+average (Stochastic RSI) can differ slightly on the first candles.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m backtest <timeframe> [data file] [horizon ...]
+
+This file can be imported as a module and contains the following:
+
+    * Backtest - Signals of the strategies and the returns after them
+    * load_history - Reads the history of candles chunk by chunk of symbols
+    * forward_returns - Return of the close a number of candles later
+    * replay - Runs a strategy on the window ending at every step-th candle
+
+"""
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from exchange.helpers import COLUMNS, TYPES, MIN_CANDLES, WINDOW, STORE_PATH
+from exchange.store import CandleStore
+from strategies.rules import Rule
+from strategies.strategies import ICHIMOKU, BB_RSI, ROUNDING, MA_INCH, BOTTOM, MA_PUMPERS, sr_signals
+from ta_lib import engine
+from pipeline import chunks
+
+
+HORIZONS=[1, 4, 24]     # Candles after a signal its return is measured over
+CHUNK_SIZE=100          # Symbols evaluated together
+REPLAY_STEP=24          # Candles between two runs of the strategies that are not rules
+
+# Name to Rule, or function of the candles (and their panel) returning the symbols with a signal
+STRATEGIES: dict = {
+    'ichimoku': ICHIMOKU,
+    'bb_rsi': BB_RSI,
+    'rounding': ROUNDING,
+    'ma_inch': MA_INCH,
+    'bottom': BOTTOM,
+    'ma_pumpers': MA_PUMPERS,
+    'sr': sr_signals,
+}
+
+
+def load_history(path: str, timeframe: str, size: int =CHUNK_SIZE):
+    """
+    Reads the history of candles chunk by chunk of symbols
+
+    Parameters
+    ----------
+    path : str
+        Candle store (SQLite) or .csv / .parquet file with the columns of
+        the candles and the symbol, and optionally the timeframe
+    timeframe : str
+        The timeframe of the candles
+    size : int
+        Number of symbols of every chunk
+
+    Yields
+    ------
+    pd.DataFrame
+        Candles of the symbols of a chunk, in chronological order for
+        every symbol
+    """
+
+    if path.endswith(('.csv', '.csv.gz', '.parquet')):
+        data = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+        if 'timeframe' in data:
+            data = data[data.timeframe == timeframe]
+        data = data[COLUMNS + ['symbol']].astype(TYPES)
+        data = data.sort_values(['symbol', 'time'], kind='stable').drop_duplicates(['symbol', 'time'], keep='last')
+
+        # Position of the first candle of every chunk of symbols
+        starts = np.flatnonzero(np.r_[True, data.symbol.values[1:] != data.symbol.values[:-1]])
+        bounds = np.r_[starts[::size], len(data)]
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            yield data.iloc[start:end].reset_index(drop=True)
+    else:
+        store = CandleStore(path)
+        try:
+            for chunk in chunks(sorted(store.last_times(timeframe)), size):
+                yield store.load(chunk, timeframe)
+        finally:
+            store.close()
+
+
+def forward_returns(close: np.ndarray, horizon: int) -> np.ndarray:
+    """
+    Return of the close a number of candles later
+
+    Parameters
+    ----------
+    close : np.ndarray
+        Closes of shape (candles, symbols)
+    horizon : int
+        Number of candles
+
+    Returns
+    -------
+    np.ndarray
+        Array of shape (candles, symbols), NaN where the symbol has no
+        candle horizon candles later
+    """
+
+    returns = np.full_like(close, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return returns
+
+
+def replay(function, panel: engine.Panel, step: int =REPLAY_STEP, window: int =WINDOW,
+           start: int =MIN_CANDLES - 1) -> np.ndarray:
+    """
+    Runs a strategy on the window ending at every step-th candle, for all
+    symbols at once
+
+    Parameters
+    ----------
+    function : callable
+        Called with the candles of a window, returns the symbols with a
+        signal on the last candle
+    panel : engine.Panel
+        Panel of the candles
+    step : int
+        Number of candles between two runs
+    window : int
+        Number of candles given to the strategy, like the live runner
+    start : int
+        First candle the strategy is run on
+
+    Returns
+    -------
+    np.ndarray
+        Booleans of shape (candles, symbols), True where a signal is given
+    """
+
+    candles, symbols = panel.lengths.max(initial=0), len(panel.symbols)
+    signals = np.zeros((candles, symbols), dtype=bool)
+    index = {symbol: i for i, symbol in enumerate(panel.symbols)}
+    columns = {column: panel[column] for column in COLUMNS}
+
+    for end in range(start, candles, step):
+        n = min(window, end + 1)
+        alive = np.flatnonzero(panel.lengths > end)
+        frame = pd.DataFrame({column: values[end + 1 - n:end + 1, alive].T.ravel()
+                              for column, values in columns.items()})
+        frame['symbol'] = np.repeat(panel.symbols[alive], n)
+        for symbol in function(frame.astype(TYPES)):
+            signals[end, index[symbol]] = True
+    return signals
+
+
+class Backtest:
+    """
+    Signals of the strategies on every candle of the history and the
+    returns after them
+
+    Attributes
+    ----------
+    strategies : dict
+        Name to Rule or function, like STRATEGIES
+    timeframe : str
+        The timeframe of the candles
+    horizons : list
+        Candles after a signal its return is measured over
+    step : int
+        Candles between two runs of the strategies that are not rules
+    min_candles : int
+        Candles of a symbol before the first one a signal can be given on
+    candles : int
+        Number of candles evaluated
+    """
+
+    def __init__(self, strategies: dict, timeframe: str, horizons: list =HORIZONS, step: int =REPLAY_STEP,
+                 min_candles: int =MIN_CANDLES):
+        self.strategies = strategies
+        self.timeframe = timeframe
+        self.horizons = list(horizons)
+        self.step = step
+        self.min_candles = min_candles
+        self.candles = 0
+        self.symbols = 0
+        self.elapsed = 0.0
+        # Name to signals, and to count of returns, hits and sum of the returns per horizon
+        self.signals = dict.fromkeys(strategies, 0)
+        self.trades = {name: np.zeros(len(self.horizons), dtype='int64') for name in strategies}
+        self.hits = {name: np.zeros(len(self.horizons), dtype='int64') for name in strategies}
+        self.returns = {name: np.zeros(len(self.horizons)) for name in strategies}
+
+    def run(self, data: pd.DataFrame):
+        """
+        Evaluates the strategies on every candle of a chunk of symbols and
+        adds up their results
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles of the symbols, in chronological order for every symbol
+        """
+
+        if data.empty:
+            return
+        start = time.perf_counter()
+        panel = engine.Panel(data)
+        close = panel['close']
+        returns = [forward_returns(close, horizon) for horizon in self.horizons]
+        # Signals need min_candles candles, like the windows of the live runner
+        warm = (np.arange(close.shape[0]) >= self.min_candles - 1)[:, None]
+
+        # Every indicator is calculated once for all the rules using it with the same parameters
+        results = {}
+
+        def compute(function, **params):
+            key = (function, tuple(sorted(params.items())))
+            if key not in results:
+                results[key] = getattr(engine, function)(panel, **params)
+            return results[key]
+
+        for name, strategy in self.strategies.items():
+            if isinstance(strategy, Rule):
+                signals = strategy.signals(strategy.history(data, panel, compute))
+            else:
+                signals = replay(strategy, panel, self.step, start=self.min_candles - 1)
+            signals = signals & warm & ~np.isnan(close)
+
+            self.signals[name] += int(signals.sum())
+            for i, horizon_returns in enumerate(returns):
+                signal_returns = horizon_returns[signals]
+                signal_returns = signal_returns[~np.isnan(signal_returns)]
+                self.trades[name][i] += len(signal_returns)
+                self.hits[name][i] += int((signal_returns > 0).sum())
+                self.returns[name][i] += signal_returns.sum()
+
+        self.candles += len(data)
+        self.symbols += len(panel.symbols)
+        self.elapsed += time.perf_counter() - start
+
+    def report(self) -> pd.DataFrame:
+        """
+        Results of every strategy for every horizon
+
+        Returns
+        -------
+        pd.DataFrame
+            Signals, signals with a return, hit rate (share of positive
+            returns) and average return of every strategy and horizon
+        """
+
+        rows = []
+        for name in self.strategies:
+            for i, horizon in enumerate(self.horizons):
+                trades = self.trades[name][i]
+                rows.append({'strategy': name, 'timeframe': self.timeframe, 'horizon': horizon,
+                             'signals': self.signals[name], 'trades': trades,
+                             'hit_rate': self.hits[name][i] / trades if trades else np.nan,
+                             'avg_return': self.returns[name][i] / trades if trades else np.nan})
+        return pd.DataFrame(rows)
+
+    def __str__(self) -> str:
+        return "{}\nBacktest {}: {} symbols, {} candles in {:.1f}s ({:.0f} candles/s)".format(
+            self.report().to_string(index=False, float_format='{:.4f}'.format), self.timeframe,
+            self.symbols, self.candles, self.elapsed, self.candles / self.elapsed if self.elapsed else 0)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] in ('-h', '--help'):
+        print('Usage: python3 -m backtest <timeframe> [data file] [horizon ...]')
+        exit()
+
+    timeframe = sys.argv[1]
+    path = sys.argv[2] if len(sys.argv) > 2 else STORE_PATH
+    horizons = [int(arg) for arg in sys.argv[3:]] or HORIZONS
+
+    backtest = Backtest(STRATEGIES, timeframe, horizons)
+    for data in load_history(path, timeframe):
+        backtest.run(data)
+        print("{} symbols, {} candles".format(backtest.symbols, backtest.candles))
+    print(backtest)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Load test of the downloads and strategies against the mock exchange
+
+Starts mock_exchange with a number of symbols on both exchanges, delayed
+responses and injected errors and 429s, and downloads the window of every
+symbol of both exchanges through their adapters. The rate limits are
+raised above the real ones so the fetcher is measured instead of the
+limits of the exchanges, and every symbol must be downloaded despite the
+injected faults. Then the strategies of both exchanges are run on a
+pipeline downloading into a temporary candle store, as exchanges.py does.
+The strategies printing their signals are silenced during the run.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m benchmarks.fetch [symbols] [latency] [error rate] [throttle rate]
+
+"""
+
+import os
+import sys
+import time
+import tempfile
+import contextlib
+from exchange.adapters import KucoinAdapter, GateioAdapter
+from exchange.exchange import get_all_candles, FetchStats
+from exchange.helpers import TokenBucket, RetryPolicy, CircuitBreaker, WINDOW, MAX_RETRIES
+from mock_exchange import MockExchange, SyntheticMarket
+from exchanges import EXCHANGES, exchange_strategies, exchange_plans, download_exchanges
+from pipeline import Pipeline
+from sharding import ShardPool, WORKERS
+
+
+RATE_LIMIT=500          # Requests per second to the mock exchange
+
+
+def run(symbols: int =5000, latency: float =0.05, error_rate: float =0.01, throttle_rate: float =0.01):
+    """
+    Runs the load test and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols of every exchange
+    latency : float
+        Seconds every response is delayed, up to twice as much with the jitter
+    error_rate : float
+        Share of the requests answered with a 500
+    throttle_rate : float
+        Share of the requests answered with a 429
+    """
+
+    names = list(EXCHANGES)
+    strategies = exchange_strategies(names)
+    # The processes are forked before the server starts its threads
+    with ShardPool(strategies, WORKERS) as pool:
+        server = MockExchange(SyntheticMarket(symbols), latency, latency, error_rate, throttle_rate, retry_after=0.1)
+        # Any free port, the adapters are given the URL of the server
+        server.start(port=0)
+        with tempfile.TemporaryDirectory() as directory:
+            adapters = {}
+            for adapter, url in ((KucoinAdapter, server.url), (GateioAdapter, server.gateio_url)):
+                adapter = adapter(TokenBucket(RATE_LIMIT, RATE_LIMIT), RetryPolicy(MAX_RETRIES, 0.05, 1),
+                                  CircuitBreaker(symbols, 1), url)
+                adapters[adapter.name] = adapter
+
+            lists = {name: adapter.symbols() for name, adapter in adapters.items()}
+            for name, timeframe in (('KUCOIN', '1hour'), ('GATEIO', '4hour')):
+                stats = FetchStats(timeframe)
+                data = get_all_candles(lists[name], timeframe, bars=WINDOW, stats=stats, adapter=adapters[name])
+                assert data.symbol.nunique() == symbols, "{} symbols of {} downloaded".format(
+                    data.symbol.nunique(), name)
+                print(name, stats)
+            print(server)
+
+            plans = exchange_plans(names)
+            breakouts = []
+            start = time.perf_counter()
+            with open(os.devnull, 'w') as devnull:
+                pipeline = Pipeline(lambda: download_exchanges(lists, plans, os.path.join(directory, 'candles.db'),
+                                                               adapters), strategies, breakouts.append, pool=pool)
+                with contextlib.redirect_stdout(devnull):
+                    pipeline.run()
+            elapsed = time.perf_counter() - start
+        server.stop()
+
+    print(pipeline)
+    print(server)
+    print("{} symbols x {} exchanges, {} requests per symbol, {} breakouts | whole run {:.2f}s, "
+          "{:.0f} symbols/s".format(symbols, len(names), sum(plan.requests_per_symbol for plan in plans.values()),
+                                   len(breakouts), elapsed, symbols * len(names) / elapsed))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:2]], *[float(arg) for arg in sys.argv[2:5]])
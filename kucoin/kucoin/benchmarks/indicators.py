@@ -0,0 +1,63 @@
+"""Benchmark of the grouped indicator engine
+
+Compares, on synthetic candles, the time taken to calculate every indicator
+per symbol by looping over the symbols with ta_lib.indicators against one
+pass of ta_lib.engine. The time of ta_lib.indicators over the whole long
+dataframe (windows running across symbols) is shown for reference.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m benchmarks.indicators [symbols] [bars]
+
+"""
+
+import sys
+import warnings
+import pandas as pd
+from ta_lib import indicators, engine
+from benchmarks.helpers import synthetic_candles, timeit
+
+
+def run(symbols: int =1000, bars: int =1500):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    """
+
+    warnings.simplefilter('ignore')
+    data = synthetic_candles(symbols, bars)
+    groups = [group for _, group in data.groupby('symbol', sort=False)]
+
+    looped = {
+        'tenkan_sen': lambda g: indicators.tenkan_sen(g),
+        'kinjun_sen': lambda g: indicators.kinjun_sen(g),
+        'senkou_span_b': lambda g: indicators.senkou_span_b(g),
+        'bollinger_bands': lambda g: indicators.bollinger_bands(g),
+        'stoch_rsi': lambda g: indicators.stoch_rsi(g),
+    }
+    grouped = {
+        'tenkan_sen': lambda p: engine.tenkan_sen(p),
+        'kinjun_sen': lambda p: engine.kinjun_sen(p),
+        'senkou_span_b': lambda p: engine.senkou_span_b(p),
+        'bollinger_bands': lambda p: engine.bollinger_bands(p),
+        'stoch_rsi': lambda p: engine.stoch_rsi(p),
+    }
+
+    print("{} symbols x {} bars, panel built in {:.3f}s".format(symbols, bars, timeit(lambda: engine.Panel(data))))
+    print("{:<16} {:>12} {:>12} {:>12} {:>9}".format('indicator', 'whole df', 'per symbol', 'engine', 'speedup'))
+    for name in looped:
+        whole = timeit(lambda: looped[name](data), repeat=1)
+        loop = timeit(lambda: [looped[name](group) for group in groups], repeat=1)
+        # The panel is built inside the timing, as the strategies build it for every call
+        fast = timeit(lambda: grouped[name](engine.Panel(data)))
+        print("{:<16} {:>11.3f}s {:>11.3f}s {:>11.3f}s {:>8.1f}x".format(name, whole, loop, fast, loop / fast))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,57 @@
+"""Benchmark of the sending of the alerts
+
+Compares, offline with the stub backend, sending every alert with its own
+blocking call followed by a 0.1 second pause, like the runner did with
+telegram_send.send, against queueing them to the notifier, and checks
+every alert reaches the chat in the same order.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m benchmarks.notifier [alerts] [latency in ms]
+
+"""
+
+import sys
+import time
+import asyncio
+from notifier import Notifier, StubBackend
+
+
+def run(alerts: int =50, latency: int =50):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    alerts : int
+        Number of alerts
+    latency : int
+        Milliseconds Telegram takes to answer a message
+    """
+
+    texts = ["KUCOIN | SYMBOL{}-USDT | ICH | 1d".format(i) for i in range(alerts)]
+
+    one_by_one = StubBackend(latency / 1000)
+    start = time.perf_counter()
+    for text in texts:
+        asyncio.run(one_by_one.send('chat', text))
+        time.sleep(0.1)
+    loop = time.perf_counter() - start
+
+    batched = StubBackend(latency / 1000)
+    start = time.perf_counter()
+    with Notifier(batched, 'chat', delay=0) as notifier:
+        for text in texts:
+            notifier.notify(text)
+        queued = time.perf_counter() - start
+    fast = time.perf_counter() - start
+
+    assert [text for _, text in one_by_one.sent] == texts
+    assert '\n'.join(text for _, text in batched.sent).split('\n') == texts
+    print("{} alerts, {} ms per message".format(alerts, latency))
+    print("one by one {:.3f}s ({} messages) | notifier {:.3f}s ({} messages, queued in {:.4f}s) | {:.0f}x".format(
+        loop, len(one_by_one.sent), fast, len(batched.sent), queued, loop / fast))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,83 @@
+"""Benchmark of the parameter sweep of the strategies
+
+Runs, on synthetic candles, the sweep of a strategy with an increasing
+number of worker processes and checks every run ranks the combinations
+the same, that a sweep started again finds nothing left to evaluate and
+one of other horizons refuses to resume, and
+compares evaluating a group of combinations with shared indicators
+against evaluating every combination on its own.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m benchmarks.optimizer [symbols] [bars] [strategy]
+
+"""
+
+import os
+import sys
+import time
+import tempfile
+from optimizer import SPACES, Sweep, grid, evaluate
+from benchmarks.helpers import synthetic_candles
+
+
+def run(symbols: int =200, bars: int =1000, strategy: str ='bb_rsi'):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    strategy : str
+        Strategy swept, one of optimizer.SPACES
+    """
+
+    rule, space = SPACES[strategy]
+    combos = grid(space)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'candles.csv')
+        synthetic_candles(symbols, bars).to_csv(path, index=False)
+
+        timings, reports = {}, []
+        for workers in sorted({1, 2, os.cpu_count() or 1}):
+            sweep = Sweep(rule, combos, '1hour', os.path.join(directory, 'sweep{}'.format(workers)), path)
+            sweep.split(50)
+            sweep.run(workers)
+            timings[workers] = sweep.elapsed
+            reports.append(sweep.report())
+        assert all(report.equals(reports[0]) for report in reports)
+
+        resumed = Sweep(rule, combos, '1hour', os.path.join(directory, 'sweep1'), path)
+        assert not resumed.tasks() and resumed.report().equals(reports[0])
+        try:
+            Sweep(rule, combos, '1hour', os.path.join(directory, 'sweep1'), path, [12])
+            raise AssertionError("a sweep of other horizons resumed")
+        except ValueError:
+            pass
+
+        # The largest group of combinations sharing their indicators
+        groups = Sweep(rule, combos, '1hour', os.path.join(directory, 'groups'), path)
+        groups.split(50)
+        chunk, group = max(groups.tasks(), key=lambda task: len(task[1]))
+        start = time.perf_counter()
+        evaluate(rule.text, rule.params, group, chunk, '1hour', [24])
+        shared = time.perf_counter() - start
+        start = time.perf_counter()
+        for combo in group:
+            evaluate(rule.text, rule.params, [combo], chunk, '1hour', [24])
+        alone = time.perf_counter() - start
+
+    print(reports[0].head(10).to_string(float_format='{:.4f}'.format))
+    print("{} symbols x {} bars, {} combinations of {}".format(symbols, bars, len(combos), strategy))
+    print(" | ".join("{} workers {:.2f}s ({:.1f}x)".format(workers, elapsed, timings[1] / elapsed)
+                     for workers, elapsed in timings.items()))
+    print("group of {} with shared indicators {:.3f}s | one by one {:.3f}s | {:.1f}x".format(
+        len(group), shared, alone, alone / shared))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]], *sys.argv[3:4])
@@ -0,0 +1,58 @@
+"""Benchmark of the candle buffers of the daemon
+
+Compares, on synthetic candles, adding the new candle of every symbol to
+a long dataframe (concatenate, drop the duplicates, sort) against adding
+it to the ring buffers of exchange.ring, and checks both give the same
+window of candles.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m benchmarks.ring [symbols] [bars]
+
+"""
+
+import sys
+import numpy as np
+import pandas as pd
+from exchange.helpers import COLUMNS
+from exchange.ring import CandleRing
+from benchmarks.helpers import synthetic_candles, timeit
+
+
+def run(symbols: int =1000, bars: int =160):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    """
+
+    data = synthetic_candles(symbols, bars + 1)[COLUMNS + ['symbol']]
+    held = data[data.time < bars * 3600].reset_index(drop=True)
+    new_data = data[data.time == bars * 3600].reset_index(drop=True)
+    order = {symbol: i for i, symbol in enumerate(held.symbol.unique())}
+
+    def concatenated() -> pd.DataFrame:
+        window = pd.concat([held, new_data], ignore_index=True).drop_duplicates(['symbol', 'time'], keep='last')
+        window = window.iloc[np.lexsort((window.time.values, window.symbol.map(order).values))]
+        return window.groupby('symbol', sort=False).tail(bars).reset_index(drop=True)
+
+    ring = CandleRing(bars, symbols)
+    ring.extend(held)
+    ring.extend(new_data)
+    assert ring.frame(list(order)).equals(concatenated())
+
+    loop = timeit(concatenated)
+    append = timeit(lambda: ring.extend(new_data))
+    frame = timeit(lambda: ring.frame(list(order)))
+    print("{} symbols x {} bars".format(symbols, bars))
+    print("concat {:.4f}s | ring append {:.4f}s ({:.0f}x) + frame {:.4f}s | {:.1f} MB".format(
+        loop, append, loop / append, frame, ring.nbytes / 2**20))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,134 @@
+"""Benchmark of the support and resistance detection
+
+Compares, on synthetic candles of the whole universe, the support and
+resistance detections of ta_lib.indicators against the loops they
+replaced, which looked every candle or window up with iloc, and checks
+both find the same levels for every symbol.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m benchmarks.sr [symbols] [bars]
+
+"""
+
+import sys
+import pandas as pd
+from ta_lib import indicators, engine
+from ta_lib.helpers import is_support, is_resistance, is_far_from_level
+from benchmarks.helpers import synthetic_candles, timeit
+
+
+def fractal_detection_loop(data: pd.DataFrame) -> list:
+    """
+    fractal_detection as it was, one candle at a time
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Candles of one symbol
+
+    Returns
+    -------
+    list of tuples (int, float)
+        Index and value of the support and resistance levels
+    """
+
+    levels = []
+    data_low = data.low
+    data_high = data.high
+
+    for i in range(2, data_high.shape[0]-2):
+        if is_support(data_low, i):
+            l = data_low.iloc[i]
+            if is_far_from_level(l, levels, data_high, data_low):
+                levels.append((i, l))
+
+        elif is_resistance(data_high, i):
+            l = data_high.iloc[i]
+            if is_far_from_level(l, levels, data_high, data_low):
+                levels.append((i, l))
+
+    return levels
+
+
+def window_detection_loop(data: pd.DataFrame) -> list:
+    """
+    window_detection as it was, slicing the windows of every step
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Candles of one symbol
+
+    Returns
+    -------
+    list of tuples (int, float)
+        Index and value of the support and resistance levels
+    """
+
+    levels = []
+    max_list = []
+    min_list = []
+    data_high = data.high
+    data_low = data.low
+
+    for i in range(5, len(data_high)-5):
+        high_range = data_high.iloc[i-5:i+4]
+        current_max = high_range.max()
+        if current_max not in max_list:
+            max_list = []
+        max_list.append(current_max)
+        if len(max_list) == 5 and is_far_from_level(current_max, levels, data_high, data_low):
+            levels.append((high_range.idxmax(), current_max))
+
+        low_range = data_low.iloc[i-5:i+5]
+        current_min = low_range.min()
+        if current_min not in min_list:
+            min_list = []
+        min_list.append(current_min)
+        if len(min_list) == 5 and is_far_from_level(current_min, levels, data_high, data_low):
+            levels.append((low_range.idxmin(), current_min))
+
+    return levels
+
+
+def run(symbols: int =1000, bars: int =160):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    """
+
+    data = synthetic_candles(symbols, bars)
+    groups = [group for _, group in data.groupby('symbol', sort=False)]
+
+    detections = {
+        'fractal_detection': (fractal_detection_loop, indicators.fractal_detection),
+        'window_detection': (window_detection_loop, indicators.window_detection),
+    }
+
+    print("{} symbols x {} bars".format(symbols, bars))
+    print("{:<18} {:>10} {:>12} {:>9}".format('detection', 'loop', 'vectorized', 'speedup'))
+    for name, (looped, vectorized) in detections.items():
+        assert [looped(group) for group in groups] == [vectorized(group) for group in groups]
+        loop = timeit(lambda: [looped(group) for group in groups], repeat=1)
+        fast = timeit(lambda: [vectorized(group) for group in groups])
+        print("{:<18} {:>9.3f}s {:>11.3f}s {:>8.1f}x".format(name, loop, fast, loop / fast))
+
+    def panel_levels():
+        panel = engine.Panel(data)
+        high, low = panel['high'], panel['low']
+        averages = pd.DataFrame(high - low).mean().to_numpy()
+        return indicators.fractal_levels(high, low, averages), \
+            indicators.window_levels(high, low, averages, panel.lengths)
+
+    print("both on the panel of all symbols in one call: {:.3f}s".format(timeit(panel_levels)))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
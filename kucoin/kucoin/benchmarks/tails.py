@@ -0,0 +1,64 @@
+"""Benchmark of the access to the last candles of every symbol
+
+Compares, on synthetic candles, evaluating a strategy condition symbol by
+symbol (boolean mask of the symbol over the whole frame, then one iloc
+lookup per value) against evaluating it on all symbols at once with
+strategies.tails.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m benchmarks.tails [symbols] [bars]
+
+"""
+
+import sys
+import numpy as np
+from strategies.tails import Tails
+from benchmarks.helpers import synthetic_candles, timeit
+
+
+def run(symbols: int =1000, bars: int =160):
+    """
+    Runs the benchmark and prints the timings
+
+    Parameters
+    ----------
+    symbols : int
+        Number of symbols
+    bars : int
+        Number of candles of every symbol
+    """
+
+    data = synthetic_candles(symbols, bars)
+
+    def looped() -> list:
+        signals = []
+        for symbol in data.symbol.unique():
+            symbol_data = data.loc[data['symbol'] == symbol]
+            close = symbol_data.iloc[-1].close
+            close_2 = symbol_data.iloc[-2].close
+            close_3 = symbol_data.iloc[-3].close
+            low = symbol_data.iloc[-1].low
+            low_2 = symbol_data.iloc[-2].low
+            if close >= close_2 and close_2 > close_3 and low >= low_2:
+                signals.append(symbol)
+        return signals
+
+    def vectorized() -> list:
+        tails = Tails(data)
+        close = tails.last('close')
+        close_2 = tails.last('close', 2)
+        close_3 = tails.last('close', 3)
+        low = tails.last('low')
+        low_2 = tails.last('low', 2)
+        return list(tails.symbols[(close >= close_2) & (close_2 > close_3) & (low >= low_2)])
+
+    assert looped() == vectorized()
+    loop = timeit(looped, repeat=1)
+    fast = timeit(vectorized)
+    print("{} symbols x {} bars".format(symbols, bars))
+    print("per symbol {:.3f}s | tails {:.4f}s | {:.0f}x".format(loop, fast, loop / fast))
+
+
+if __name__ == '__main__':
+    run(*[int(arg) for arg in sys.argv[1:3]])
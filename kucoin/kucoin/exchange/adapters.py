@@ -0,0 +1,331 @@
+"""Exchanges behind a common interface, with their candles in one schema
+
+Every exchange has its own endpoints, parameters and layout of candles,
+and the bots of every exchange were copies of each other differing only
+there. This script puts what differs behind an adapter: the list of
+symbols, the query of the candles and the place of the candles in the
+response, the server time, the rate limits, and the conversion of the
+candles into the schema of the strategies (exchange.helpers.COLUMNS, in
+chronological order). The downloads (exchange.fetcher), the store, the
+indicators and the strategies are the same for every exchange, adding an
+exchange is adding an adapter.
+
+This file can be imported as a module and contains the following:
+
+    * ExchangeAdapter - Endpoints, limits and candles of an exchange
+    * KucoinAdapter - Kucoin spot
+    * GateioAdapter - Gate.io spot
+    * KUCOIN - Adapter of Kucoin, the one used when none is given
+    * GATEIO - Adapter of Gate.io
+    * ADAPTERS - Name of the exchange to its adapter
+
+"""
+
+import os
+import requests as rq
+import numpy as np
+import pandas as pd
+from exchange.helpers import *
+from exchange.parsing import decode_candles, candle_frame
+
+
+class ExchangeAdapter:
+    """
+    Endpoints, limits and candles of an exchange
+
+    The requests sent to an exchange share its rate limiter, retry policy
+    and circuit breaker, the limits of an exchange do not slow down the
+    downloads of another one.
+
+    Attributes
+    ----------
+    name : str
+        Name of the exchange, in the alerts and in the candle store
+    base_url : str
+        URL the endpoints are relative to
+    headers : dict
+        Headers of every request
+    max_bars : int
+        Candles returned by a request of the candles endpoint
+    min_candles : int
+        Minimum number of candles of a symbol given to the strategies
+    candles_key : str
+        Key of the candles in the response, None when it is the list of candles
+    fields : dict
+        Column of exchange.helpers.COLUMNS to its field in a raw candle
+    newest_first : bool
+        Whether the candles of the response are in reverse chronological order
+    rate_limiter : TokenBucket
+        Shared by every request sent to the exchange
+    retry_policy : RetryPolicy
+        Delays between the attempts of a request
+    breaker : CircuitBreaker
+        Gives up on the candles endpoint while it keeps failing
+    """
+
+    name = None
+    base_url = None
+    symbols_ep = None
+    candles_ep = None
+    server_time_ep = None
+    headers = {}
+    max_bars = MAX_BARS
+    min_candles = MIN_CANDLES
+    candles_key = None
+    fields = {column: i for i, column in enumerate(COLUMNS)}
+    newest_first = False
+
+    def __init__(self, rate_limiter: TokenBucket, retry_policy: RetryPolicy, breaker: CircuitBreaker,
+                 base_url: str =None):
+        if base_url is not None:
+            self.base_url = base_url
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy
+        self.breaker = breaker
+
+    @property
+    def candles_url(self) -> str:
+        return self.base_url + self.candles_ep
+
+    def symbols(self) -> list:
+        """
+        Tradable USDT pairs of the exchange
+
+        Raises
+        ------
+        Exception
+            If the API call fails or returns no symbol
+        """
+
+        raise NotImplementedError
+
+    def candle_params(self, symbol: str, timeframe: str, since: int =None, bars: int =WINDOW) -> dict:
+        """
+        Query parameters of the candles of a symbol
+
+        Parameters
+        ----------
+        symbol : str
+            The symbol to download the candles for
+        timeframe : str
+            The timeframe to download the candles for
+        since : int
+            Timestamp of the last stored candle, only the candles from it
+            onwards are requested
+        bars : int
+            Number of candles of the window
+
+        Returns
+        -------
+        dict
+            The query parameters of the candles endpoint
+        """
+
+        raise NotImplementedError
+
+    def candles_of(self, body) -> list:
+        """Raw candles out of the decoded response of the candles endpoint"""
+
+        return body[self.candles_key] if self.candles_key is not None else body
+
+    def decode(self, body: bytes) -> np.ndarray:
+        """
+        Candles of the raw body of a response of the candles endpoint
+
+        Returns
+        -------
+        np.ndarray
+            One row of floats per candle, in the order of the response,
+            with the fields of the candles in fields
+
+        Raises
+        ------
+        Exception
+            If the response has no candles
+        """
+
+        return decode_candles(body, self.candles_key, max(self.fields.values()) + 1)
+
+    def frame(self, symbols: list, candles: list) -> pd.DataFrame:
+        """
+        Converts the decoded candles of many symbols into the schema of the strategies
+
+        Parameters
+        ----------
+        symbols : list
+            The symbols, in the order of their candles
+        candles : list
+            Candles of every symbol, as returned by decode
+
+        Returns
+        -------
+        pd.DataFrame
+            The candles with the columns and types of exchange.helpers, in
+            chronological order for every symbol
+        """
+
+        return candle_frame(symbols, candles, self.fields, self.newest_first)
+
+    def normalize(self, symbol: str, candles: list, min_candles: int =None) -> pd.DataFrame:
+        """
+        Converts the raw candles of a symbol into the schema of the strategies
+
+        Parameters
+        ----------
+        symbol : str
+            The symbol the candles belong to
+        candles : list
+            Candles as returned by candles_of
+        min_candles : int
+            Minimum number of candles needed to calculate the indicators,
+            the one of the exchange if not given
+
+        Returns
+        -------
+        pd.DataFrame
+            The candles with the columns and types of exchange.helpers, in
+            chronological order, or None if there are not enough of them
+        """
+
+        raise NotImplementedError
+
+    def server_time(self) -> float:
+        """
+        Current time of the exchange server
+
+        Returns
+        -------
+        float
+            Unix timestamp in seconds
+
+        Raises
+        ------
+        APICallError
+            If the API call fails
+        """
+
+        raise NotImplementedError
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class KucoinAdapter(ExchangeAdapter):
+    """Kucoin spot, candles newest first under the data key of the response"""
+
+    name = EXCHANGE
+    base_url = BASEURL
+    symbols_ep = SYMBOLS_EP
+    candles_ep = MARKET_EP
+    server_time_ep = SERVER_TIME_EP
+    candles_key = 'data'
+    newest_first = True
+
+    def symbols(self) -> list:
+        params: dict = {'market': 'USDS'}
+        response: dict = rq.get(self.base_url + self.symbols_ep, params=params)
+
+        if response.status_code == 200:
+            margin_values: tuple = ("3S", "3L", "5S", "5L", "10S", "10L")
+            symbols: list = [response['symbol'] for response in response.json()['data']
+                       if response['quoteCurrency'] == 'USDT'
+                       and bool(response['enableTrading'])
+                       and not (response['symbol'].split("-")[0].endswith(margin_values))]
+            symbols.pop(symbols.index('USDC-USDT'))
+
+            if symbols:
+                return symbols
+            else:
+                raise Exception("EmptyListError: The list of symbols is empty")
+
+        else:
+            raise Exception("APICallError: {}".format(response.status_code))
+
+    def candle_params(self, symbol: str, timeframe: str, since: int =None, bars: int =WINDOW) -> dict:
+        return candle_params(symbol, timeframe, since, bars)
+
+    def normalize(self, symbol: str, candles: list, min_candles: int =None) -> pd.DataFrame:
+        return parse_candles(symbol, candles, self.min_candles if min_candles is None else min_candles)
+
+    def server_time(self) -> float:
+        response: dict = rq.get(self.base_url + self.server_time_ep, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code == 200:
+            return response.json()['data'] / 1000
+        else:
+            raise APICallError(response.status_code, retry_after(response.headers))
+
+
+# Gate.io allows 200 requests per 10 seconds per IP on every public spot
+# endpoint, the bucket is kept 10% under it so that other clients on the IP fit
+GATEIO_RATE_LIMIT=18    # Requests per second
+GATEIO_RATE_BURST=20    # Requests that can be sent at once
+GATEIO_BASE_URL=os.environ.get('GATEIO_BASE_URL', "https://api.gateio.ws/api/v4")
+
+# Candles of the candlesticks endpoint: time, quote volume, close, high, low,
+# open, base volume. The volume of the strategies is the quote volume, the one
+# the Gate.io bot read, so the candles it stored are read back the same.
+GATEIO_COLUMNS: list = ['time', 'turnover', 'close', 'high', 'low', 'open']
+GATEIO_INTERVALS: dict = {'1hour': '1h', '4hour': '4h', '1day': '1d'}
+
+
+class GateioAdapter(ExchangeAdapter):
+    """Gate.io spot, candles oldest first as the whole response"""
+
+    name = "GATEIO"
+    base_url = GATEIO_BASE_URL
+    symbols_ep = "/spot/currency_pairs"
+    candles_ep = "/spot/candlesticks"
+    server_time_ep = "/spot/time"
+    headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+    max_bars = 1000
+    min_candles = 150
+    fields = {**{column: i for i, column in enumerate(GATEIO_COLUMNS)}, 'volume': GATEIO_COLUMNS.index('turnover')}
+
+    def symbols(self) -> list:
+        response: dict = rq.get(self.base_url + self.symbols_ep, headers=self.headers)
+
+        if response.status_code == 200:
+            margin_values: tuple = ("3S", "3L", "5S", "5L", "10S", "10L")
+            symbols: list = [symbol['id'] for symbol in response.json()
+                       if symbol['id'].endswith('USDT')
+                       and not (symbol['id'].split("_")[0].endswith(margin_values))]
+
+            if symbols:
+                return symbols
+            else:
+                raise Exception("EmptyListError: The list of symbols is empty")
+
+        else:
+            raise Exception("APICallError: {}".format(response.status_code))
+
+    def candle_params(self, symbol: str, timeframe: str, since: int =None, bars: int =WINDOW) -> dict:
+        start_at = window_start(timeframe, bars)
+        if since is not None:
+            start_at = max(start_at, int(since))
+        return {'currency_pair': symbol, 'from': str(start_at), 'interval': GATEIO_INTERVALS[timeframe]}
+
+    def normalize(self, symbol: str, candles: list, min_candles: int =None) -> pd.DataFrame:
+        if len(candles) < (self.min_candles if min_candles is None else min_candles):
+            return None
+
+        new_data: pd.DataFrame = pd.DataFrame([candle[:len(GATEIO_COLUMNS)] for candle in candles],
+                                              columns=GATEIO_COLUMNS)
+        new_data['volume'] = new_data['turnover']
+        new_data['symbol'] = symbol
+        return new_data[COLUMNS + ['symbol']].astype(TYPES)
+
+    def server_time(self) -> float:
+        response: dict = rq.get(self.base_url + self.server_time_ep, headers=self.headers, timeout=REQUEST_TIMEOUT)
+
+        if response.status_code == 200:
+            return response.json()['server_time'] / 1000
+        else:
+            raise APICallError(response.status_code, retry_after(response.headers))
+
+
+KUCOIN = KucoinAdapter(RATE_LIMITER, RETRY_POLICY, CANDLES_BREAKER)
+GATEIO = GateioAdapter(TokenBucket(GATEIO_RATE_LIMIT, GATEIO_RATE_BURST),
+                       RetryPolicy(MAX_RETRIES, BACKOFF_BASE, BACKOFF_MAX),
+                       CircuitBreaker(BREAKER_THRESHOLD, BREAKER_TIMEOUT))
+ADAPTERS: dict = {adapter.name: adapter for adapter in (KUCOIN, GATEIO)}
@@ -1,20 +1,25 @@
 """Implementation of functions to retrieve data from Kucoin API
 
-This scripts contains three functions to retrieve data from the Kucoin API.
+This scripts contains four functions to retrieve data from the Kucoin API.
 
 This file can be imported as a module and contains the following functions:
 
     * get_all_symbols - Creates and returns the list of tradable USDT pairs on Kucoin spot
     * get_candles_for_symbol - Gets all candles for the given symbol and timeframe, putting them in a df
     * get_all_candles - Gets all candles for the given symbols and timeframe, putting them in a df
+    * get_all_candles_threaded - Same as get_all_candles using one thread per group of 10 symbols
+    * get_server_time - Gets the current time of the exchange server
     
 """
 
-import requests as rq
-import time
+import asyncio
 import pandas as pd
 import threading
 from exchange.helpers import *
+from exchange.fetcher import FetchStats, FetchSession, fetch_all_candles
+from exchange.adapters import ExchangeAdapter, KUCOIN
+from exchange.store import CandleStore
+from exchange.ratelimit import call_with_retry
 
 
 def get_all_symbols() -> list:
@@ -38,30 +43,56 @@ def get_all_symbols() -> list:
         If the list of symbols is empty after the API call was succesful
     """
 
-    params: dict = {'market': 'USDS'}
-    response: dict = rq.get(BASEURL + SYMBOLS_EP, params=params)
+    return KUCOIN.symbols()
     
-    if response.status_code == 200:
-        margin_values: tuple = ("3S", "3L", "5S", "5L", "10S", "10L")
-        symbols: list = [response['symbol'] for response in response.json()['data']
-                   if response['quoteCurrency'] == 'USDT'
-                   and bool(response['enableTrading'])
-                   and not (response['symbol'].split("-")[0].endswith(margin_values))]
-        symbols.pop(symbols.index('USDC-USDT'))
-        
-        if symbols:
-            return symbols
-        else:
-            raise Exception("EmptyListError: The list of symbols is empty")
-        
-    else:
-        raise Exception("APICallError: {}".format(response.status_code))
     
-    
-def get_all_candles(symbols: list, timeframe: str) -> pd.DataFrame:
+def get_all_candles(symbols: list, timeframe: str, store: CandleStore =None,
+                    bars: int =WINDOW, stats: FetchStats =None, since: dict =None,
+                    adapter: ExchangeAdapter =KUCOIN, session: FetchSession =None) -> pd.DataFrame:
     """
     Gets all candles for the given symbols and timeframe, putting them in a df
 
+    Parameters
+    ----------
+    symbols : list
+        List of symbols to download data of
+    timeframe : str
+        The timeframe to download the candles for
+    store : CandleStore
+        Local store of candles, only the new candles are downloaded if given
+    bars : int
+        Number of candles to download for every symbol
+    stats : FetchStats
+        Counters to add to, printed here only when not given
+    since : dict
+        Time of the last candle already held of every symbol, only the
+        candles from it onwards are downloaded if given
+    adapter : ExchangeAdapter
+        The exchange the candles are downloaded from, Kucoin if not given
+    session : FetchSession
+        Event loop and connections of the run, a loop and connections are
+        opened for this download only if not given
+
+    Returns
+    -------
+    pd.DataFrame : The dataframe with all candles
+    """
+    
+    shown = stats is None
+    stats = stats if stats is not None else FetchStats(timeframe)
+    download = fetch_all_candles(symbols, timeframe, stats=stats, store=store, bars=bars, since=since,
+                                 adapter=adapter, session=session)
+    data = session.run(download) if session is not None else asyncio.run(download)
+    if shown:
+        print(stats)
+    return data
+
+
+def get_all_candles_threaded(symbols: list, timeframe: str) -> pd.DataFrame:
+    """
+    Gets all candles for the given symbols and timeframe, putting them in a df,
+    using one thread per group of 10 symbols
+
     Parameters
     ----------
     symbols : list
@@ -92,32 +123,17 @@ def get_all_candles(symbols: list, timeframe: str) -> pd.DataFrame:
         """
         return [data[i:i+interval] for i in range(0, len(data), interval)]
     
-    columns: list = ['time', 'open', 'close', 'high', 'low', 'volume', 'turnover']
-    data: pd.DataFrame = pd.DataFrame(columns=columns)
-    
     def multiple_downloads(symbols: list, data_list: list, data_lock: threading.Lock):
         for symbol in symbols:
-            while True:
-                try:
-                    candles: list = get_candles_for_symbol(symbol, timeframe)
-                    if isinstance(candles, list):
-                        break
-                    else:
-                        continue
-                except BaseException:
-                    time.sleep(10)
-                    continue
+            try:
+                candles: list = call_with_retry(lambda: get_candles_for_symbol(symbol, timeframe),
+                                                RATE_LIMITER, RETRY_POLICY, CANDLES_BREAKER)
+            except Exception:
+                continue
             
-            candles.reverse()
+            new_data: pd.DataFrame = parse_candles(symbol, candles)
             
-            if len(candles) >= 120:
-                types: dict = {'time': 'int64', 'open': 'float64', 'close': 'float64', 
-                            'high': 'float64', 'low': 'float64', 'volume': 'float64', 
-                            'turnover': 'float64', 'symbol': 'str'}
-                new_data: pd.DataFrame = pd.DataFrame(candles, columns=columns)
-                new_data['symbol'] = symbol
-                new_data = new_data.astype(types)
-                
+            if new_data is not None:
                 with data_lock:
                     data_list.append(new_data)
                 
@@ -138,3 +154,21 @@ def get_all_candles(symbols: list, timeframe: str) -> pd.DataFrame:
     data = pd.concat(data_list)
     data['timeframe'] = timeframe
     return data
+
+
+def get_server_time() -> float:
+    """
+    Gets the current time of the exchange server
+
+    Returns
+    -------
+    float
+        Unix timestamp in seconds
+
+    Raises
+    ------
+    APICallError
+        If the API call fails
+    """
+
+    return KUCOIN.server_time()
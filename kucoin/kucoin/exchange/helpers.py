@@ -1,11 +1,123 @@
-from datetime import timedelta, datetime as dt
+from datetime import datetime as dt
+import os
 import requests as rq
+import pandas as pd
+from exchange.ratelimit import APICallError, TokenBucket, RetryPolicy, CircuitBreaker
 
-BASEURL="https://api.kucoin.com"
+EXCHANGE="KUCOIN"
+# Set KUCOIN_BASE_URL to send the requests elsewhere, to mock_exchange for instance
+BASEURL=os.environ.get('KUCOIN_BASE_URL', "https://api.kucoin.com")
 KEY="618558c5bc85c200065b6e50"
 
 SYMBOLS_EP="/api/v1/symbols"
 MARKET_EP="/api/v1/market/candles"
+SERVER_TIME_EP="/api/v1/timestamp"
+
+# Download settings
+MAX_CONCURRENCY=20      # Simultaneous requests in flight across all symbols
+REQUEST_TIMEOUT=10      # Seconds before a single request is abandoned
+MAX_RETRIES=4           # Retries per symbol before giving up on it
+
+# Kucoin allows 1800 requests per minute per IP on the public endpoints,
+# the bucket is kept 10% under it so that other clients on the IP fit
+RATE_LIMIT=27           # Requests per second
+RATE_BURST=30           # Requests that can be sent at once
+BACKOFF_BASE=0.5        # Seconds before the first retry, doubled every retry
+BACKOFF_MAX=30          # Maximum seconds between two retries
+BREAKER_THRESHOLD=25    # Consecutive failures before giving up on the endpoint
+BREAKER_TIMEOUT=60      # Seconds before trying a given up endpoint again
+
+# Shared by every request sent to the exchange during the run
+RATE_LIMITER = TokenBucket(RATE_LIMIT, RATE_BURST)
+RETRY_POLICY = RetryPolicy(MAX_RETRIES, BACKOFF_BASE, BACKOFF_MAX)
+CANDLES_BREAKER = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_TIMEOUT)
+
+COLUMNS: list = ['time', 'open', 'close', 'high', 'low', 'volume', 'turnover']
+TYPES: dict = {'time': 'int64', 'open': 'float64', 'close': 'float64', 
+               'high': 'float64', 'low': 'float64', 'volume': 'float64', 
+               'turnover': 'float64', 'symbol': 'str'}
+MIN_CANDLES=120
+WINDOW=160              # Candles given to the strategies for every symbol
+MAX_BARS=1500           # Candles returned by a request of the candles endpoint
+TIMEFRAME_SECONDS: dict = {'1hour': 3600, '4hour': 14400, '1day': 86400}
+
+# Local candle store, only the candles after the last stored one are downloaded
+STORE_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'candles.db')
+
+
+def window_start(timeframe: str, bars: int =WINDOW) -> int:
+    """
+    Timestamp of the first candle of the window given to the strategies
+
+    Parameters
+    ----------
+    timeframe : str
+        The timeframe of the candles
+    bars : int
+        Number of candles of the window
+
+    Returns
+    -------
+        int : Unix timestamp in seconds
+    """
+    
+    return int(dt.now().timestamp()) - TIMEFRAME_SECONDS[timeframe] * bars
+
+
+def candle_params(symbol: str, timeframe: str, since: int =None, bars: int =WINDOW) -> dict:
+    """
+    Builds the query parameters to download a block of 160 candles
+
+    Parameters
+    ----------
+    symbol : str
+        The symbol to download the candles for
+    timeframe : str
+        The timeframe to download the candles for
+    since : int
+        Timestamp of the last stored candle, only the candles from it
+        onwards are requested (it is requested again as it may not have
+        been closed when it was stored)
+    bars : int
+        Number of candles of the window, 160 unless a longer history is
+        needed to build higher timeframes from these candles
+
+    Returns
+    -------
+        dict : The query parameters of the candles endpoint
+    """
+    
+    start_at = window_start(timeframe, bars)
+    if since is not None:
+        start_at = max(start_at, int(since))
+    return {'symbol': symbol, 'startAt': start_at, 'type': timeframe}
+
+
+def parse_candles(symbol: str, candles: list, min_candles: int =MIN_CANDLES) -> pd.DataFrame:
+    """
+    Converts the raw candles of a symbol into a typed dataframe
+
+    Parameters
+    ----------
+    symbol : str
+        The symbol the candles belong to
+    candles : list
+        Candles as returned by the API (newest first)
+    min_candles : int
+        Minimum number of candles needed to calculate the indicators
+
+    Returns
+    -------
+        pd.DataFrame : The candles in chronological order, or None if
+        there are not enough of them to calculate the indicators
+    """
+    
+    if len(candles) < min_candles:
+        return None
+    
+    new_data: pd.DataFrame = pd.DataFrame(candles[::-1], columns=COLUMNS)
+    new_data['symbol'] = symbol
+    return new_data.astype(TYPES)
 
 
 def get_candles_for_symbol(symbol: str, timeframe: str) -> list:
@@ -28,18 +140,30 @@ def get_candles_for_symbol(symbol: str, timeframe: str) -> list:
         list : A list of candles in dic format
     """
     
-    if timeframe == '1day':
-        qty: int = 24
-    elif timeframe == '1hour':
-        qty: int = 1
-    elif timeframe == '4hour':
-        qty: int = 4
-        
-    start_at = int((dt.now() - timedelta(hours=qty) * 160).timestamp())
-    params: dict = {'symbol': symbol, 'startAt': start_at, 'type': timeframe}
+    params: dict = candle_params(symbol, timeframe)
     response: dict = rq.get(BASEURL + MARKET_EP, params=params)
     
     if response.status_code == 200:
         return response.json()['data']
     else:
-        raise Exception("APICallError: {}".format(response.status_code))
\ No newline at end of file
+        raise APICallError(response.status_code, retry_after(response.headers))
+
+
+def retry_after(headers) -> float:
+    """
+    Delay asked by the exchange in the Retry-After header of a response
+
+    Parameters
+    ----------
+    headers : dict
+        Headers of the response
+
+    Returns
+    -------
+        float : Seconds to wait, or None if the header is missing
+    """
+    
+    try:
+        return float(headers['Retry-After'])
+    except (KeyError, TypeError, ValueError):
+        return None
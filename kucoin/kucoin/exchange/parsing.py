@@ -0,0 +1,125 @@
+"""Parsing of the responses of the candles endpoints into NumPy columns
+
+Every candle of a response is a list of strings. Building a dataframe of
+them per symbol, converting its strings with astype and concatenating the
+dataframes of the symbols copies the candles several times and converts
+every string in Python. This script decodes a response straight into a
+2D float array: the quotes around the numbers are removed from the raw
+body so that the JSON decoder (orjson when installed) returns numbers
+instead of strings. The arrays of all the symbols of a chunk are then
+written, column by column, into one preallocated contiguous block that
+the dataframe of the chunk is a view of.
+
+A body whose candles cannot be decoded this way (anything but numbers in
+the candles) is decoded the usual way and converted by NumPy.
+
+This file can be imported as a module and contains the following:
+
+    * loads - Decodes JSON, with orjson when it is installed
+    * decode_candles - Candles of a response body as a 2D float array
+    * candle_frame - Dataframe of the candles of many symbols, in one block
+
+"""
+
+import json
+import numpy as np
+import pandas as pd
+from exchange.helpers import COLUMNS
+
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+
+def decode_candles(body: bytes, key: str =None, width: int =len(COLUMNS)) -> np.ndarray:
+    """
+    Candles of a response body as a 2D float array
+
+    Parameters
+    ----------
+    body : bytes
+        Raw body of the response of the candles endpoint
+    key : str
+        Key of the candles in the response, None when the response is the
+        list of candles
+    width : int
+        Number of fields of a candle kept, the first ones
+
+    Returns
+    -------
+    np.ndarray
+        One row per candle, in the order of the response
+
+    Raises
+    ------
+    KeyError
+        If the response has no candles under the key
+    TypeError
+        If the candles are not a list
+    ValueError
+        If the fields of the candles are not numbers
+    """
+
+    try:
+        start = body.index(b'[', body.index('"{}":'.format(key).encode())) if key is not None else 0
+        candles = loads(body[start:body.rindex(b']') + 1].replace(b'"', b''))
+        if not candles:
+            return np.empty((0, width))
+        return np.array(candles, dtype='float64')[:, :width]
+    except (ValueError, TypeError, IndexError):
+        # Not only numbers, or not the layout expected: decoded field by field
+        candles = loads(body)
+        candles = candles[key] if key is not None else candles
+        if not isinstance(candles, list):
+            raise TypeError("Unexpected candles: {}".format(candles))
+        if not candles:
+            return np.empty((0, width))
+        return np.array([candle[:width] for candle in candles], dtype='float64')
+
+
+def candle_frame(symbols: list, candles: list, fields: dict =None, newest_first: bool =False) -> pd.DataFrame:
+    """
+    Dataframe of the candles of many symbols, in one block
+
+    The float columns of every symbol are written into a single
+    preallocated block the dataframe is built on without copying, the
+    times into an int64 column.
+
+    Parameters
+    ----------
+    symbols : list
+        The symbols, in the order of their candles
+    candles : list
+        2D float array of the candles of every symbol, as decode_candles returns them
+    fields : dict
+        Column of exchange.helpers.COLUMNS to its field in a candle, the
+        fields in the order of COLUMNS if not given
+    newest_first : bool
+        Whether the candles of a symbol are in reverse chronological order
+
+    Returns
+    -------
+    pd.DataFrame
+        The candles with the columns and types of exchange.helpers, in
+        chronological order for every symbol, the index of every symbol
+        starting at 0 like the concatenation of their dataframes
+    """
+
+    fields = fields if fields is not None else {column: i for i, column in enumerate(COLUMNS)}
+    counts = np.array([len(rows) for rows in candles], dtype='int64')
+    ends = np.cumsum(counts)
+    columns = COLUMNS[1:]
+    block = np.empty((len(columns), int(ends[-1]) if len(ends) else 0))
+    times = np.empty(block.shape[1], dtype='int64')
+    for rows, end, count in zip(candles, ends, counts):
+        rows = rows[::-1] if newest_first else rows
+        block[:, end - count:end] = rows[:, [fields[column] for column in columns]].T
+        times[end - count:end] = rows[:, fields['time']]
+
+    index = np.arange(block.shape[1]) - np.repeat(ends - counts, counts)
+    data = pd.DataFrame(block.T, index=index, columns=columns, copy=False)
+    data.insert(0, 'time', times)
+    data['symbol'] = np.repeat(np.array(symbols, dtype=object), counts)
+    return data
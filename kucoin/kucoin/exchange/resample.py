@@ -0,0 +1,152 @@
+"""Building of higher timeframe candles from lower timeframe ones
+
+This script aggregates the candles of a base timeframe into the candles of
+higher timeframes locally, so that only the base timeframe has to be
+downloaded. Buckets are aligned on UTC boundaries like the exchange does
+(4 hour candles start at 00:00, 04:00, ... and daily candles at 00:00 UTC).
+
+This file can be imported as a module and contains the following functions:
+
+    * resample_candles - Aggregates candles into a higher timeframe
+    * derive_timeframes - Builds the candles of several timeframes from one base timeframe
+    * within_window - Keeps the last candles of every symbol
+    * history_bars - Number of base candles needed to build the higher timeframes
+
+"""
+
+import pandas as pd
+from exchange.helpers import COLUMNS, TIMEFRAME_SECONDS, MIN_CANDLES, WINDOW, window_start
+
+
+AGGREGATIONS: dict = {'open': 'first', 'close': 'last', 'high': 'max', 'low': 'min',
+                      'volume': 'sum', 'turnover': 'sum'}
+
+
+def resample_candles(data: pd.DataFrame, timeframe: str) -> pd.DataFrame:
+    """
+    Aggregates the candles of every symbol into a higher timeframe
+
+    The first bucket of a symbol is dropped when it is missing candles, as its
+    open would not be the one of the exchange. The last bucket is kept even
+    if it is not complete yet, just like the exchange returns the candle in
+    progress.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Candles of all symbols, in chronological order for every symbol
+    timeframe : str
+        The timeframe to build
+
+    Returns
+    -------
+    pd.DataFrame
+        The candles of the given timeframe with the same columns as data
+    """
+
+    seconds = TIMEFRAME_SECONDS[timeframe]
+    base_seconds = TIMEFRAME_SECONDS[data.timeframe.iloc[0]] if not data.empty else seconds
+    columns = [column for column in COLUMNS if column in data.columns]
+
+    aggregations = {column: (column, AGGREGATIONS[column]) for column in columns if column != 'time'}
+    aggregations['count'] = ('time', 'size')
+    buckets = data.assign(time=data.time - data.time % seconds)
+    resampled = buckets.groupby(['symbol', 'time'], sort=False).agg(**aggregations).reset_index()
+    resampled['timeframe'] = timeframe
+
+    first = resampled.symbol.ne(resampled.symbol.shift())
+    partial = resampled['count'] < seconds // base_seconds
+    resampled = resampled[~(first & partial)]
+
+    return resampled[columns + ['symbol', 'timeframe']].reset_index(drop=True)
+
+
+def window_bars(timeframes) -> dict:
+    """
+    Number of candles of the window of every timeframe
+
+    Parameters
+    ----------
+    timeframes : list or dict
+        The timeframes, or timeframe to number of candles of its window
+
+    Returns
+    -------
+    dict
+        Timeframe to number of candles of its window, 160 (WINDOW) for
+        every timeframe of a list
+    """
+
+    return timeframes if isinstance(timeframes, dict) else dict.fromkeys(timeframes, WINDOW)
+
+
+def derive_timeframes(data: pd.DataFrame, timeframes) -> dict:
+    """
+    Builds the candles of several timeframes from the candles of a base timeframe
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Candles of the base timeframe, with enough history for the highest
+        timeframe requested
+    timeframes : list or dict
+        The timeframes to build, or timeframe to number of candles of its
+        window (160 if not given)
+
+    Returns
+    -------
+    dict
+        Timeframe to dataframe with the last candles of every symbol,
+        symbols without enough candles are left out
+    """
+
+    return {timeframe: within_window(resample_candles(data, timeframe), timeframe, bars)
+            for timeframe, bars in window_bars(timeframes).items()}
+
+
+def within_window(data: pd.DataFrame, timeframe: str, bars: int =WINDOW) -> pd.DataFrame:
+    """
+    Keeps the last candles of every symbol, leaving out the symbols
+    without enough candles to calculate the indicators
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Candles of all symbols
+    timeframe : str
+        The timeframe of the candles
+    bars : int
+        Number of candles of the window
+
+    Returns
+    -------
+    pd.DataFrame
+        The candles inside the window
+    """
+
+    data = data[data.time >= window_start(timeframe, bars)]
+    counts = data.groupby('symbol', sort=False).time.transform('size')
+    return data[counts >= min(MIN_CANDLES, bars)].reset_index(drop=True)
+
+
+def history_bars(base_timeframe: str, timeframes) -> int:
+    """
+    Number of base timeframe candles needed to build the window of every
+    given timeframe
+
+    Parameters
+    ----------
+    base_timeframe : str
+        The timeframe that is downloaded
+    timeframes : list or dict
+        The timeframes built from it, or timeframe to number of candles of
+        its window (160 if not given)
+
+    Returns
+    -------
+    int
+        Number of candles of the base timeframe
+    """
+
+    return max([bars * (TIMEFRAME_SECONDS[timeframe] // TIMEFRAME_SECONDS[base_timeframe])
+                for timeframe, bars in window_bars(timeframes).items()], default=WINDOW)
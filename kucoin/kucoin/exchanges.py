@@ -0,0 +1,336 @@
+"""Runner of the strategies of every exchange in a single process
+
+The Kucoin and Gate.io bots were two processes, each with its own
+interpreter, pandas, pool of strategy processes, Telegram notifier and
+scheduler. This script runs the strategies of both exchanges in one
+process: the candles of every exchange are downloaded through its adapter
+(exchange.adapters) in the same event loop, a chunk of symbols of every
+exchange at a time, and go through a single pipeline, pool of processes,
+indicator cache and notifier. The strategies of an exchange are keyed by
+exchange and timeframe, the pipeline and the pool run every chunk with
+the strategies of its exchange.
+
+Every exchange keeps its own rate limits, fetch plan, candles in the
+store and list of symbols, an exchange whose symbols cannot be
+downloaded is left out of the run without stopping the other ones.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 exchanges.py <repeat> [max memory in MB]
+
+This file can be imported as a module and contains the following:
+
+    * EXCHANGES - Name of the exchange to its adapter, base timeframe and strategies
+    * gateio_strategies - Strategies run on the candles of Gate.io
+    * exchange_strategies - Strategies of the exchanges, keyed by exchange and timeframe
+    * download_exchanges - Downloads the candles of every exchange, a chunk of symbols of each at a time
+    * find_breakouts - Runs the strategies of every exchange once
+    * run_daemon - Keeps the candles of every exchange in memory between closes
+
+"""
+
+import sys
+import asyncio
+import threading
+import contextlib
+from functools import partial
+from itertools import zip_longest
+from exchange.adapters import KUCOIN, GATEIO
+from exchange.fetcher import FetchStats, FetchSession, fetch_all_candles
+from exchange.store import CandleStore
+from exchange.helpers import STORE_PATH
+from exchange.resample import derive_timeframes, within_window
+from strategies.strategies import ichimoku_breakout, bb_rsi_breakout, ma_vol_breakout, sr_breakout
+from ta_lib.cache import INDICATORS
+from runner import breakout_strategies, breakout_message, strategy_frames, BASE_TIMEFRAME, SCHEDULED_TIMEFRAMES
+from notifier import Notifier
+from scheduler import CandleScheduler
+from pipeline import Pipeline, chunks
+from daemon import Daemon, MAX_MEMORY
+from sharding import ShardPool, WORKERS
+from planner import FetchPlan
+from metrics import METRICS, MetricsServer, METRICS_PATH
+
+
+def gateio_strategies(exchange: str) -> dict:
+    """
+    Strategies run on the candles of Gate.io, the ones of its bot
+
+    Parameters
+    ----------
+    exchange : str
+        Name of the exchange
+
+    Returns
+    -------
+    dict
+        Timeframe to list of strategies
+    """
+
+    return {
+        '4hour': [partial(ichimoku_breakout, timeframe='4h', exchange=exchange),
+                  partial(bb_rsi_breakout, exchange=exchange, alert=True),
+                  partial(ma_vol_breakout, exchange=exchange),
+                  partial(sr_breakout, exchange=exchange, alert=True)],
+        '1day': [partial(ichimoku_breakout, timeframe='1d', exchange=exchange)],
+    }
+
+
+# Gate.io has no base timeframe, 151 daily candles built from 4 hour ones
+# would take 912 of them instead of the 160 its strategies read
+EXCHANGES: dict = {
+    KUCOIN.name: (KUCOIN, BASE_TIMEFRAME, breakout_strategies),
+    GATEIO.name: (GATEIO, None, gateio_strategies),
+}
+
+
+def exchange_strategies(names: list) -> dict:
+    """
+    Strategies of the exchanges, keyed by exchange and timeframe
+
+    Parameters
+    ----------
+    names : list
+        Names of the exchanges, keys of EXCHANGES
+
+    Returns
+    -------
+    dict
+        (exchange, timeframe) to list of strategies, as given to Pipeline
+    """
+
+    return {(name, timeframe): timeframe_strategies for name in names
+            for timeframe, timeframe_strategies in EXCHANGES[name][2](name).items()}
+
+
+def exchange_plans(names: list) -> dict:
+    """Fetch plan of every exchange, planned from its strategies"""
+
+    plans = {}
+    for name in names:
+        adapter, base, strategies = EXCHANGES[name]
+        plans[name] = FetchPlan(strategies(name), base, adapter.max_bars)
+        print(name, plans[name])
+    return plans
+
+
+def download_exchanges(symbols: dict, plans: dict, path: str =STORE_PATH, adapters: dict =None):
+    """
+    Downloads the candles of every exchange, a chunk of symbols of each
+    at a time
+
+    The timeframes of the chunks of every exchange are downloaded together,
+    every exchange under its own rate limits, in one event loop and over
+    one pool of connections kept for the whole download.
+
+    Parameters
+    ----------
+    symbols : dict
+        Name of the exchange to its list of symbols
+    plans : dict
+        Name of the exchange to its FetchPlan
+    path : str
+        Path of the candle store
+    adapters : dict
+        Name of the exchange to its adapter, the ones of EXCHANGES if not given
+
+    Yields
+    ------
+    tuple ((str, str), pd.DataFrame)
+        Exchange and timeframe, and candles of a chunk, as soon as they are ready
+    """
+
+    # The stores are opened here as SQLite connections are used in the thread
+    # that opened them, the download stage of the pipeline
+    adapters = adapters if adapters is not None else {name: EXCHANGES[name][0] for name in symbols}
+    stores = {name: CandleStore(path, name) for name in symbols}
+    stats = {name: {timeframe: FetchStats(timeframe) for timeframe in plans[name].fetched} for name in symbols}
+    session = FetchSession()
+
+    async def download(step: list) -> list:
+        return await asyncio.gather(*[
+            fetch_all_candles(chunk, timeframe, stats=stats[name][timeframe], store=stores[name],
+                              bars=plans[name].fetched[timeframe], adapter=adapters[name], session=session)
+            for name, timeframe, chunk in step])
+
+    try:
+        for exchange_chunks in zip_longest(*[chunks(symbols[name]) for name in symbols]):
+            step = [(name, timeframe, chunk) for name, chunk in zip(symbols, exchange_chunks) if chunk
+                    for timeframe in plans[name].fetched]
+            for (name, timeframe, chunk), data in zip(step, session.run(download(step))):
+                plan = plans[name]
+                if timeframe != plan.base:
+                    yield (name, timeframe), data
+                elif not data.empty:
+                    if timeframe in plan.bars:
+                        yield (name, timeframe), within_window(data, timeframe, plan.bars[timeframe])
+                    for derived, derived_data in derive_timeframes(data, plan.derived).items():
+                        yield (name, derived), derived_data
+    finally:
+        session.close()
+        for name, store in stores.items():
+            store.close()
+            for timeframe_stats in stats[name].values():
+                print(name, timeframe_stats)
+            print(plans[name].report(stats[name], len(symbols[name])))
+
+
+def exchange_symbols(names: list) -> dict:
+    """
+    Symbols of every exchange, the exchanges whose symbols cannot be
+    downloaded are left out
+
+    Parameters
+    ----------
+    names : list
+        Names of the exchanges, keys of EXCHANGES
+
+    Returns
+    -------
+    dict
+        Name of the exchange to its list of symbols
+    """
+
+    symbols = {}
+    for name in names:
+        try:
+            symbols[name] = EXCHANGES[name][0].symbols()
+        except Exception as error:
+            print("Symbols of {} failed, left out of the run: {}".format(name, error))
+    return symbols
+
+
+def find_breakouts(names: list =tuple(EXCHANGES), workers: int =WORKERS, pool: ShardPool =None):
+    """
+    Runs the strategies of every exchange once
+
+    The candles of the exchanges are downloaded, the strategies run and
+    the alerts sent in a single pipeline, on a single pool of processes.
+
+    Parameters
+    ----------
+    names : list
+        Names of the exchanges, keys of EXCHANGES
+    workers : int
+        Number of processes running the strategies, 1 runs them in the
+        pipeline's thread
+    pool : ShardPool
+        Pool opened by the caller before starting any thread, kept open
+        for its next runs, a pool of workers processes is opened for this
+        run if not given
+    """
+
+    strategies = exchange_strategies(names)
+    # Planned before anything is downloaded
+    plans = exchange_plans(names)
+    symbols = exchange_symbols(names)
+
+    # The processes are forked before the threads of the notifier and the pipeline start,
+    # a pool given was opened by the caller before any of its threads
+    pool = contextlib.nullcontext(pool) if pool is not None else ShardPool(strategies, workers, [INDICATORS])
+    with pool as pool, Notifier.from_config() as notifier:
+        pipeline = Pipeline(lambda: download_exchanges(symbols, plans), strategies,
+                            lambda breakout: notifier.notify(breakout_message(breakout)), pool=pool)
+        pipeline.run()
+    print(pipeline)
+    print(notifier)
+
+    # Indicators are not kept from one run to the next, the candles change
+    print(INDICATORS)
+    INDICATORS.clear()
+
+
+def exchange_frames(buffers: dict, name: str, plan: FetchPlan) -> dict:
+    """Candles given to the strategies of an exchange in daemon mode, keyed by exchange and timeframe"""
+
+    return {(name, timeframe): data for timeframe, data in strategy_frames(buffers, plan).items()}
+
+
+def tick_all(daemons: list):
+    """Ticks the daemons of every exchange at the same time, each in its thread"""
+
+    threads = [threading.Thread(target=daemon.tick, name=daemon.adapter.name) for daemon in daemons]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Shared by the daemons under its lock, cleared once every one of them is done
+    print(INDICATORS)
+    INDICATORS.clear()
+
+
+def run_daemon(names: list =tuple(EXCHANGES), max_memory: float =MAX_MEMORY, workers: int =WORKERS,
+               pool: ShardPool =None):
+    """
+    Keeps the candles of every exchange in memory and runs the strategies
+    at every close, downloading only the new candles
+
+    Parameters
+    ----------
+    names : list
+        Names of the exchanges, keys of EXCHANGES
+    max_memory : float
+        MB of resident memory before the candles of an exchange are dropped
+    workers : int
+        Number of processes running the strategies
+    pool : ShardPool
+        Pool opened by the caller before starting any thread, a pool of
+        workers processes is opened if not given
+    """
+
+    strategies = exchange_strategies(names)
+    plans = exchange_plans(names)
+
+    pool = contextlib.nullcontext(pool) if pool is not None else ShardPool(strategies, workers, [INDICATORS])
+    with pool as pool, Notifier.from_config() as notifier:
+        notify = lambda breakout: notifier.notify(breakout_message(breakout))
+        daemons = [Daemon(plans[name], {key: value for key, value in strategies.items() if key[0] == name},
+                          notify, partial(exchange_frames, name=name, plan=plans[name]),
+                          max_memory=max_memory, pool=pool, adapter=EXCHANGES[name][0])
+                   for name in names]
+        scheduler = CandleScheduler(KUCOIN.server_time)
+        for timeframe in SCHEDULED_TIMEFRAMES:
+            scheduler.every(timeframe, partial(tick_all, daemons))
+        scheduler.run()
+
+
+def main():
+    """Main function of the program which mainly controls
+    timeflow and execution
+
+    Argv : list
+        List of arguments passed to the program (false, true, daemon, -h, --help)
+    """
+
+    if len(sys.argv) in (2, 3):
+        if sys.argv[1] == '-h' or sys.argv[1] == '--help':
+            print('Usage: python3 exchanges.py <repeat> [max memory in MB]')
+            print('<repeat> can be true, false or daemon')
+            exit()
+        elif sys.argv[1] == 'true':
+            # The processes are forked once, before the metrics server and the scheduler start a thread
+            with ShardPool(exchange_strategies(tuple(EXCHANGES)), WORKERS, [INDICATORS]) as pool:
+                print("Metrics served on {}".format(MetricsServer(METRICS).start()))
+                # Runs a few seconds after every close of the exchange clock
+                scheduler = CandleScheduler(KUCOIN.server_time)
+                for timeframe in SCHEDULED_TIMEFRAMES:
+                    scheduler.every(timeframe, partial(find_breakouts, pool=pool))
+                scheduler.run()
+
+        elif sys.argv[1] == 'daemon':
+            with ShardPool(exchange_strategies(tuple(EXCHANGES)), WORKERS, [INDICATORS]) as pool:
+                print("Metrics served on {}".format(MetricsServer(METRICS).start()))
+                run_daemon(max_memory=float(sys.argv[2]) if len(sys.argv) == 3 else MAX_MEMORY, pool=pool)
+
+        elif sys.argv[1] == 'false':
+            find_breakouts()
+            METRICS.dump(METRICS_PATH)
+            print("{} written to {}".format(METRICS, METRICS_PATH))
+
+        else:
+            raise Exception('Invalid argument: should be either true, false or daemon')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""Local stand-in of the Kucoin and Gate.io APIs for offline load testing
+
+Every download of the bots goes to api.kucoin.com or api.gateio.ws, the
+fetch and pipeline stages cannot be measured twice the same way. This
+script serves the endpoints the bots use, in the layout of every exchange,
+from a local HTTP server:
+
+    * Kucoin: /api/v1/symbols, /api/v1/market/candles, /api/v1/timestamp
+    * Gate.io: /api/v4/spot/currency_pairs, /api/v4/spot/candlesticks,
+      /api/v4/spot/time
+
+The candles are random walks, the same for a symbol and timeframe at
+every request, of as many symbols as asked (5000 and more). Every
+response can be delayed, answered with an error or with a 429 and its
+Retry-After header at a given rate.
+
+Responses can also be replayed from fixtures: with a fixtures folder a
+request whose response was recorded gets the recorded one, and in record
+mode the requests without a fixture are sent to the real exchange and
+their response is written to the folder. The time parameters of the
+candles are left out of the name of a fixture, a replayed response is the
+recorded one whatever the time asked.
+
+The bots are pointed at the server with the KUCOIN_BASE_URL and
+GATEIO_BASE_URL environment variables (exchange.helpers,
+exchange.adapters), printed when the server starts.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m mock_exchange [--port 8765] [--symbols 5000] [--latency 0.05] [--error-rate 0.01]
+                             [--throttle-rate 0.01] [--fixtures folder] [--record]
+
+This file can be imported as a module and contains the following:
+
+    * SyntheticMarket - Random walk candles of many symbols, the same at every request
+    * MockExchange - Local HTTP server of the endpoints of Kucoin and Gate.io
+    * fixture_name - File of the recorded response of a request
+
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+import threading
+import numpy as np
+import aiohttp
+from aiohttp import web
+from exchange.helpers import TIMEFRAME_SECONDS
+
+
+HOST="127.0.0.1"
+PORT=8765
+SYMBOLS=1000            # Symbols listed on both exchanges
+HISTORY=1500            # Candles of every symbol before the start of the server
+RETRY_AFTER=1           # Seconds asked in the Retry-After header of a 429
+
+KUCOIN_MAX_BARS=1500    # Candles of a response, as the real endpoints
+GATEIO_MAX_BARS=1000
+
+# Where the requests without fixtures are sent in record mode
+UPSTREAMS: dict = {'/api/v1/': "https://api.kucoin.com", '/api/v4/': "https://api.gateio.ws"}
+# Time parameters, left out of the name of the fixtures
+TIME_PARAMS: tuple = ('startAt', 'endAt', 'from', 'to')
+GATEIO_INTERVALS: dict = {'1h': '1hour', '4h': '4hour', '1d': '1day'}
+
+
+def fixture_name(path: str, query: dict) -> str:
+    """
+    File of the recorded response of a request
+
+    Parameters
+    ----------
+    path : str
+        Path of the request
+    query : dict
+        Query parameters of the request
+
+    Returns
+    -------
+    str
+        Name of the fixture file, the path and a hash of the parameters
+        other than the time
+    """
+
+    params = sorted((key, value) for key, value in query.items() if key not in TIME_PARAMS)
+    digest = hashlib.sha1(json.dumps(params).encode()).hexdigest()[:12]
+    return "{}-{}.json".format(path.strip('/').replace('/', '_'), digest)
+
+
+class SyntheticMarket:
+    """
+    Random walk candles of many symbols, the same at every request
+
+    The walk of a symbol and timeframe starts HISTORY candles before the
+    market was created and is drawn from a generator seeded by the
+    symbol, the timeframe and the seed, so a later request sees the same
+    candles with the new ones appended.
+
+    Attributes
+    ----------
+    symbols : int
+        Number of symbols
+    seed : int
+        Seed of the walks
+    start : int
+        Unix timestamp the market was created at
+    """
+
+    def __init__(self, symbols: int =SYMBOLS, seed: int =0, start: int =None):
+        self.symbols = symbols
+        self.seed = seed
+        self.start = int(time.time()) if start is None else start
+
+    def names(self, separator: str) -> list:
+        return ['SYM{}{}USDT'.format(i, separator) for i in range(self.symbols)]
+
+    def candles(self, symbol: str, timeframe: str, since: int, limit: int) -> np.ndarray:
+        """
+        Candles of a symbol from a time onwards
+
+        Parameters
+        ----------
+        symbol : str
+            Symbol of the market, SYM<i>-USDT or SYM<i>_USDT
+        timeframe : str
+            The timeframe of the candles
+        since : int
+            Unix timestamp of the first candle
+        limit : int
+            Maximum number of candles, the last ones are kept
+
+        Returns
+        -------
+        np.ndarray
+            One row per candle in chronological order: time, open, close,
+            high, low, volume and turnover, empty for an unknown symbol
+        """
+
+        try:
+            index = int(symbol[3:].replace('_', '-').split('-')[0])
+        except ValueError:
+            index = -1
+        if not 0 <= index < self.symbols:
+            return np.empty((0, 7))
+
+        step = TIMEFRAME_SECONDS[timeframe]
+        origin = (self.start // step - HISTORY) * step
+        count = (int(time.time()) // step * step - origin) // step + 1
+        draws = np.random.default_rng((self.seed, index, step)).standard_normal((count, 3))
+
+        scale = 0.01 * np.sqrt(step / 3600)
+        close = 10.0 ** (index % 600 / 100 - 2) * np.exp(np.cumsum(draws[:, 0] * scale))
+        open_ = np.r_[close[0], close[:-1]]
+        spread = np.abs(draws[:, 1]) * scale / 2
+        high = np.maximum(open_, close) * (1 + spread)
+        low = np.minimum(open_, close) * (1 - spread)
+        volume = np.exp(10 + draws[:, 2])
+        times = origin + np.arange(count) * step
+
+        rows = np.column_stack([times, open_, close, high, low, volume, volume * close])
+        rows = rows[times >= since]
+        return rows[-limit:]
+
+
+class MockExchange:
+    """
+    Local HTTP server of the endpoints of Kucoin and Gate.io
+
+    Attributes
+    ----------
+    market : SyntheticMarket
+        Candles served without a fixture
+    latency : float
+        Seconds every response is delayed
+    jitter : float
+        Random extra delay of a response, up to this many seconds
+    error_rate : float
+        Share of the requests answered with a 500
+    throttle_rate : float
+        Share of the requests answered with a 429
+    retry_after : float
+        Seconds asked in the Retry-After header of a 429
+    fixtures : str
+        Folder of the recorded responses, replayed when found
+    record : bool
+        Sends the requests without a fixture to the real exchange and
+        records their response
+    counts : dict
+        Requests, errors, throttled, replayed and recorded responses
+    """
+
+    def __init__(self, market: SyntheticMarket =None, latency: float =0.0, jitter: float =0.0,
+                 error_rate: float =0.0, throttle_rate: float =0.0, retry_after: float =RETRY_AFTER,
+                 fixtures: str =None, record: bool =False, seed: int =0):
+        self.market = market if market is not None else SyntheticMarket(seed=seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.fixtures = fixtures
+        self.record = record
+        self.random = random.Random(seed)
+        self.counts = {'requests': 0, 'errors': 0, 'throttled': 0, 'replayed': 0, 'recorded': 0}
+        self.url = None
+        self.loop = None
+        self.thread = None
+        if fixtures is not None:
+            os.makedirs(fixtures, exist_ok=True)
+
+    def application(self) -> web.Application:
+        """The routes of both exchanges behind the faults of the server"""
+
+        app = web.Application(middlewares=[self.faults])
+        app.router.add_get('/api/v1/symbols', self.kucoin_symbols)
+        app.router.add_get('/api/v1/market/candles', self.kucoin_candles)
+        app.router.add_get('/api/v1/timestamp', self.kucoin_time)
+        app.router.add_get('/api/v4/spot/currency_pairs', self.gateio_symbols)
+        app.router.add_get('/api/v4/spot/candlesticks', self.gateio_candles)
+        app.router.add_get('/api/v4/spot/time', self.gateio_time)
+        return app
+
+    @web.middleware
+    async def faults(self, request: web.Request, handler) -> web.Response:
+        """Delays the response, injects the errors, or replays and records it"""
+
+        self.counts['requests'] += 1
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        draw = self.random.random()
+        if draw < self.error_rate:
+            self.counts['errors'] += 1
+            return web.json_response({'message': 'injected error'}, status=500)
+        if draw < self.error_rate + self.throttle_rate:
+            self.counts['throttled'] += 1
+            return web.json_response({'message': 'Too Many Requests'}, status=429,
+                                     headers={'Retry-After': str(self.retry_after)})
+
+        if self.fixtures is None:
+            return await handler(request)
+        path = os.path.join(self.fixtures, fixture_name(request.path, dict(request.query)))
+        if os.path.exists(path):
+            self.counts['replayed'] += 1
+            with open(path) as fixture:
+                recorded = json.load(fixture)
+            return web.json_response(recorded['body'], status=recorded['status'])
+        if not self.record:
+            return await handler(request)
+
+        upstream = next(url for prefix, url in UPSTREAMS.items() if request.path.startswith(prefix))
+        async with aiohttp.ClientSession() as session:
+            async with session.get(upstream + request.path, params=request.query) as response:
+                status, body = response.status, await response.json(content_type=None)
+        if status == 200:
+            self.counts['recorded'] += 1
+            # Written under another name first so an interrupted write is not taken for a fixture
+            with open(path + '.tmp', 'w') as fixture:
+                json.dump({'status': status, 'body': body}, fixture)
+            os.replace(path + '.tmp', path)
+        return web.json_response(body, status=status)
+
+    async def kucoin_symbols(self, request: web.Request) -> web.Response:
+        symbols = [{'symbol': symbol, 'baseCurrency': symbol.split('-')[0], 'quoteCurrency': 'USDT',
+                    'market': 'USDS', 'enableTrading': True} for symbol in self.market.names('-') + ['USDC-USDT']]
+        return web.json_response({'code': '200000', 'data': symbols})
+
+    async def kucoin_candles(self, request: web.Request) -> web.Response:
+        rows = self.market.candles(request.query['symbol'], request.query['type'],
+                                   int(request.query.get('startAt', 0)), KUCOIN_MAX_BARS)
+        # Newest first, every value as a string
+        candles = [[str(int(row[0]))] + [repr(value) for value in row[1:]] for row in rows[::-1].tolist()]
+        return web.json_response({'code': '200000', 'data': candles})
+
+    async def kucoin_time(self, request: web.Request) -> web.Response:
+        return web.json_response({'code': '200000', 'data': int(time.time() * 1000)})
+
+    async def gateio_symbols(self, request: web.Request) -> web.Response:
+        return web.json_response([{'id': symbol, 'base': symbol.split('_')[0], 'quote': 'USDT',
+                                   'trade_status': 'tradable'} for symbol in self.market.names('_')])
+
+    async def gateio_candles(self, request: web.Request) -> web.Response:
+        rows = self.market.candles(request.query['currency_pair'], GATEIO_INTERVALS[request.query['interval']],
+                                   int(request.query.get('from', 0)), GATEIO_MAX_BARS)
+        # Oldest first: time, quote volume, close, high, low, open, base volume, closed
+        candles = [[str(int(time_)), repr(turnover), repr(close), repr(high), repr(low), repr(open_),
+                    repr(volume), 'true'] for time_, open_, close, high, low, volume, turnover in rows.tolist()]
+        return web.json_response(candles)
+
+    async def gateio_time(self, request: web.Request) -> web.Response:
+        return web.json_response({'server_time': int(time.time() * 1000)})
+
+    @property
+    def gateio_url(self) -> str:
+        return self.url + '/api/v4'
+
+    def start(self, host: str =HOST, port: int =PORT) -> str:
+        """
+        Starts the server in a thread of its own
+
+        Parameters
+        ----------
+        host : str
+            Address the server listens on
+        port : int
+            Port the server listens on, 0 for any free one
+
+        Returns
+        -------
+        str
+            Base URL of Kucoin on the server, the one of Gate.io is
+            gateio_url
+        """
+
+        started = threading.Event()
+        self.loop = asyncio.new_event_loop()
+
+        def serve():
+            asyncio.set_event_loop(self.loop)
+            runner = web.AppRunner(self.application())
+            self.loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, host, port)
+            self.loop.run_until_complete(site.start())
+            self.url = "http://{}:{}".format(host, runner.addresses[0][1])
+            started.set()
+            self.loop.run_forever()
+            self.loop.run_until_complete(runner.cleanup())
+
+        self.thread = threading.Thread(target=serve, name='mock_exchange', daemon=True)
+        self.thread.start()
+        started.wait()
+        return self.url
+
+    def stop(self):
+        if self.thread is not None:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def __str__(self) -> str:
+        return "Mock exchange: {requests} requests, {errors} errors, {throttled} throttled, " \
+               "{replayed} replayed, {recorded} recorded".format(**self.counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local stand-in of the Kucoin and Gate.io APIs')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--symbols', type=int, default=SYMBOLS, help='symbols listed on both exchanges')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the candles and of the faults')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds every response is delayed')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra delay, up to these seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered with a 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of requests answered with a 429')
+    parser.add_argument('--retry-after', type=float, default=RETRY_AFTER, help='seconds asked by a 429')
+    parser.add_argument('--fixtures', help='folder of the recorded responses, replayed when found')
+    parser.add_argument('--record', action='store_true', help='records the responses missing from the fixtures')
+    args = parser.parse_args()
+    if args.record and args.fixtures is None:
+        parser.error('--record needs --fixtures')
+
+    server = MockExchange(SyntheticMarket(args.symbols, args.seed), args.latency, args.jitter, args.error_rate,
+                          args.throttle_rate, args.retry_after, args.fixtures, args.record, args.seed)
+    server.start(args.host, args.port)
+    print("Serving {} symbols, point the bots at it with:".format(args.symbols))
+    print("    export KUCOIN_BASE_URL={} GATEIO_BASE_URL={}".format(server.url, server.gateio_url))
+    try:
+        while True:
+            time.sleep(60)
+            print(server)
+    except KeyboardInterrupt:
+        server.stop()
+        print(server)
+
+
+if __name__ == '__main__':
+    main()
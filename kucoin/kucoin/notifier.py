@@ -0,0 +1,368 @@
+"""Batched sending of the alerts to Telegram
+
+Sending every alert with its own telegram_send.send call reads the
+telegram-send config and opens a new HTTPS connection every time, and a
+slow answer of Telegram holds the whole run back. This script sends the
+alerts from an event loop of its own over a single session: the alerts
+queued while a message is on its way are coalesced into digest messages,
+one per chat and within the size limit of Telegram, sent under its rate
+limits and retried when they fail.
+
+The Telegram token and chat are read from the config of telegram-send
+(telegram-send --configure). A stub backend keeping the messages in
+memory allows to test the notifier offline.
+
+This file can be imported as a module and contains the following:
+
+    * Notifier - Queue of alerts sent in digests by a background event loop
+    * TelegramBackend - Sends messages with the Telegram Bot API
+    * StubBackend - Keeps the messages in memory instead of sending them
+    * digests - Packs messages into as few texts as the size limit allows
+    * load_config - Reads the token and chat of the telegram-send config
+
+"""
+
+import asyncio
+import configparser
+import os
+import threading
+import aiohttp
+from exchange.ratelimit import APICallError, TokenBucket, RetryPolicy, CircuitBreaker, call_with_retry_async
+from metrics import METRICS
+
+
+TELEGRAM_URL="https://api.telegram.org/bot{}/sendMessage"
+TELEGRAM_CONFIG=os.path.join(os.path.expanduser('~'), '.config', 'telegram-send.conf')
+
+MESSAGE_LIMIT=4096      # Characters of a Telegram message
+DIGEST_DELAY=1          # Seconds alerts are gathered before the first digest is sent
+SEND_TIMEOUT=10         # Seconds before a message is abandoned
+
+# Telegram allows about 30 messages per second overall and 1 per second
+# in a chat, with short bursts
+GLOBAL_RATE=30          # Messages per second to all chats
+CHAT_RATE=1             # Messages per second to one chat
+CHAT_BURST=3            # Messages that can be sent at once to one chat
+MAX_RETRIES=5           # Retries of a message before giving up on it
+BACKOFF_BASE=1          # Seconds before the first retry, doubled every retry
+BACKOFF_MAX=60          # Maximum seconds between two retries
+BREAKER_THRESHOLD=10    # Consecutive failures before giving up on Telegram
+BREAKER_TIMEOUT=120     # Seconds before trying Telegram again
+
+DONE = None             # Queued by close, the loop stops once it is reached
+
+
+def load_config(path: str =TELEGRAM_CONFIG) -> tuple:
+    """
+    Reads the token and chat of the telegram-send config
+
+    Parameters
+    ----------
+    path : str
+        Path of the config written by telegram-send --configure
+
+    Returns
+    -------
+    tuple (str, str)
+        Bot token and chat id
+
+    Raises
+    ------
+    FileNotFoundError
+        If telegram-send was not configured
+    """
+
+    if not os.path.exists(path):
+        raise FileNotFoundError("No telegram-send config at {}, run telegram-send --configure".format(path))
+    config = configparser.ConfigParser()
+    config.read(path)
+    return config['telegram']['token'], config['telegram']['chat_id']
+
+
+def digests(messages: list, limit: int =MESSAGE_LIMIT) -> list:
+    """
+    Packs messages, one per line, into as few texts as the size limit allows
+
+    Parameters
+    ----------
+    messages : list
+        Messages in the order they are sent
+    limit : int
+        Maximum number of characters of a text
+
+    Returns
+    -------
+    list
+        Texts to send, a message longer than the limit is cut
+    """
+
+    texts = []
+    lines = []
+    size = 0
+    for message in messages:
+        message = message[:limit]
+        if lines and size + 1 + len(message) > limit:
+            texts.append('\n'.join(lines))
+            lines = []
+            size = 0
+        size += len(message) + (1 if lines else 0)
+        lines.append(message)
+    if lines:
+        texts.append('\n'.join(lines))
+    return texts
+
+
+class TelegramBackend:
+    """
+    Sends messages with the Telegram Bot API over one session
+
+    Attributes
+    ----------
+    token : str
+        Token of the bot
+    timeout : float
+        Seconds before a message is abandoned
+    """
+
+    def __init__(self, token: str, timeout: float =SEND_TIMEOUT):
+        self.token = token
+        self.timeout = timeout
+        self.session = None
+
+    async def open(self):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def close(self):
+        await self.session.close()
+
+    async def send(self, chat_id: str, text: str):
+        """
+        Sends a message to a chat
+
+        Parameters
+        ----------
+        chat_id : str
+            Id of the chat
+        text : str
+            Text of the message
+
+        Raises
+        ------
+        APICallError
+            If Telegram answers with an error, with the delay it asked to
+            wait on a 429
+        """
+
+        async with self.session.post(TELEGRAM_URL.format(self.token),
+                                     json={'chat_id': chat_id, 'text': text,
+                                           'disable_web_page_preview': True}) as response:
+            if response.status != 200:
+                try:
+                    answer = await response.json(content_type=None)
+                    retry_after = answer.get('parameters', {}).get('retry_after')
+                except Exception:
+                    retry_after = None
+                raise APICallError(response.status, retry_after)
+
+
+class StubBackend:
+    """
+    Keeps the messages in memory instead of sending them
+
+    Attributes
+    ----------
+    latency : float
+        Seconds every message takes to be sent
+    sent : list
+        (chat id, text) of every message sent
+    """
+
+    def __init__(self, latency: float =0.0):
+        self.latency = latency
+        self.sent = []
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send(self, chat_id: str, text: str):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.append((chat_id, text))
+
+
+class Notifier:
+    """
+    Queue of alerts sent in digests by an event loop in a background thread
+
+    notify can be called from any thread and never waits for Telegram.
+    Used as a context manager, the loop is started on entry and every
+    queued alert is sent before leaving.
+
+    Attributes
+    ----------
+    backend : TelegramBackend or StubBackend
+        Sends the messages
+    chat_id : str
+        Chat the alerts are sent to when notify is not given one
+    delay : float
+        Seconds alerts are gathered before the first digest is sent
+    alerts : int
+        Number of alerts queued
+    messages : int
+        Number of messages sent
+    failed : int
+        Number of alerts given up on
+    """
+
+    def __init__(self, backend, chat_id: str =None, delay: float =DIGEST_DELAY, limit: int =MESSAGE_LIMIT):
+        self.backend = backend
+        self.chat_id = chat_id
+        self.delay = delay
+        self.limit = limit
+        self.limiter = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_limiters = {}
+        self.policy = RetryPolicy(MAX_RETRIES, BACKOFF_BASE, BACKOFF_MAX)
+        self.breaker = CircuitBreaker(BREAKER_THRESHOLD, BREAKER_TIMEOUT)
+        self.alerts = 0
+        self.messages = 0
+        self.failed = 0
+        self.loop = None
+        self.queue = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+
+    @classmethod
+    def from_config(cls, path: str =TELEGRAM_CONFIG, **kwargs):
+        """
+        Notifier sending to the bot and chat of the telegram-send config
+
+        Parameters
+        ----------
+        path : str
+            Path of the config written by telegram-send --configure
+        **kwargs
+            Other arguments of the notifier
+
+        Returns
+        -------
+        Notifier
+            The notifier, not started
+        """
+
+        token, chat_id = load_config(path)
+        return cls(TelegramBackend(token), chat_id, **kwargs)
+
+    def start(self):
+        """
+        Starts the event loop sending the alerts
+
+        Raises
+        ------
+        Exception
+            What opening the backend raised, the event loop is stopped
+        """
+
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.worker()), name='notifier', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            self.thread.join()
+            raise self.error
+
+    def notify(self, text: str, chat_id: str =None):
+        """
+        Queues an alert, returns at once
+
+        Parameters
+        ----------
+        text : str
+            Text of the alert
+        chat_id : str
+            Chat to send it to, the chat of the notifier if not given
+        """
+
+        self.alerts += 1
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, (chat_id or self.chat_id, text))
+
+    def close(self):
+        """Sends every queued alert and stops the event loop"""
+
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, DONE)
+        self.thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    async def worker(self):
+        """Gathers the queued alerts and sends them in digests until closed"""
+
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        try:
+            await self.backend.open()
+        except Exception as error:
+            # Raised again by start, in the thread waiting for the loop
+            self.error = error
+            return
+        finally:
+            self.ready.set()
+        done = False
+        try:
+            while not done:
+                items = [await self.queue.get()]
+                # Alerts found right after this one go in the same digest
+                await asyncio.sleep(self.delay)
+                while not self.queue.empty():
+                    items.append(self.queue.get_nowait())
+                if DONE in items:
+                    done = True
+                    items = [item for item in items if item is not DONE]
+
+                chats = {}
+                for chat_id, text in items:
+                    chats.setdefault(chat_id, []).append(text)
+                await asyncio.gather(*[self.send_chat(chat_id, texts) for chat_id, texts in chats.items()])
+        finally:
+            await self.backend.close()
+
+    async def send_chat(self, chat_id: str, texts: list):
+        """
+        Sends the digests of the alerts of a chat, one after the other
+
+        Parameters
+        ----------
+        chat_id : str
+            Id of the chat
+        texts : list
+            Alerts of the chat in the order they were queued
+        """
+
+        if chat_id not in self.chat_limiters:
+            self.chat_limiters[chat_id] = TokenBucket(CHAT_RATE, CHAT_BURST)
+
+        for digest in digests(texts, self.limit):
+            async def request():
+                await self.limiter.acquire_async()
+                await self.backend.send(chat_id, digest)
+
+            try:
+                with METRICS.timer('telegram_seconds'):
+                    await call_with_retry_async(request, self.chat_limiters[chat_id], self.policy, self.breaker)
+            except Exception as error:
+                self.failed += digest.count('\n') + 1
+                METRICS.inc('telegram_messages_total', status='failed')
+                print("Telegram message to {} failed: {}".format(chat_id, error))
+            else:
+                self.messages += 1
+                METRICS.inc('telegram_messages_total', status='sent')
+
+    def __str__(self) -> str:
+        return "Notifier: {} alerts in {} messages, {} failed".format(self.alerts, self.messages, self.failed)
@@ -0,0 +1,397 @@
+"""Parameter sweep of the thresholds and periods of the strategies
+
+The thresholds of the strategies (the deviation and stoch RSI trigger of
+bb_rsi, the bands of rounding...) and the periods of their indicators are
+parameters of their rules (strategies.rules). This script evaluates every
+combination of a grid of parameters, or a random sample of it, on the
+history of candles with the backtester and ranks them by the average
+return after their signals.
+
+The history is split once into chunks of symbols, and every chunk is
+evaluated for a group of combinations in a process of a pool. The
+combinations of a group have the same parameters for the indicators, so
+the indicators are calculated once per chunk and shared by the whole
+group (backtest.Backtest). Every evaluated (chunk, group) is written to a
+checkpoint file as soon as it is finished, a sweep started again skips
+what was already evaluated. The chunks and the checkpoint of a sweep are
+kept in data/sweeps/<strategy>-<timeframe>, with a manifest of the data
+file, the horizons and the rule they were evaluated for. A sweep of
+other candles, horizons or rule refuses to resume from the folder, which
+is removed to start it.
+
+Usage (from the kucoin/kucoin folder):
+
+    python3 -m optimizer <strategy> <timeframe> [data file] [random N] [workers]
+
+This file can be imported as a module and contains the following:
+
+    * Sweep - Evaluates combinations of parameters of a strategy on the history
+    * grid - Every combination of the values of the parameters
+    * sample - Random combinations of the values of the parameters
+    * evaluate - Evaluates a group of combinations on a chunk of symbols
+
+"""
+
+import os
+import sys
+import json
+import time
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from backtest import Backtest, load_history, HORIZONS, CHUNK_SIZE
+from exchange.helpers import STORE_PATH
+from strategies.rules import Rule, INDICATOR_PARAMS
+from strategies.strategies import ICHIMOKU, BB_RSI, ROUNDING, MA_INCH, MA_PUMPERS
+
+
+HORIZON=24              # Candles after a signal the combinations are ranked on
+MIN_TRADES=30           # Combinations with fewer signals are ranked last
+WORKERS=os.cpu_count()  # Processes evaluating the chunks
+SWEEPS_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'sweeps')
+
+# Strategy to its rule and the values tried for every parameter
+SPACES: dict = {
+    'ichimoku': (ICHIMOKU, {'tenkan_period': [10, 20, 30], 'kijun_period': [40, 60, 90],
+                            'senkou_period': [90, 120, 150], 'ichimoku_shift': [20, 30]}),
+    'bb_rsi': (BB_RSI, {'dev': [1.0, 1.5, 2.0, 2.5], 'oversold': [2, 5, 10, 20], 'bb_period': [20, 30]}),
+    'rounding': (ROUNDING, {'max_range': [4.0, 6.0, 8.0, 10.0, 12.0], 'max_drop': [3.0, 5.0, 7.0, 9.0]}),
+    'ma_inch': (MA_INCH, {'sma_period': [10, 25, 50, 100], 'tenkan_period': [10, 20, 30]}),
+    'ma_pumpers': (MA_PUMPERS, {'sma_period': [10, 25, 50, 100], 'tenkan_period': [10, 20, 30]}),
+}
+
+
+def grid(space: dict) -> list:
+    """
+    Every combination of the values of the parameters
+
+    Parameters
+    ----------
+    space : dict
+        Parameter to list of values
+
+    Returns
+    -------
+    list of dicts
+        Parameter to value of every combination
+    """
+
+    return [dict(zip(space, values)) for values in itertools.product(*space.values())]
+
+
+def sample(space: dict, n: int, seed: int =0) -> list:
+    """
+    Random combinations of the values of the parameters, without repeats
+
+    Parameters
+    ----------
+    space : dict
+        Parameter to list of values
+    n : int
+        Number of combinations, the whole grid if it has fewer
+    seed : int
+        Seed of the random generator
+
+    Returns
+    -------
+    list of dicts
+        Parameter to value of every combination
+    """
+
+    combos = grid(space)
+    if n >= len(combos):
+        return combos
+    rng = np.random.default_rng(seed)
+    return [combos[i] for i in sorted(rng.choice(len(combos), n, replace=False))]
+
+
+def combo_id(combo: dict) -> str:
+    return json.dumps(combo, sort_keys=True)
+
+
+# Chunk of candles last read by the process, the tasks of a chunk often follow each other
+_loaded = {}
+
+
+def evaluate(text: str, params: dict, combos: list, path: str, timeframe: str, horizons: list) -> dict:
+    """
+    Evaluates a group of combinations on a chunk of symbols, in a process
+    of the pool
+
+    Parameters
+    ----------
+    text : str
+        Text of the rule of the strategy
+    params : dict
+        Parameters of the rule, the combinations replace some of them
+    combos : list of dicts
+        Combinations of parameters, with the same indicator parameters
+    path : str
+        File of the chunk of candles
+    timeframe : str
+        The timeframe of the candles
+    horizons : list
+        Candles after a signal its return is measured over
+
+    Returns
+    -------
+    dict
+        Combination id to signals, and count of returns, hits and sum of
+        the returns for every horizon
+    """
+
+    if path not in _loaded:
+        _loaded.clear()
+        _loaded[path] = pd.read_pickle(path)
+
+    rule = Rule(text, **params)
+    backtest = Backtest({combo_id(combo): rule.with_params(**combo) for combo in combos}, timeframe, horizons)
+    backtest.run(_loaded[path])
+    return {name: [backtest.signals[name], backtest.trades[name].tolist(), backtest.hits[name].tolist(),
+                   backtest.returns[name].tolist()] for name in backtest.strategies}
+
+
+class Sweep:
+    """
+    Evaluates combinations of parameters of a strategy on the history
+
+    Attributes
+    ----------
+    rule : Rule
+        Rule of the strategy
+    combos : list of dicts
+        Combinations of parameters evaluated
+    timeframe : str
+        The timeframe of the candles
+    directory : str
+        Folder of the chunks of candles and of the checkpoint file
+    source : str
+        Candle store or data file the chunks are split from
+    horizons : list
+        Candles after a signal its return is measured over
+    results : dict
+        Combination id to chunk to what evaluate returned, read back from
+        the checkpoint file
+
+    Raises
+    ------
+    ValueError
+        If the folder holds a sweep of another data file, timeframe,
+        horizons or rule
+    """
+
+    def __init__(self, rule: Rule, combos: list, timeframe: str, directory: str, source: str,
+                 horizons: list =HORIZONS):
+        self.rule = rule
+        self.combos = combos
+        self.timeframe = timeframe
+        self.directory = directory
+        self.source = source
+        self.horizons = list(horizons)
+        self.checkpoint = os.path.join(directory, 'results.jsonl')
+        self.results = {}
+        self.elapsed = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self.check_manifest()
+
+        if os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as checkpoint:
+                lines = checkpoint.read().splitlines()
+            finished = []
+            for line in lines:
+                try:
+                    done = json.loads(line)
+                except ValueError:
+                    # Last line cut by an interrupted write
+                    continue
+                finished.append(line)
+                for name, result in done['results'].items():
+                    self.results.setdefault(name, {})[done['chunk']] = result
+            if len(finished) < len(lines):
+                with open(self.checkpoint, 'w') as checkpoint:
+                    checkpoint.write(''.join(line + '\n' for line in finished))
+
+    def check_manifest(self):
+        """
+        Writes the manifest of a new sweep, or checks the one of the sweep
+        resumed matches this one
+
+        The results are read by position of their horizon and the chunks
+        are only split once, a sweep of other candles, horizons or rule
+        would mix its results with the ones in the folder.
+
+        Raises
+        ------
+        ValueError
+            If the folder holds a sweep of another data file, timeframe,
+            horizons or rule, or a sweep without a manifest
+        """
+
+        manifest = {'source': os.path.abspath(self.source), 'timeframe': self.timeframe, 'horizons': self.horizons,
+                    'rule': self.rule.source, 'params': self.rule.params}
+        path = os.path.join(self.directory, 'manifest.json')
+        if os.path.exists(path):
+            with open(path) as file:
+                found = json.load(file)
+        elif self.chunks or os.path.exists(self.checkpoint):
+            raise ValueError("{} holds a sweep without a manifest, remove it to start this one".format(self.directory))
+        else:
+            with open(path, 'w') as file:
+                json.dump(manifest, file, indent=1)
+            return
+
+        # Compared as JSON, the tuples and lists of the manifest are read back as lists
+        different = [key for key in manifest if json.loads(json.dumps(manifest[key])) != found.get(key)]
+        if different:
+            raise ValueError("{} holds a sweep of another {}, remove it to start this one".format(
+                self.directory, ', '.join(different)))
+
+    @property
+    def chunks(self) -> list:
+        """Files of the chunks of candles, in the order of the symbols"""
+
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.startswith('chunk') and name.endswith('.pkl'))
+
+    def split(self, size: int =CHUNK_SIZE):
+        """
+        Splits the history of the source into chunks of symbols, once for
+        the sweep
+
+        Parameters
+        ----------
+        size : int
+            Number of symbols of every chunk
+        """
+
+        if self.chunks:
+            return
+        for i, data in enumerate(load_history(self.source, self.timeframe, size)):
+            # Written under another name first so an interrupted split is not taken for a chunk
+            name = os.path.join(self.directory, 'chunk{:05d}.pkl'.format(i))
+            data.to_pickle(name + '.tmp')
+            os.replace(name + '.tmp', name)
+
+    def tasks(self) -> list:
+        """
+        Groups of combinations still to evaluate on every chunk
+
+        Returns
+        -------
+        list of tuples (str, list)
+            Chunk file and combinations with the same indicator parameters
+        """
+
+        groups = {}
+        for combo in self.combos:
+            params = {**self.rule.params, **combo}
+            key = tuple(sorted((name, value) for name, value in params.items() if name in INDICATOR_PARAMS))
+            groups.setdefault(key, []).append(combo)
+
+        tasks = []
+        for chunk in self.chunks:
+            chunk_name = os.path.basename(chunk)
+            for combos in groups.values():
+                todo = [combo for combo in combos if chunk_name not in self.results.get(combo_id(combo), {})]
+                if todo:
+                    tasks.append((chunk, todo))
+        return tasks
+
+    def run(self, workers: int =WORKERS):
+        """
+        Evaluates the combinations not evaluated yet in a pool of processes
+
+        Parameters
+        ----------
+        workers : int
+            Number of processes
+        """
+
+        tasks = self.tasks()
+        start = time.perf_counter()
+        print("{} combinations, {} chunks, {} tasks to evaluate on {} workers".format(
+            len(self.combos), len(self.chunks), len(tasks), workers))
+
+        with ProcessPoolExecutor(workers) as pool, open(self.checkpoint, 'a') as checkpoint:
+            futures = {pool.submit(evaluate, self.rule.text, self.rule.params, combos, chunk, self.timeframe,
+                                   self.horizons): chunk for chunk, combos in tasks}
+            for done, future in enumerate(as_completed(futures), 1):
+                chunk = os.path.basename(futures[future])
+                results = future.result()
+                checkpoint.write(json.dumps({'chunk': chunk, 'results': results}) + '\n')
+                checkpoint.flush()
+                for name, result in results.items():
+                    self.results.setdefault(name, {})[chunk] = result
+
+                elapsed = time.perf_counter() - start
+                print("{}/{} tasks, {:.1f}s, {:.1f}s left".format(
+                    done, len(tasks), elapsed, elapsed / done * (len(tasks) - done)))
+        self.elapsed += time.perf_counter() - start
+
+    def report(self, horizon: int =HORIZON, min_trades: int =MIN_TRADES) -> pd.DataFrame:
+        """
+        Combinations ranked by the average return after their signals
+
+        Parameters
+        ----------
+        horizon : int
+            Horizon the combinations are ranked on, one of the horizons
+        min_trades : int
+            Combinations with fewer signals with a return are ranked last
+
+        Returns
+        -------
+        pd.DataFrame
+            Parameters, signals, trades (signals with a return), hit rate
+            and average return of every combination, the best first
+        """
+
+        i = self.horizons.index(horizon)
+        rows = []
+        for combo in self.combos:
+            chunks = self.results.get(combo_id(combo), {}).values()
+            signals = sum(result[0] for result in chunks)
+            trades = sum(result[1][i] for result in chunks)
+            hits = sum(result[2][i] for result in chunks)
+            returns = sum(result[3][i] for result in chunks)
+            rows.append({**combo, 'signals': signals, 'trades': trades,
+                         'hit_rate': hits / trades if trades else np.nan,
+                         'avg_return': returns / trades if trades else np.nan})
+
+        report = pd.DataFrame(rows)
+        report['enough'] = report.trades >= min_trades
+        report = report.sort_values(['enough', 'avg_return'], ascending=False, kind='stable', na_position='last')
+        report = report.drop(columns='enough').reset_index(drop=True)
+        report.index += 1
+        return report
+
+
+def main():
+    if len(sys.argv) < 3 or sys.argv[1] in ('-h', '--help'):
+        print('Usage: python3 -m optimizer <strategy> <timeframe> [data file] [random N] [workers]')
+        print('<strategy> can be {}'.format(', '.join(SPACES)))
+        exit()
+
+    strategy, timeframe = sys.argv[1], sys.argv[2]
+    path = sys.argv[3] if len(sys.argv) > 3 else STORE_PATH
+    rule, space = SPACES[strategy]
+    if len(sys.argv) > 5 and sys.argv[4] == 'random':
+        combos = sample(space, int(sys.argv[5]))
+        workers = int(sys.argv[6]) if len(sys.argv) > 6 else WORKERS
+    else:
+        combos = grid(space)
+        workers = int(sys.argv[4]) if len(sys.argv) > 4 else WORKERS
+
+    try:
+        sweep = Sweep(rule, combos, timeframe, os.path.join(SWEEPS_PATH, '{}-{}'.format(strategy, timeframe)), path)
+    except ValueError as error:
+        print(error)
+        exit(1)
+    sweep.split()
+    sweep.run(workers)
+    print(sweep.report().head(20).to_string(float_format='{:.4f}'.format))
+
+
+if __name__ == '__main__':
+    main()
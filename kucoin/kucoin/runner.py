@@ -1,15 +1,162 @@
 from exchange.exchange import *
+from exchange.store import CandleStore
+from exchange.resample import derive_timeframes, within_window
 from strategies.strategies import *
+from ta_lib.cache import INDICATORS
 from helpers import *
-from telegram_send import send
-import schedule
+from notifier import Notifier
+from scheduler import CandleScheduler
+from pipeline import Pipeline, chunks
+from daemon import Daemon, MAX_MEMORY
+from sharding import ShardPool, WORKERS
+from planner import FetchPlan
+from metrics import METRICS, MetricsServer, METRICS_PATH
+from functools import partial
+import contextlib
 from datetime import datetime as dt
 import time
 import pandas as pd
 
-def find_breakouts():
+# The timeframes of the strategies are built locally from the base timeframe
+# when a request of it returns enough candles, the other ones are downloaded.
+# 151 daily candles would need 3648 hourly ones, more than the 1500 a request
+# returns, so the daily candles are still downloaded (planner.FetchPlan).
+BASE_TIMEFRAME = '1hour'
+
+# find_breakouts runs at every close of these timeframes
+SCHEDULED_TIMEFRAMES = ['4hour']
+
+
+def download_candles(symbols: list, plan: FetchPlan):
+    """
+    Downloads the candles of the symbols one chunk at a time
+
+    Parameters
+    ----------
+    symbols : list
+        List of symbols to download data of
+    plan : FetchPlan
+        Timeframes downloaded and built, with their number of candles
+
+    Yields
+    ------
+    tuple (str, pd.DataFrame)
+        Timeframe and candles of a chunk, as soon as they are ready
+    """
+
+    # The store is opened here as SQLite connections are used in the thread
+    # that opened them, the download stage of the pipeline
+    store = CandleStore()
+    session = FetchSession()
+    stats = {timeframe: FetchStats(timeframe) for timeframe in plan.fetched}
+    try:
+        for chunk in chunks(symbols):
+            for timeframe, bars in plan.fetched.items():
+                data = get_all_candles(chunk, timeframe, store, bars, stats[timeframe], session=session)
+                if timeframe != plan.base:
+                    yield timeframe, data
+                elif not data.empty:
+                    if timeframe in plan.bars:
+                        yield timeframe, within_window(data, timeframe, plan.bars[timeframe])
+                    yield from derive_timeframes(data, plan.derived).items()
+    finally:
+        store.close()
+        session.close()
+        for timeframe_stats in stats.values():
+            print(timeframe_stats)
+        print(plan.report(stats, len(symbols)))
+
+
+def breakout_message(breakout: dict) -> str:
+    """
+    Text of the Telegram alert of a breakout
+
+    Parameters
+    ----------
+    breakout : dict
+        Breakout found by a strategy
+
+    Returns
+    -------
+    str
+        Exchange, symbol, type and timeframe of the breakout
+    """
+
+    return "{} | {} | {} | {}".format(breakout['exc'], breakout['symbol'], breakout['type'], breakout['timeframe'])
+
+
+def breakout_strategies(exchange: str) -> dict:
+    """
+    Strategies run on the candles of every timeframe
+
+    Parameters
+    ----------
+    exchange : str
+        Name of the exchange
+
+    Returns
+    -------
+    dict
+        Timeframe to list of strategies
+    """
+
+    return {
+        '1hour': [partial(sr_breakout, exchange=exchange),
+                  #partial(catching_knives, exchange=exchange),
+                  partial(ma_inch, exchange=exchange),
+                  partial(ma_pumpers, exchange=exchange)],
+        '4hour': [#partial(ichimoku_breakout, timeframe='4h', exchange=exchange),
+                  ],
+        '1day': [partial(ichimoku_breakout, timeframe='1d', exchange=exchange),
+                 #partial(sr_breakout, exchange=exchange),
+                 partial(bottom, exchange=exchange),
+                 partial(rounding_breakout, exchange=exchange)],
+    }
+
+
+def strategy_frames(buffers: dict, plan: FetchPlan) -> dict:
+    """
+    Candles given to the strategies in daemon mode, built from the buffers
+    of the downloaded timeframes
+
+    Parameters
+    ----------
+    buffers : dict
+        Timeframe to CandleBuffer
+    plan : FetchPlan
+        Timeframes downloaded and built, with their number of candles
+
+    Returns
+    -------
+    dict
+        Timeframe to candles
+    """
+
+    frames = {timeframe: buffers[timeframe].window(bars) for timeframe, bars in plan.bars.items()
+              if timeframe in buffers}
+    if plan.derived:
+        frames.update(derive_timeframes(buffers[plan.base].window(min_candles=0), plan.derived))
+    return frames
+
+
+def find_breakouts(workers: int =WORKERS, pool: ShardPool =None):
     """
     Function which composes the whole program to find breakouts
+
+    The candles are downloaded, the strategies run and the alerts sent in
+    a pipeline, so the first alerts go out while the last symbols are still
+    being downloaded. The strategies run on shards of symbols in a pool of
+    workers processes.
+
+    Parameters
+    ----------
+    workers : int
+        Number of processes running the strategies, 1 runs them in the
+        pipeline's thread
+    pool : ShardPool
+        Pool opened by the caller before starting any thread, kept open
+        for its next runs, a pool of workers processes is opened for this
+        run if not given
     
     Returns
     -------
@@ -17,30 +164,58 @@ def find_breakouts():
     """
     
     exchange = 'KUCOIN'
-    breakouts = []
-    
+    strategies = breakout_strategies(exchange)
+    # Planned before anything is downloaded
+    plan = FetchPlan(strategies, BASE_TIMEFRAME)
+    print(plan)
     symbols = get_all_symbols()
 
-    data_4h = get_all_candles(symbols, '4hour')
-    data_1h = get_all_candles(symbols, '1hour')
-    data_1d = get_all_candles(symbols, '1day')
-    data_4h = data_4h.reset_index(drop=True)  
-    data_1h = data_1h.reset_index(drop=True)       # reset index because when downloading data, it is not in order
-    data_1d = data_1d.reset_index(drop=True)
-
-    #breakouts = ichimoku_breakout(data_4h, breakouts, '4h', exchange)
-    breakouts = ichimoku_breakout(data_1d, breakouts, '1d', exchange)
-    breakouts = sr_breakout(data_1h, breakouts, exchange)
-    #breakouts = sr_breakout(data_1d, breakouts, exchange)
-    #breakouts = catching_knives(data_1h, breakouts, exchange)
-    breakouts = ma_inch(data_1h, breakouts, exchange)
-    breakouts = bottom(data_1d, breakouts, exchange)
-    breakouts = rounding_breakout(data_1d, breakouts, exchange)
-    breakouts = ma_pumpers(data_1h, breakouts, exchange)
-    
-    for dic in breakouts:
-        send(messages=["{} | {} | {} | {}".format(dic['exc'], dic['symbol'], dic['type'], dic['timeframe'])])
-        time.sleep(0.1)
+    # The processes are forked before the threads of the notifier and the pipeline start,
+    # a pool given was opened by the caller before any of its threads.
+    # The alerts are queued to the notifier, which sends them in digests
+    pool = contextlib.nullcontext(pool) if pool is not None else ShardPool(strategies, workers, [INDICATORS])
+    with pool as pool, Notifier.from_config() as notifier:
+        pipeline = Pipeline(lambda: download_candles(symbols, plan), strategies,
+                            lambda breakout: notifier.notify(breakout_message(breakout)), pool=pool)
+        pipeline.run()
+    print(pipeline)
+    print(notifier)
+
+    # Indicators are not kept from one run to the next, the candles change
+    print(INDICATORS)
+    INDICATORS.clear()
+
+
+def run_daemon(max_memory: float =MAX_MEMORY, workers: int =WORKERS, pool: ShardPool =None):
+    """
+    Keeps the candles in memory and runs the strategies at every close,
+    downloading only the new candles
+
+    Parameters
+    ----------
+    max_memory : float
+        MB of resident memory before the candles are dropped
+    workers : int
+        Number of processes running the strategies
+    pool : ShardPool
+        Pool opened by the caller before starting any thread, a pool of
+        workers processes is opened if not given
+    """
+
+    exchange = 'KUCOIN'
+    strategies = breakout_strategies(exchange)
+    plan = FetchPlan(strategies, BASE_TIMEFRAME)
+    print(plan)
+
+    pool = contextlib.nullcontext(pool) if pool is not None else ShardPool(strategies, workers, [INDICATORS])
+    with pool as pool, Notifier.from_config() as notifier:
+        daemon = Daemon(plan, strategies,
+                        lambda breakout: notifier.notify(breakout_message(breakout)),
+                        partial(strategy_frames, plan=plan), [INDICATORS], max_memory, pool=pool)
+        scheduler = CandleScheduler(get_server_time)
+        for timeframe in SCHEDULED_TIMEFRAMES:
+            scheduler.every(timeframe, daemon.tick)
+        scheduler.run()
         
         
 def main():
@@ -48,26 +223,36 @@ def main():
     timeflow and execution
 
     Argv : list
-        List of arguments passed to the program (false, true, -h, --help)
+        List of arguments passed to the program (false, true, daemon, -h, --help)
     """
     
-    if len(sys.argv) == 2:
+    if len(sys.argv) in (2, 3):
         if sys.argv[1] == '-h' or sys.argv[1] == '--help':
-            print('Usage: python3 main.py <repeat>')
-            print('<repeat> can be true or false')
+            print('Usage: python3 main.py <repeat> [max memory in MB]')
+            print('<repeat> can be true, false or daemon')
             exit()
         elif sys.argv[1] == 'true':
-            schedule.every().hour.at(':00').do(find_breakouts)
-            while True:
-                if (hour_rounder(dt.now())).timestamp() % 14400 == 0:
-                    schedule.run_pending()
-                time.sleep(1)
+            # The processes are forked once, before the metrics server and the scheduler start a thread
+            with ShardPool(breakout_strategies('KUCOIN'), WORKERS, [INDICATORS]) as pool:
+                print("Metrics served on {}".format(MetricsServer(METRICS).start()))
+                # Runs a few seconds after every close of the exchange clock
+                scheduler = CandleScheduler(get_server_time)
+                for timeframe in SCHEDULED_TIMEFRAMES:
+                    scheduler.every(timeframe, partial(find_breakouts, pool=pool))
+                scheduler.run()
+
+        elif sys.argv[1] == 'daemon':
+            with ShardPool(breakout_strategies('KUCOIN'), WORKERS, [INDICATORS]) as pool:
+                print("Metrics served on {}".format(MetricsServer(METRICS).start()))
+                run_daemon(float(sys.argv[2]) if len(sys.argv) == 3 else MAX_MEMORY, pool=pool)
 
         elif sys.argv[1] == 'false':
             find_breakouts()
+            METRICS.dump(METRICS_PATH)
+            print("{} written to {}".format(METRICS, METRICS_PATH))
 
         else:
-            raise Exception('Invalid argument: should be either true or false')
+            raise Exception('Invalid argument: should be either true, false or daemon')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,390 @@
+"""Strategies run on shards of symbols in a pool of processes
+
+The strategies of a run are NumPy code and Python loops over the symbols
+running under the GIL, on a single core. This script splits the candles
+of a timeframe into shards of symbols and runs the strategies of the
+timeframe on every shard in a process of a pool.
+
+The candles are written once to a block of shared memory, one array per
+column, where every process reads the rows of its shard, instead of
+pickling a dataframe for every shard. The breakouts of the shards are
+merged strategy by strategy, then shard by shard. The shards have a fixed
+number of symbols, also when the strategies run in the calling thread,
+so the breakouts and their order are the same whatever the number of
+workers.
+
+The processes are forked when the pool is opened and keep the strategies
+and the caches given to the pool. A lock held by another thread at the
+fork (the one of the metrics, taken by the metrics server and the
+stages) would stay held forever in the processes, so the pool must be
+opened before the caller starts any thread: the runners open it first
+and use it for every run. With a single worker the strategies run in
+the calling thread.
+
+This file can be imported as a module and contains the following:
+
+    * ShardPool - Runs the strategies of a timeframe on shards of symbols in processes
+    * Shards - Breakouts of the shards of a frame, merged once every shard is done
+    * shard_bounds - Rows of the shards of contiguous symbols
+    * share - Writes the candles to a block of shared memory
+    * read_shared - Reads rows of the candles back from the shared memory
+    * run_strategies - Runs strategies on candles, one list of breakouts per strategy
+
+"""
+
+import os
+import threading
+import multiprocessing
+from multiprocessing import resource_tracker
+import numpy as np
+import pandas as pd
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import Future, ProcessPoolExecutor
+from metrics import METRICS
+
+
+WORKERS=os.cpu_count()  # Processes running the strategies, 1 runs them in the calling thread
+SHARD_SIZE=100          # Symbols of a shard
+
+
+def shard_bounds(symbols: np.ndarray, size: int =SHARD_SIZE) -> list:
+    """
+    Rows of the shards of contiguous symbols
+
+    Parameters
+    ----------
+    symbols : np.ndarray
+        Symbol of every row, the rows of a symbol following each other
+    size : int
+        Number of symbols of every shard
+
+    Returns
+    -------
+    list of tuples (int, int)
+        First and end row of every shard
+    """
+
+    if len(symbols) == 0:
+        return [(0, 0)]
+    starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+    bounds = np.r_[starts[::size], len(symbols)]
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def share(data: pd.DataFrame) -> tuple:
+    """
+    Writes the candles to a block of shared memory
+
+    Numeric columns are written as they are, the other ones as codes into
+    the list of their values (the symbols), or as their value when they
+    have a single one (the timeframe).
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Candles of all symbols
+
+    Returns
+    -------
+    tuple (SharedMemory, dict)
+        The block, to unlink once read, and its layout given to read_shared
+    """
+
+    layout = {'rows': len(data), 'columns': []}
+    arrays, offset = [], 0
+    for column in data.columns:
+        values = data[column]
+        labels = None
+        if pd.api.types.is_numeric_dtype(values):
+            values = np.ascontiguousarray(values.to_numpy())
+        else:
+            codes, labels = pd.factorize(values, sort=False)
+            if len(labels) == 1:
+                layout['columns'].append((column, None, labels[0], None))
+                continue
+            values, labels = codes.astype('int64'), np.asarray(labels, dtype=object)
+        layout['columns'].append((column, values.dtype.str, offset, labels))
+        arrays.append((offset, values))
+        offset += values.nbytes
+
+    block = SharedMemory(create=True, size=max(offset, 1))
+    for start, values in arrays:
+        np.ndarray(values.shape, values.dtype, block.buf, start)[:] = values
+    return block, layout
+
+
+def read_shared(name: str, layout: dict, start: int =0, end: int =None) -> pd.DataFrame:
+    """
+    Reads rows of the candles back from the shared memory
+
+    Parameters
+    ----------
+    name : str
+        Name of the block of shared memory
+    layout : dict
+        Layout returned by share
+    start : int
+        First row read
+    end : int
+        End row, the last row of the candles if not given
+
+    Returns
+    -------
+    pd.DataFrame
+        The rows, with the columns of the shared candles in the same order
+    """
+
+    end = layout['rows'] if end is None else end
+    block = SharedMemory(name=name)
+    try:
+        columns = {}
+        for column, dtype, value, labels in layout['columns']:
+            if dtype is None:
+                columns[column] = np.full(end - start, value, dtype=object)
+                continue
+            # Copied out of the block, which is unlinked once every shard is read
+            values = np.ndarray(layout['rows'], dtype, block.buf, value)[start:end].copy()
+            columns[column] = labels[values] if labels is not None else values
+    finally:
+        block.close()
+    return pd.DataFrame(columns)
+
+
+def strategy_name(strategy) -> str:
+    return getattr(getattr(strategy, 'func', strategy), '__name__', str(strategy))
+
+
+def run_strategies(strategies: list, data: pd.DataFrame, timeframe: str) -> list:
+    """
+    Runs strategies on candles, one list of breakouts per strategy
+
+    Parameters
+    ----------
+    strategies : list
+        Strategies called with the candles and a list of breakouts
+    data : pd.DataFrame
+        Candles of all symbols
+    timeframe : str
+        The timeframe of the candles, for the error messages
+
+    Returns
+    -------
+    list of lists
+        Breakouts of every strategy, empty for a strategy that failed
+    """
+
+    results = []
+    for strategy in strategies:
+        name = strategy_name(strategy)
+        try:
+            with METRICS.timer('strategy_seconds', strategy=name, timeframe=timeframe):
+                results.append(strategy(data, []))
+        except Exception as error:
+            print("Strategy {} on {} failed: {}".format(name, timeframe, error))
+            METRICS.inc('strategy_errors_total', strategy=name, timeframe=timeframe)
+            results.append([])
+        METRICS.inc('signals_total', len(results[-1]), strategy=name, timeframe=timeframe)
+    return results
+
+
+# Strategies and caches of a process of the pool, set when it starts
+_strategies = {}
+_caches = []
+
+
+def start_worker(strategies: dict, caches: list):
+    global _strategies, _caches
+    _strategies, _caches = strategies, list(caches)
+
+
+def run_shard(timeframe: str, name: str, layout: dict, start: int, end: int) -> list:
+    """
+    Runs the strategies of a timeframe on a shard, in a process of the pool
+
+    Parameters
+    ----------
+    timeframe : str
+        The timeframe of the candles
+    name : str
+        Name of the block of shared memory of the candles
+    layout : dict
+        Layout of the block
+    start : int
+        First row of the shard
+    end : int
+        End row of the shard
+
+    Returns
+    -------
+    tuple (list of lists, dict)
+        Breakouts of every strategy of the timeframe, and the metrics of
+        the shard, merged into the ones of the pool's process
+    """
+
+    # Only the metrics of this shard are sent back
+    METRICS.clear()
+    try:
+        return (run_strategies(_strategies[timeframe], read_shared(name, layout, start, end), timeframe),
+                METRICS.snapshot())
+    finally:
+        # The next shard has other candles, nothing cached can be used again
+        for cache in _caches:
+            cache.clear()
+
+
+class Shards:
+    """
+    Breakouts of the shards of a frame, merged once every shard is done
+
+    Attributes
+    ----------
+    futures : list
+        Future of every shard, in the order of the symbols, with its
+        breakouts and the metrics of the process that ran it (None when
+        it ran in the calling thread)
+    """
+
+    def __init__(self, futures: list, block: SharedMemory =None):
+        self.futures = futures
+        self.block = block
+        self.lock = threading.Lock()
+        self.pending = len(futures)
+        for future in futures:
+            future.add_done_callback(self.shard_done)
+
+    def shard_done(self, future: Future):
+        if not future.cancelled() and future.exception() is None and future.result()[1] is not None:
+            METRICS.merge(future.result()[1])
+        with self.lock:
+            self.pending -= 1
+            if self.pending or self.block is None:
+                return
+        # Every shard has read its rows
+        self.block.close()
+        self.block.unlink()
+
+    def done(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+    def result(self) -> list:
+        """
+        Breakouts of every shard, waiting for the shards not done
+
+        Returns
+        -------
+        list
+            Breakouts strategy by strategy, then shard by shard
+
+        Raises
+        ------
+        Exception
+            What a shard raised, if its process failed
+        """
+
+        results = [future.result()[0] for future in self.futures]
+        return [breakout for i in range(len(results[0])) for shard in results for breakout in shard[i]]
+
+
+class ShardPool:
+    """
+    Runs the strategies of a timeframe on shards of symbols in processes
+
+    Attributes
+    ----------
+    strategies : dict
+        Timeframe to list of strategies, as given to Pipeline
+    workers : int
+        Number of processes, 1 runs the strategies in the calling thread
+    caches : list
+        Caches cleared by a process after every shard
+    size : int
+        Number of symbols of every shard
+    """
+
+    def __init__(self, strategies: dict, workers: int =WORKERS, caches: list =(), size: int =SHARD_SIZE):
+        self.strategies = strategies
+        self.workers = max(1, workers or 1)
+        self.caches = list(caches)
+        self.size = size
+        self.executor = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self):
+        """Forks the processes, to be called before the caller starts any thread"""
+
+        if self.workers > 1 and self.executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('fork') if 'fork' in methods else None
+            # Forked processes share the tracker of the blocks, instead of each
+            # starting one that unlinks the blocks it saw when the process exits
+            resource_tracker.ensure_running()
+            self.executor = ProcessPoolExecutor(self.workers, context, initializer=start_worker,
+                                                initargs=(self.strategies, self.caches))
+            # A forking pool starts all its processes at its first task
+            list(self.executor.map(abs, range(self.workers)))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def submit(self, timeframe: str, data: pd.DataFrame) -> Shards:
+        """
+        Runs the strategies of the timeframe on the shards of the candles
+
+        Parameters
+        ----------
+        timeframe : str
+            The timeframe of the candles
+        data : pd.DataFrame
+            Candles of all symbols, the rows of a symbol following each other
+
+        Returns
+        -------
+        Shards
+            Breakouts of the shards, once they are done
+        """
+
+        bounds = shard_bounds(data['symbol'].to_numpy(), self.size)
+        if self.executor is None:
+            futures = []
+            for start, end in bounds:
+                futures.append(Future())
+                shard = data.iloc[start:end].reset_index(drop=True) if len(bounds) > 1 else data
+                futures[-1].set_result((run_strategies(self.strategies[timeframe], shard, timeframe), None))
+            return Shards(futures)
+
+        block, layout = share(data)
+        try:
+            futures = [self.executor.submit(run_shard, timeframe, block.name, layout, start, end)
+                       for start, end in bounds]
+        except Exception:
+            block.close()
+            block.unlink()
+            raise
+        return Shards(futures, block)
+
+    def evaluate(self, timeframe: str, data: pd.DataFrame) -> list:
+        """
+        Breakouts of the strategies of the timeframe on the candles
+
+        Parameters
+        ----------
+        timeframe : str
+            The timeframe of the candles
+        data : pd.DataFrame
+            Candles of all symbols
+
+        Returns
+        -------
+        list
+            Breakouts strategy by strategy, then shard by shard
+        """
+
+        return self.submit(timeframe, data).result()
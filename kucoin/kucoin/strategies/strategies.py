@@ -11,20 +11,97 @@ This file can be imported as a module and contains the following functions:
         indicator for the given dataframe and returns signals
     * sr_breakout : Calculates support and resistance levels in two different 
         ways and returns signals given out by both methods
+    * sr_signals : Symbols breaking out of their support and resistance
+        levels, found in two different ways
     * bollinger_breakout : Calculates the Bollinger breakout indicator for 
         the given dataframe and returns signals
+    * lookback : Declares the number of candles of every symbol a strategy
+        reads
     
 """
 
-import math
 import pandas as pd
 import sys
 import os
-import collections
 sys.path.append(os.path.abspath('../ta_lib'))
-from ta_lib import indicators, helpers
+from ta_lib import indicators, engine
+from ta_lib.cache import INDICATORS
+from strategies.tails import Tails
+from strategies.rules import Rule
+from exchange.helpers import WINDOW
+
+
+# Conditions of the strategies, close[0] is the last candle of a symbol,
+# close[-1] the one before it...
+ICHIMOKU = Rule("""
+    close[0] > senkou_a[0] > senkou_b[0] and tenkan[0] > kijun[0] and close[0] > close[-29]
+    and (tenkan[-1] <= kijun[-1] or close[-1] <= max(senkou_a[-1], senkou_b[-1]) or close[-30] >= close[-1])
+""")
+# The stoch RSI or the price drops below the bands three candles ago while
+# the slope of the opens to the last close is rising, after the stoch RSI
+# was above 5, the price inside the bands or the slope falling
+BB_RSI = Rule("""
+    (stoch_k[-3] <= oversold or stoch_d[-3] <= oversold) and bb_middle[-3] - dev * bb_std[-3] >= close[-3]
+    and (close[0] - open[-24]) / 25 < (close[0] - open[-4]) / 5 and (close[0] - open[-4]) / 5 > 0
+    and (stoch_k[-4] > oversold and stoch_d[-4] > oversold or bb_middle[-4] - dev * bb_std[-4] < close[-4]
+         or (close[-1] - open[-25]) / 25 >= (close[-1] - open[-5]) / 5 or (close[-1] - open[-5]) / 5 <= 0)
+""", dev=1.5, oversold=5)
+ROUNDING = Rule("""
+    close[0] >= close[-1] >= close[-2] >= close[-3] and low[-19] > low[0]
+    and (high[0] - low[-3]) / low[-3] * 100.0 < max_range and abs((low[0] - low[-3]) / low[-3]) * 100.0 < max_drop
+""", max_range=8.0, max_drop=7.0)
+# sma_open is the SMA of the opens, column 1 of the candles
+MA_INCH = Rule("low[0] >= low[-1] and close[0] > sma_open[0] and close[-1] > sma_open[0] and tenkan[0] > kijun[0]")
+#MA_INCH = Rule("close[0] >= close[-1] and close[0] > sma_open[0] and close[-1] > sma_open[0] and close[-2] > sma_open[0] and close[-3] > sma_open[0] and close[-9] <= close[-24] and tenkan[0] > kijun[0] and (close[0] - close[-9]) / close[-9] * 100.0 < 3")
+BOTTOM = Rule("low[0] >= low[-1] >= low[-2] and close[-3] <= close[-4] <= close[-5]")
+MA_PUMPERS = Rule("close[0] >= close[-1] > close[-2] and close[0] > sma_open[0] and tenkan[0] > kijun[0]")
+# Close and volume crossing over their SMA 25
+MA_VOL = Rule("close[0] > sma[0] and volume[0] > sma_volume[0] and (volume[-1] < sma_volume[-1] or close[-1] < sma[-1])")
+
+
+def lookback(bars: int):
+    """
+    Declares the number of candles of every symbol a strategy reads, the
+    runner downloads no more of them (planner.FetchPlan)
+
+    Parameters
+    ----------
+    bars : int
+        Number of candles, the candles the indicators need included
+
+    Returns
+    -------
+    callable
+        Decorator setting the bars attribute of the strategy
+    """
 
+    def declare(strategy):
+        strategy.bars = bars
+        return strategy
+    return declare
 
+
+def cached(df: pd.DataFrame, exchange: str):
+    """
+    Gives the indicators of a rule from the cache shared by the strategies
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Candles of all symbols
+    exchange : str
+        Name of the exchange
+
+    Returns
+    -------
+    callable
+        Function called with the name and parameters of an indicator
+    """
+
+    return lambda name, **params: INDICATORS.get(df, exchange, name, **params)
+
+
+@lookback(ICHIMOKU.bars)
 def ichimoku_breakout(df: pd.DataFrame, breakouts: list, timeframe: str, exchange: str) -> list:
     """
     Calculates the Ichimoku breakout indicator for the given dataframe and
@@ -47,44 +124,18 @@ def ichimoku_breakout(df: pd.DataFrame, breakouts: list, timeframe: str, exchang
         List with signals
     """
     
-    data = df.copy()    # copy dataframe to avoid changing original dataframe in the caller
-    data = pd.concat([data, pd.DataFrame(indicators.tenkan_sen(data), columns=['tenkan_sen'])], axis=1)
-    data = pd.concat([data, pd.DataFrame(indicators.kinjun_sen(data), columns=['kinjun_sen'])], axis=1)
-    data = pd.concat([data, pd.DataFrame(indicators.senkou_span_a(data.tenkan_sen, data.kinjun_sen), columns=['senkou_span_a'])], axis=1)
-    data = pd.concat([data, pd.DataFrame(indicators.senkou_span_b(data), columns=['senkou_span_b'])], axis=1)
-
-    for symbol in data.symbol.unique():
-        symbol_data = data.loc[data['symbol'] == symbol]
-        
-        if not symbol_data.empty:
-            close = symbol_data.iloc[-1].close
-            close_2 = symbol_data.iloc[-2].close
-            tenkan_sen = symbol_data.iloc[-1].tenkan_sen
-            kinjun_sen = symbol_data.iloc[-1].kinjun_sen
-            tenkan_sen_2 = symbol_data.iloc[-2].tenkan_sen
-            kinjun_sen_2 = symbol_data.iloc[-2].kinjun_sen
-            chikou_span = symbol_data.iloc[-30].close
-            chikou_span_2 = symbol_data.iloc[-31].close
-            senkou_span_a = symbol_data.iloc[-1].senkou_span_a
-            senkou_span_b = symbol_data.iloc[-1].senkou_span_b
-            senkou_span_a_2 = symbol_data.iloc[-2].senkou_span_a
-            senkou_span_b_2 = symbol_data.iloc[-2].senkou_span_b
-
-            if close > senkou_span_a > senkou_span_b and \
-                    tenkan_sen > kinjun_sen and \
-                    close > chikou_span:
-                        
-                if tenkan_sen_2 <= kinjun_sen_2:
-                    breakouts.append({'symbol': symbol, 'type': 'ICH', 'timeframe': timeframe, 'exc': exchange})
-                elif close_2 <= max(senkou_span_a_2, senkou_span_b_2):
-                    breakouts.append({'symbol': symbol, 'type': 'ICH', 'timeframe': timeframe, 'exc': exchange})
-                elif chikou_span_2 >= close_2:
-                    breakouts.append({'symbol': symbol, 'type': 'ICH', 'timeframe': timeframe, 'exc': exchange})
+    # Every condition is evaluated on all symbols at once
+    tails = ICHIMOKU.tails(df, INDICATORS.panel(df, exchange), cached(df, exchange))
+    breakout = ICHIMOKU.mask(tails)
+
+    for symbol in tails.symbols[breakout]:
+        breakouts.append({'symbol': symbol, 'type': 'ICH', 'timeframe': timeframe, 'exc': exchange})
                     
     return breakouts
 
 
-def bb_rsi_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
+@lookback(BB_RSI.bars)
+def bb_rsi_breakout(df: pd.DataFrame, breakouts: list, exchange: str, alert: bool =False) -> list:
     """
     Calculates the Bollinger Bands and RSI breakout indicator for the given
     dataframe and returns signals
@@ -95,6 +146,10 @@ def bb_rsi_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
         Dataframe with OHLCV data
     breakouts : list
         List with breakouts
+    exchange : str
+        Exchange the alerts are on
+    alert : bool
+        Returns the signals, they are only printed otherwise
     
     Returns
     -------
@@ -102,59 +157,21 @@ def bb_rsi_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
         List with signals
     """
 
-    data = df.copy()    # copy dataframe to avoid changing original dataframe in the caller
-    data = pd.concat([data, pd.DataFrame(indicators.bollinger_bands(data))], axis=1)
-    data = pd.concat([data, pd.DataFrame(indicators.stoch_rsi(data))], axis=1)
-
-    for symbol in data.symbol.unique():
-        symbol_data = data.loc[data['symbol'] == symbol]
-        
-        if not symbol_data.empty:
-            # The number after the '_' is the number of periods when there is
-            # more than two of the same data, when there is only two is the data
-            # and a _2 for the previous data
-            close = symbol_data.iloc[-1].close
-            close_2 = symbol_data.iloc[-2].close
-            close_4 = symbol_data.iloc[-4].close
-            close_5 = symbol_data.iloc[-5].close
-            open_5 = symbol_data.iloc[-5].open      # Open prices are used to calculate two straight lines
-            open_25 = symbol_data.iloc[-25].open    # from a far point and a near point, and check that in
-            open_6 = symbol_data.iloc[-6].open      # the near point the slope is greater than the far point
-            open_26 = symbol_data.iloc[-26].open    # thus signaling a rising tendency
-            stoch_rsi_K = symbol_data.iloc[-4].stoch_rsi_k
-            stoch_rsi_K_2 = symbol_data.iloc[-5].stoch_rsi_k
-            stoch_rsi_D = symbol_data.iloc[-4].stoch_rsi_d
-            stoch_rsi_D_2 = symbol_data.iloc[-5].stoch_rsi_d
-            dev = 1.5
-            bb_middle = symbol_data.iloc[-4].bb_middle
-            bb_middle_2 = symbol_data.iloc[-5].bb_middle
-            bb_std = symbol_data.iloc[-4].bb_std
-            bb_std_2 = symbol_data.iloc[-5].bb_std
-            
-            
-            if (stoch_rsi_K <= 5 or stoch_rsi_D <= 5) and \
-                bb_middle - dev * bb_std >= close_4 and \
-                (close - open_25) / 25 < (close - open_5) / 5 and \
-                (close - open_5) / 5 > 0:
-            
-                # 1st Type of Breakout: stoch_rsi previously above 5
-                if stoch_rsi_K_2 > 5 and stoch_rsi_D_2 > 5:
-                    print(symbol, 'BB_RSI')
-                    #breakouts.append({'symbol': symbol, 'type': 'BB_RSI', 'timeframe': '4h', 'exc': exchange})
-                # 2nd Type of Breakout: Price previously below the range for BB
-                elif bb_middle_2 - dev * bb_std_2 < close_5:
-                    print(symbol, 'BB_RSI')
-                    #breakouts.append({'symbol': symbol, 'type': 'BB_RSI', 'timeframe': '4h', 'exc': exchange})
-                # 3rd Type of Breakout: Slope changing on the last five periods
-                elif (close_2 - open_26) / 25 >= (close_2 - open_6) / 5 or \
-                    (close_2 - open_6) / 5 <= 0:
-                    print(symbol, 'BB_RSI')
-                    #breakouts.append({'symbol': symbol, 'type': 'BB_RSI', 'timeframe': '4h', 'exc': exchange})
+    # Every condition is evaluated on all symbols at once
+    tails = BB_RSI.tails(df, INDICATORS.panel(df, exchange), cached(df, exchange))
+    breakout = BB_RSI.mask(tails)
+
+    for symbol in tails.symbols[breakout]:
+        if alert:
+            breakouts.append({'symbol': symbol, 'type': 'BB_RSI', 'timeframe': '4h', 'exc': exchange})
+        else:
+            print(symbol, 'BB_RSI')
                 
     return breakouts
 
 
-def rounding_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
+@lookback(MA_VOL.bars)
+def ma_vol_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
     """
     Calculates the Moving Average and Volume breakout indicator for the given
     dataframe and returns signals
@@ -173,66 +190,19 @@ def rounding_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
     breakouts : list
         List with signals
     """
-    
-    data = df.copy()    # copy dataframe to avoid changing original dataframe in the caller
-    #data = pd.concat([data, pd.DataFrame(helpers.sma(data.close, 25), columns=['sma_25'])], axis=1)
-    #data = pd.concat([data, pd.DataFrame(helpers.sma(data.low, 25), columns=['low'])], axis=1)
-    #data['pandas_SMA_25'] = df.iloc[:,1].rolling(window=25).mean()
-    #data = pd.concat([data, pd.DataFrame(indicators.tenkan_sen(data), columns=['tenkan_sen'])], axis=1)
-    #data = pd.concat([data, pd.DataFrame(indicators.kinjun_sen(data), columns=['kinjun_sen'])], axis=1)
-    #print(data)
 
-    
-    for symbol in data.symbol.unique():
-        symbol_data = data.loc[data['symbol'] == symbol]
-        
-        if not symbol_data.empty:
-            (df.low).apply(lambda x: float(x))
-            (df.volume).apply(lambda x: float(x))
-            #(df.low).apply(lambda x: float(x))
-            close = symbol_data.iloc[-1].close
-            close_2 = symbol_data.iloc[-2].close
-            close_3 = symbol_data.iloc[-3].close
-            close_4 = symbol_data.iloc[-4].close
-            low = symbol_data.iloc[-1].low
-            low_2 = symbol_data.iloc[-2].low
-            low_3 = symbol_data.iloc[-3].low
-            low_4 = symbol_data.iloc[-4].low
-            low_5 = symbol_data.iloc[-5].low
-            low_10 = symbol_data.iloc[-10].low
-            low_20 = symbol_data.iloc[-20].low
-            vol = symbol_data.iloc[-1].volume
-            vol_2 = symbol_data.iloc[-2].volume
-            vol_3 = symbol_data.iloc[-3].volume
-            vol_4 = symbol_data.iloc[-4].volume
-            high = symbol_data.iloc[-1].high
-            
-            #(df.low).apply(lambda x: float(x))
-
-            if close >= close_2 and close_2 >= close_3 and close_3 >= close_4 and low_20 > low and ((high - low_4) / low_4) * 100.0 < 8.0:    
-                #print(symbol, low, low_2, low_3, low_4)
-                a = low
-            #try:
-                #print((abs(low - low_4) / low_4) * 100.0, symbol)
-                if abs((low - low_4) / low_4) * 100.0 < 7.0:
-                    #if abs(vol_2 - vol_3) / vol_2 * 100.0 > -30.0 and abs(vol_3 - vol_4) / vol_4 * 100.0 > -30.0:
-                    print(symbol, "rounding...", high, low_4, ((high - low_4) / low_4) * 100.0)
-                    #breakouts.append({'symbol': symbol, 'type': 'TEST:::Rounding price1 DAY::::TEST', 'timeframe': '1D', 'exc': exchange})
-            #except ZeroDivisionError:
-                #return float('inf')
-             #       print(symbol)
-            #print(symbol, close, sma)
-            #if low >= low_2: 
-            #    print(symbol)
-             #   print(symbol, smav, smav_2)
-             #   print(symbol, close_2, close_2)
-                #breakouts.append({'symbol': symbol, 'type': 'MA_25', 'timeframe': '1h', 'exc': exchange})
+    # Every condition is evaluated on all symbols at once
+    tails = MA_VOL.tails(df, INDICATORS.panel(df, exchange), cached(df, exchange))
+    breakout = MA_VOL.mask(tails)
+
+    for symbol in tails.symbols[breakout]:
+        breakouts.append({'symbol': symbol, 'type': 'MA_25', 'timeframe': '4h', 'exc': exchange})
     
     return breakouts
 
 
-
-def ma_inch(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
+@lookback(ROUNDING.bars)
+def rounding_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
     """
     Calculates the Moving Average and Volume breakout indicator for the given
     dataframe and returns signals
@@ -252,77 +222,25 @@ def ma_inch(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
         List with signals
     """
     
-    data = df.copy()    # copy dataframe to avoid changing original dataframe in the caller
-    data = pd.concat([data, pd.DataFrame(helpers.sma(data.close, 25), columns=['sma_25'])], axis=1)
-    #data = pd.concat([data, pd.DataFrame(helpers.sma(data.volume, 25), columns=['smav_25'])], axis=1)
-    data['pandas_SMA_25'] = df.iloc[:,1].rolling(window=25).mean()
-    data = pd.concat([data, pd.DataFrame(indicators.tenkan_sen(data), columns=['tenkan_sen'])], axis=1)
-    data = pd.concat([data, pd.DataFrame(indicators.kinjun_sen(data), columns=['kinjun_sen'])], axis=1)
-    
+    # Every condition is evaluated on all symbols at once, on the candles of the caller
+    tails = ROUNDING.tails(df, INDICATORS.panel(df, exchange), cached(df, exchange))
+    rounding = ROUNDING.mask(tails)
+    high = tails.last('high')
+    low_4 = tails.last('low', 4)
 
-    
-    for symbol in data.symbol.unique():
-        symbol_data = data.loc[data['symbol'] == symbol]
-     
-        
-        if not symbol_data.empty:
-            close = symbol_data.iloc[-1].close
-            close_2 = symbol_data.iloc[-2].close
-            close_3 = symbol_data.iloc[-3].close
-            close_4 = symbol_data.iloc[-4].close
-            close_5 = symbol_data.iloc[-5].close
-            close_6 = symbol_data.iloc[-6].close
-            close_7 = symbol_data.iloc[-7].close
-            close_8 = symbol_data.iloc[-8].close
-            close_9 = symbol_data.iloc[-9].close
-            close_10 = symbol_data.iloc[-10].close
-            close_11 = symbol_data.iloc[-11].close
-            close_12 = symbol_data.iloc[-12].close
-            close_13 = symbol_data.iloc[-13].close
-            close_14 = symbol_data.iloc[-14].close
-            close_15 = symbol_data.iloc[-15].close
-            close_16 = symbol_data.iloc[-16].close
-            close_17 = symbol_data.iloc[-17].close
-            close_18 = symbol_data.iloc[-18].close
-            close_25 = symbol_data.iloc[-25].close
-            sma = symbol_data.iloc[-1].pandas_SMA_25
-            sma_2 = symbol_data.iloc[-2].sma_25
-            smav = symbol_data.iloc[-1].volume
-            smav_2 = symbol_data.iloc[-2].volume
-            smav_3 = symbol_data.iloc[-3].volume
-            smav_4 = symbol_data.iloc[-5].volume
-            tenkan_sen = symbol_data.iloc[-1].tenkan_sen
-            kinjun_sen = symbol_data.iloc[-1].kinjun_sen
-            tenkan_sen_2 = symbol_data.iloc[-2].tenkan_sen
-            kinjun_sen_2 = symbol_data.iloc[-2].kinjun_sen
-            tenkan_sen_20 = symbol_data.iloc[-20].tenkan_sen
-            kinjun_sen_20 = symbol_data.iloc[-20].kinjun_sen
-            low = symbol_data.iloc[-1].low
-            low_2 = symbol_data.iloc[-2].low
-            low_3 = symbol_data.iloc[-3].low
-            low_4 = symbol_data.iloc[-4].low
-            low_5 = symbol_data.iloc[-5].low
-            low_35 = symbol_data.iloc[-35].low
-            low_60 = symbol_data.iloc[-60].low
-            high = symbol_data.iloc[-1].high
-
-            
-            #print(symbol, close, sma)
-            if low >= low_2 and close > sma and close_2 > sma and tenkan_sen > kinjun_sen:
-            #if close >= close_2 and close > sma and close_2 > sma and close_3 > sma and close_4 > sma and close_10 <= close_25 and tenkan_sen > kinjun_sen and ((close - close_10) / close_10) * 100.0 < 3:
-                #if ((close - close_2) / close_2) * 100.0 < 3 and ((close_2 - close_3) / close_3) * 100.0 < 3: #and ((close_3 - close_4) / close_4) * 100.0 < 3:
-                    # and close_3 < sma: # and tenkan_sen > kinjun_sen and smav > smav_3: 
-                    #if (low - low_4) / low_4) * 100.0 
-                    #print(symbol, close, close_2, close_3, sma) wasl  low + low_35
-                print(symbol, "ma inch", ((close - close_10) / close_10) * 100.0, ((close - close_10) / close_10))
-                    #breakouts.append({'symbol': symbol, 'type': 'MA_25/BASE/CONV', 'timeframe': '1h', 'exc': exchange})
+    for symbol, high_, low_4_ in zip(tails.symbols[rounding], high[rounding], low_4[rounding]):
+        print(symbol, "rounding...", high_, low_4_, ((high_ - low_4_) / low_4_) * 100.0)
+        #breakouts.append({'symbol': symbol, 'type': 'TEST:::Rounding price1 DAY::::TEST', 'timeframe': '1D', 'exc': exchange})
     
     return breakouts
 
-def sr_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
+
+
+@lookback(MA_INCH.bars)
+def ma_inch(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
     """
-    Calculates support and resistance levels in two different ways
-    and returns signals given out by both methods
+    Calculates the Moving Average and Volume breakout indicator for the given
+    dataframe and returns signals
     
     Parameters
     ----------
@@ -338,204 +256,147 @@ def sr_breakout(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
     breakouts : list
         List with signals
     """
-    #cond1 =''
-    #cond2 =''
-    data = df.copy()
+    
+    # Every condition is evaluated on all symbols at once.
+    # The indicators are shared with the other strategies run on the same candles
+    tails = MA_INCH.tails(df, INDICATORS.panel(df, exchange), cached(df, exchange))
+    inch = MA_INCH.mask(tails)
+    close = tails.last('close')
+    close_10 = tails.last('close', 10)
+
+    for symbol, close_, close_10_ in zip(tails.symbols[inch], close[inch], close_10[inch]):
+        print(symbol, "ma inch", ((close_ - close_10_) / close_10_) * 100.0, ((close_ - close_10_) / close_10_))
+        #breakouts.append({'symbol': symbol, 'type': 'MA_25/BASE/CONV', 'timeframe': '1h', 'exc': exchange})
+    
+    return breakouts
+
+def sr_signals(df: pd.DataFrame, panel: engine.Panel =None) -> list:
+    """
+    Symbols breaking out of their support and resistance levels, found in
+    two different ways
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe with OHLCV data
+    panel : engine.Panel
+        Panel of the candles, built if not given
 
-    cond1 =''
-    cond2 =''
+    Returns
+    -------
+    list
+        Symbols with a signal of either method
+    """
 
-    def has_breakout(levels, previous, last):
+    def has_breakout(levels, previous_open, last_open, last_low):
+        # Every symbol starts without a breakout, even when it has no levels
+        cond1 = False
+        cond2 = False
         for _, level in levels:
-            nonlocal cond1 
-            cond1 = previous.open < level
-            nonlocal cond2 
-            cond2 = last.open > level and last.low > level
+            cond1 = previous_open < level
+            cond2 = last_open > level and last_low > level
         return cond1 and cond2
 
-    
+    # The levels of all symbols are searched in one call on the panel of the candles
+    panel = panel if panel is not None else engine.Panel(df)
+    high = panel['high']
+    low = panel['low']
+    averages = pd.DataFrame(high - low).mean().to_numpy()
+    all_levels_01 = indicators.fractal_levels(high, low, averages)
+    all_levels_02 = indicators.window_levels(high, low, averages, panel.lengths)
+
+    tails = Tails(df, panel)
+    previous_open = tails.last('open', 2)
+    last_open = tails.last('open')
+    last_low = tails.last('low')
 
     method_01 = []
     method_02 = []
     
-    for symbol in data.symbol.unique():
-        symbol_data = data.loc[data['symbol'] == symbol]
-        
-        if not symbol_data.empty:
-            levels_01 = indicators.fractal_detection(symbol_data)
-            if (has_breakout(levels_01[-5:], symbol_data.iloc[-2], symbol_data.iloc[-1])):
-                method_01.append(symbol)
-                
-            levels_02 = indicators.window_detection(symbol_data)
-            if (has_breakout(levels_02[-5:], symbol_data.iloc[-2], symbol_data.iloc[-1])):
-                method_02.append(symbol)
+    for i, symbol in enumerate(tails.symbols):
+        levels_01 = all_levels_01[i]
+        if (has_breakout(levels_01[-5:], previous_open[i], last_open[i], last_low[i])):
+            method_01.append(symbol)
+            
+        levels_02 = all_levels_02[i]
+        if (has_breakout(levels_02[-5:], previous_open[i], last_open[i], last_low[i])):
+            method_02.append(symbol)
                 
-    signals = list(dict.fromkeys(method_01 + method_02))
+    return list(dict.fromkeys(method_01 + method_02))
+
+
+# The levels are searched over the whole window of candles
+@lookback(WINDOW)
+def sr_breakout(df: pd.DataFrame, breakouts: list, exchange: str, alert: bool =False) -> list:
+    """
+    Calculates support and resistance levels in two different ways
+    and returns signals given out by both methods
+    
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe with OHLCV data
+    breakouts : list
+        List with breakouts
+    exchange : str
+        Exchange the alerts are on
+    alert : bool
+        Returns the signals, they are only printed otherwise
+    
+    Returns
+    -------
+    breakouts : list
+        List with signals
+    """
+
+    signals = sr_signals(df, INDICATORS.panel(df, exchange))
     
     for symbol in signals:
-        print("breakouts", symbol)
-        #breakouts.append({'symbol': symbol, 'type': 'S&R', 'timeframe': '4h', 'exc': exchange})
+        if alert:
+            breakouts.append({'symbol': symbol, 'type': 'S&R', 'timeframe': '4h', 'exc': exchange})
+        else:
+            print("breakouts", symbol)
     
     return breakouts
 
 
 
 def double(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
-    
-    data = df.copy()    # copy dataframe to avoid changing original dataframe in the caller
-    data = pd.concat([data, pd.DataFrame(helpers.sma(data.close, 25), columns=['sma_25'])], axis=1)
-    #data = pd.concat([data, pd.DataFrame(helpers.sma(data.volume, 25), columns=['smav_25'])], axis=1)
-    data['pandas_SMA_25'] = df.iloc[:,1].rolling(window=25).mean()
-    data = pd.concat([data, pd.DataFrame(indicators.tenkan_sen(data), columns=['tenkan_sen'])], axis=1)
-    data = pd.concat([data, pd.DataFrame(indicators.kinjun_sen(data), columns=['kinjun_sen'])], axis=1)
-    
+    """
+    Double bottom strategy, its rule is not written yet: no signal is
+    returned and no indicator is calculated
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Dataframe with OHLCV data
+    breakouts : list
+        List with breakouts
+    exchange : str
+        Exchange the alerts are on
+
+    Returns
+    -------
+    breakouts : list
+        The list given, unchanged
+    """
 
-    
-    for symbol in data.symbol.unique():
-        symbol_data = data.loc[data['symbol'] == symbol]
-     
-        
-        if not symbol_data.empty:
-            close = symbol_data.iloc[-1].close
-            close_2 = symbol_data.iloc[-2].close
-            close_3 = symbol_data.iloc[-3].close
-            sma = symbol_data.iloc[-1].pandas_SMA_25
-            sma_2 = symbol_data.iloc[-2].sma_25
-            smav = symbol_data.iloc[-1].volume
-            smav_2 = symbol_data.iloc[-2].volume
-            smav_3 = symbol_data.iloc[-3].volume
-            smav_4 = symbol_data.iloc[-5].volume
-            tenkan_sen = symbol_data.iloc[-1].tenkan_sen
-            kinjun_sen = symbol_data.iloc[-1].kinjun_sen
-            tenkan_sen_2 = symbol_data.iloc[-2].tenkan_sen
-            kinjun_sen_2 = symbol_data.iloc[-2].kinjun_sen
-            tenkan_sen_20 = symbol_data.iloc[-20].tenkan_sen
-            kinjun_sen_20 = symbol_data.iloc[-20].kinjun_sen
-            low = symbol_data.iloc[-1].low
-            low_2 = symbol_data.iloc[-2].low
-            low_3 = symbol_data.iloc[-3].low
-            low_4 = symbol_data.iloc[-4].low
-            low_5 = symbol_data.iloc[-5].low
-            low_6 = symbol_data.iloc[-6].low
-            low_7 = symbol_data.iloc[-7].low
-            low_8  = symbol_data.iloc[-8].low
-            low_9 = symbol_data.iloc[-9].low
-            low_10 = symbol_data.iloc[-10].low
-            low_11 = symbol_data.iloc[-11].low
-            low_12 = symbol_data.iloc[-12].low
-            low_13 = symbol_data.iloc[-13].low
-            low_14 = symbol_data.iloc[-14].low
-            low_15 = symbol_data.iloc[-15].low
-            low_16 = symbol_data.iloc[-16].low
-            low_17 = symbol_data.iloc[-17].low
-            low_18 = symbol_data.iloc[-18].low
-            #high = symbol_data.iloc[-1].high
-
-            lows =[low, low_2, low_3, low_4, low_5, low_6, low_7, low_8,low_9, low_10,low_11, low_12, low_13, low_14, low_15, low_16, low_17, low_18]   
-            bottom_low = min(lows)
-            seen = set()
-            duplicated = [t for t in lows if t in seen or seen.add(t)]
-            bottom = min(seen)
-
-            #for elem in lows:
-            #    if lows.count(elem) > 1:
-            #        print(symbol, bottom_low)
-            #    return False
-
-            #if duplicated == bottom or duplicated == low_2:
-            #    print(symbol, duplicated, bottom_low)
-
-
-
-            #if low in seen:
-            #if low == bottom or low == bottom:
-            #if bottom_low == bottom:
-            #    if low == bottom_low or low == bottom: 
-            #print ("double bottoms", symbol, bottom, bottom_low,low, low_2, low_3, low_4, low_5, low_6, low_7, low_8,low_9, low_10,low_11, low_12, low_13, low_14, low_15, low_16, low_17, low_18)
-            
-            #print(symbol, close, sma)
-            #if low >= low_2 and close > sma and close_2 > sma and ((low - low_35) / low_35) * 100.0 < 2 and tenkan_sen > kinjun_sen:# and close_3 < sma: # and tenkan_sen > kinjun_sen and smav > smav_3: 
-                #if (low - low_4) / low_4) * 100.0 
-                #print(symbol, close, close_2, close_3, sma)
-            #    print(symbol, "ma inch", ((low - low_35) / low_35) * 100.0)
-                #breakouts.append({'symbol': symbol, 'type': 'MA_25/BASE/CONV', 'timeframe': '1h', 'exc': exchange})
-    
     return breakouts
 
+
+@lookback(BOTTOM.bars)
 def bottom(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
     
-    data = df.copy()    # copy dataframe to avoid changing original dataframe in the caller
-    data = pd.concat([data, pd.DataFrame(helpers.sma(data.close, 25), columns=['sma_25'])], axis=1)
-    #data = pd.concat([data, pd.DataFrame(helpers.sma(data.volume, 25), columns=['smav_25'])], axis=1)
-    
-    
-    for symbol in data.symbol.unique():
-        symbol_data = data.loc[data['symbol'] == symbol]
-     
-        
-        if not symbol_data.empty:
-            close = symbol_data.iloc[-1].close
-            close_2 = symbol_data.iloc[-2].close
-            close_3 = symbol_data.iloc[-3].close
-            close_4 = symbol_data.iloc[-4].close
-            close_5 = symbol_data.iloc[-5].close
-            close_6 = symbol_data.iloc[-6].close
-            close_7 = symbol_data.iloc[-7].close
-            close_8 = symbol_data.iloc[-8].close
-            close_9 = symbol_data.iloc[-9].close
-            low = symbol_data.iloc[-1].low
-            low_2 = symbol_data.iloc[-2].low
-            low_3 = symbol_data.iloc[-3].low
-            low_4 = symbol_data.iloc[-4].low
-            low_5 = symbol_data.iloc[-5].low
-            low_6 = symbol_data.iloc[-6].low
-            low_7 = symbol_data.iloc[-7].low
-            low_8  = symbol_data.iloc[-8].low
-            low_9 = symbol_data.iloc[-9].low
-            low_10 = symbol_data.iloc[-10].low
-            low_11 = symbol_data.iloc[-11].low
-            low_12 = symbol_data.iloc[-12].low
-            low_13 = symbol_data.iloc[-13].low
-            low_14 = symbol_data.iloc[-14].low
-            low_15 = symbol_data.iloc[-15].low
-            low_16 = symbol_data.iloc[-16].low
-            low_17 = symbol_data.iloc[-17].low
-            low_18 = symbol_data.iloc[-18].low
-            #high = symbol_data.iloc[-1].high
-
-            #lows =[low, low_2, low_3, low_4, low_5, low_6, low_7, low_8,low_9, low_10,low_11, low_12, low_13, low_14, low_15, low_16, low_17, low_18]   
-            #bottom_low = min(lows)
-            #seen = set()
-            #duplicated = [t for t in lows if t in seen or seen.add(t)]
-            #bottom = min(seen)
-            if low >= low_2 and low_2 >= low_3 and close_4 <= close_5 and close_5 <= close_6: #and low_4 <= low_5 and low_5 <= low_6:
-                print(symbol, " daily bottom")
-            #for elem in lows:
-            #    if lows.count(elem) > 1:
-            #        print(symbol, bottom_low)
-            #    return False
-
-            #if duplicated == bottom or duplicated == low_2:
-            #    print(symbol, duplicated, bottom_low)
-
-
-
-            #if low in seen:
-            #if low == bottom or low == bottom:
-            #if bottom_low == bottom:
-            #    if low == bottom_low or low == bottom: 
-            #print ("double bottoms", symbol, bottom, bottom_low,low, low_2, low_3, low_4, low_5, low_6, low_7, low_8,low_9, low_10,low_11, low_12, low_13, low_14, low_15, low_16, low_17, low_18)
-            
-            #print(symbol, close, sma)
-            #if low >= low_2 and close > sma and close_2 > sma and ((low - low_35) / low_35) * 100.0 < 2 and tenkan_sen > kinjun_sen:# and close_3 < sma: # and tenkan_sen > kinjun_sen and smav > smav_3: 
-                #if (low - low_4) / low_4) * 100.0 
-                #print(symbol, close, close_2, close_3, sma)
-            #    print(symbol, "ma inch", ((low - low_35) / low_35) * 100.0)
-                #breakouts.append({'symbol': symbol, 'type': 'MA_25/BASE/CONV', 'timeframe': '1h', 'exc': exchange})
+    # Every condition is evaluated on all symbols at once
+    tails = BOTTOM.tails(df, INDICATORS.panel(df, exchange), cached(df, exchange))
+    bottom = BOTTOM.mask(tails)
+    for symbol in tails.symbols[bottom]:
+        print(symbol, " daily bottom")
     
     return breakouts
 
 
+@lookback(MA_PUMPERS.bars)
 def ma_pumpers(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
     """
     Calculates the Moving Average and Volume breakout indicator for the given
@@ -556,69 +417,15 @@ def ma_pumpers(df: pd.DataFrame, breakouts: list, exchange: str) -> list:
         List with signals
     """
     
-    data = df.copy()    # copy dataframe to avoid changing original dataframe in the caller
-    data = pd.concat([data, pd.DataFrame(helpers.sma(data.close, 25), columns=['sma_25'])], axis=1)
-    #data = pd.concat([data, pd.DataFrame(helpers.sma(data.volume, 25), columns=['smav_25'])], axis=1)
-    data['pandas_SMA_25'] = df.iloc[:,1].rolling(window=25).mean()
-    data = pd.concat([data, pd.DataFrame(indicators.tenkan_sen(data), columns=['tenkan_sen'])], axis=1)
-    data = pd.concat([data, pd.DataFrame(indicators.kinjun_sen(data), columns=['kinjun_sen'])], axis=1)
-    
+    # Every condition is evaluated on all symbols at once.
+    # The indicators are shared with the other strategies run on the same candles
+    tails = MA_PUMPERS.tails(df, INDICATORS.panel(df, exchange), cached(df, exchange))
+    pumper = MA_PUMPERS.mask(tails)
+    close = tails.last('close')
+    close_10 = tails.last('close', 10)
 
-    
-    for symbol in data.symbol.unique():
-        symbol_data = data.loc[data['symbol'] == symbol]
-     
-        
-        if not symbol_data.empty:
-            close = symbol_data.iloc[-1].close
-            close_2 = symbol_data.iloc[-2].close
-            close_3 = symbol_data.iloc[-3].close
-            close_4 = symbol_data.iloc[-4].close
-            close_5 = symbol_data.iloc[-5].close
-            close_6 = symbol_data.iloc[-6].close
-            close_7 = symbol_data.iloc[-7].close
-            close_8 = symbol_data.iloc[-8].close
-            close_9 = symbol_data.iloc[-9].close
-            close_10 = symbol_data.iloc[-10].close
-            close_11 = symbol_data.iloc[-11].close
-            close_12 = symbol_data.iloc[-12].close
-            close_13 = symbol_data.iloc[-13].close
-            close_14 = symbol_data.iloc[-14].close
-            close_15 = symbol_data.iloc[-15].close
-            close_16 = symbol_data.iloc[-16].close
-            close_17 = symbol_data.iloc[-17].close
-            close_18 = symbol_data.iloc[-18].close
-            close_25 = symbol_data.iloc[-25].close
-            sma = symbol_data.iloc[-1].pandas_SMA_25
-            sma_2 = symbol_data.iloc[-2].sma_25
-            smav = symbol_data.iloc[-1].volume
-            smav_2 = symbol_data.iloc[-2].volume
-            smav_3 = symbol_data.iloc[-3].volume
-            smav_4 = symbol_data.iloc[-5].volume
-            tenkan_sen = symbol_data.iloc[-1].tenkan_sen
-            kinjun_sen = symbol_data.iloc[-1].kinjun_sen
-            tenkan_sen_2 = symbol_data.iloc[-2].tenkan_sen
-            kinjun_sen_2 = symbol_data.iloc[-2].kinjun_sen
-            tenkan_sen_20 = symbol_data.iloc[-20].tenkan_sen
-            kinjun_sen_20 = symbol_data.iloc[-20].kinjun_sen
-            low = symbol_data.iloc[-1].low
-            low_2 = symbol_data.iloc[-2].low
-            low_3 = symbol_data.iloc[-3].low
-            low_4 = symbol_data.iloc[-4].low
-            low_5 = symbol_data.iloc[-5].low
-            low_35 = symbol_data.iloc[-35].low
-            low_60 = symbol_data.iloc[-60].low
-            high = symbol_data.iloc[-1].high
-
-            
-            #print(symbol, close, sma)
-            if close >= close_2 and close_2 > close_3 and close > sma and tenkan_sen > kinjun_sen:
-            #if close >= close_2 and close > sma and close_2 > sma and close_3 > sma and close_4 > sma and close_10 <= close_25 and tenkan_sen > kinjun_sen and ((close - close_10) / close_10) * 100.0 < 3:
-                #if ((close - close_2) / close_2) * 100.0 < 3 and ((close_2 - close_3) / close_3) * 100.0 < 3: #and ((close_3 - close_4) / close_4) * 100.0 < 3:
-                    # and close_3 < sma: # and tenkan_sen > kinjun_sen and smav > smav_3: 
-                    #if (low - low_4) / low_4) * 100.0 
-                    #print(symbol, close, close_2, close_3, sma) wasl  low + low_35
-                print(symbol, "pumper", ((close - close_10) / close_10) * 100.0, ((close - close_10) / close_10))
-                    #breakouts.append({'symbol': symbol, 'type': 'MA_25/BASE/CONV', 'timeframe': '1h', 'exc': exchange})
+    for symbol, close_, close_10_ in zip(tails.symbols[pumper], close[pumper], close_10[pumper]):
+        print(symbol, "pumper", ((close_ - close_10_) / close_10_) * 100.0, ((close_ - close_10_) / close_10_))
+        #breakouts.append({'symbol': symbol, 'type': 'MA_25/BASE/CONV', 'timeframe': '1h', 'exc': exchange})
     
     return breakouts
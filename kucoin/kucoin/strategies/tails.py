@@ -0,0 +1,175 @@
+"""Access to the last candles of every symbol at once
+
+The strategies only look at the last candles of every symbol. This script
+lays them out, once per dataframe, as one symbols x depth array per column,
+so that the conditions of a strategy are evaluated as NumPy masks over all
+symbols instead of looking every value up symbol by symbol.
+
+A backtest looks at every candle instead of the last ones: History lays
+the candles out as one candles x symbols panel per column, so that the
+same conditions are evaluated on every candle of every symbol at once.
+
+This file can be imported as a module and contains the following classes:
+
+    * Tails - Last candles of every symbol, one array per column
+    * History - Every candle of every symbol, one array per column
+
+"""
+
+import numpy as np
+import pandas as pd
+from ta_lib import engine
+
+
+DEPTH: int = 60     # Deepest candle looked at by the strategies
+
+
+class Tails:
+    """
+    Last candles of every symbol, one symbols x depth array per column
+
+    Column j of an array holds the candle depth - j from the end, so the
+    last column is the last candle (iloc[-1] of the symbol), the one before
+    it is iloc[-2] and so on. Symbols with fewer candles than the depth are
+    padded with NaN at the start, so a condition on a missing candle is False.
+
+    Attributes
+    ----------
+    data : pd.DataFrame
+        Candles of all symbols, with the indicator columns
+    symbols : np.ndarray
+        Symbols in order of appearance, one per row of the arrays
+    depth : int
+        Number of candles kept of every symbol
+    """
+
+    def __init__(self, data: pd.DataFrame, panel: engine.Panel =None, depth: int =DEPTH):
+        panel = panel if panel is not None else engine.Panel(data)
+        self.data = data
+        self.symbols = panel.symbols
+        self.depth = depth
+
+        # Position from the end of every candle, 1 for the last one
+        back = panel.lengths[panel.codes] - panel.rows
+        keep = np.flatnonzero(back <= depth)
+        self.positions = np.full((len(self.symbols), depth), -1)
+        self.positions[panel.codes[keep], depth - back[keep]] = keep
+        self.columns = {}
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """
+        Last candles of a column, built once and kept
+
+        Parameters
+        ----------
+        column : str
+            Name of the column
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (symbols, depth)
+        """
+
+        if column not in self.columns:
+            values = self.data[column].to_numpy(dtype='float64')[self.positions]
+            values[self.positions < 0] = np.nan
+            self.columns[column] = values
+        return self.columns[column]
+
+    def last(self, column: str, k: int =1) -> np.ndarray:
+        """
+        Value of the k-th candle from the end of every symbol, like
+        symbol_data.iloc[-k][column]
+
+        Parameters
+        ----------
+        column : str
+            Name of the column
+        k : int
+            Position of the candle from the end, 1 for the last candle
+
+        Returns
+        -------
+        np.ndarray
+            One value per symbol
+        """
+
+        return self[column][:, -k]
+
+
+class History:
+    """
+    Every candle of every symbol, one candles x symbols array per column
+
+    Read like Tails, except that History.last gives the value of the k-th
+    candle from the end for every candle of every symbol, as if every
+    candle was the last one: row i of last(column, k) holds the value of
+    the candle k - 1 candles before candle i, NaN before the first candle.
+
+    Attributes
+    ----------
+    data : pd.DataFrame
+        Candles of all symbols, with the indicator columns
+    panel : engine.Panel
+        Panel of the candles
+    depth : int
+        Deepest candle looked at from every candle
+    """
+
+    def __init__(self, data: pd.DataFrame, panel: engine.Panel =None, depth: int =DEPTH):
+        self.data = data
+        self.panel = panel if panel is not None else engine.Panel(data)
+        self.symbols = self.panel.symbols
+        self.depth = depth
+        self.columns = {}
+
+    @property
+    def shape(self) -> tuple:
+        return self.panel.lengths.max(initial=0), len(self.symbols)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """
+        Panel of a column with depth - 1 rows of NaN before the first
+        candle, built once and kept
+
+        Parameters
+        ----------
+        column : str
+            Name of the column
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (depth - 1 + candles, symbols)
+        """
+
+        if column not in self.columns:
+            candles, symbols = self.shape
+            values = np.full((self.depth - 1 + candles, symbols), np.nan)
+            values[self.depth - 1 + self.panel.rows, self.panel.codes] = self.data[column].to_numpy(dtype='float64')
+            self.columns[column] = values
+        return self.columns[column]
+
+    def last(self, column: str, k: int =1) -> np.ndarray:
+        """
+        Value of the k-th candle from the end at every candle of every
+        symbol, as a view of the panel
+
+        Parameters
+        ----------
+        column : str
+            Name of the column
+        k : int
+            Position of the candle from the end, 1 for the candle itself
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (candles, symbols)
+        """
+
+        if not 1 <= k <= self.depth:
+            raise ValueError("Candle {} from the end is deeper than the history depth {}".format(k, self.depth))
+        start = self.depth - k
+        return self[column][start:start + self.shape[0]]
@@ -0,0 +1,165 @@
+"""Cache of the indicators calculated during a run
+
+Several strategies run on the same candles and need the same indicators
+(the 1 hour strategies all use the SMA 25, Tenkan-sen and Kinjun-sen). This
+script calculates every indicator once with ta_lib.engine and hands the
+result to every strategy asking for it during the run.
+
+This file can be imported as a module and contains the following:
+
+    * IndicatorCache - Memoizing cache of indicator results
+    * data_version - Fingerprint of the candles an indicator is calculated on
+    * INDICATORS - Cache shared by all strategies
+
+"""
+
+import hashlib
+import weakref
+import threading
+import pandas as pd
+from ta_lib import engine
+
+
+VERSION_COLUMNS: list = ['symbol', 'time', 'open', 'high', 'low', 'close', 'volume']
+
+
+def data_version(data: pd.DataFrame) -> tuple:
+    """
+    Fingerprint of the candles, changes whenever a candle is added,
+    removed, reordered or has any of its prices or volume updated
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Candles of all symbols
+
+    Returns
+    -------
+    tuple
+        Number of candles and digest of the hashes of their rows, in the
+        order of the rows
+    """
+
+    columns = [column for column in VERSION_COLUMNS if column in data.columns]
+    rows = pd.util.hash_pandas_object(data[columns], index=False).to_numpy()
+    return (len(data), hashlib.blake2b(rows.tobytes(), digest_size=16).hexdigest())
+
+
+class IndicatorCache:
+    """
+    Memoizing cache of indicator results
+
+    Results are keyed by exchange, timeframe, indicator name, parameters
+    and version of the candles, so a strategy asking for an indicator that
+    was already calculated on the same candles gets the stored result. The
+    panels are keyed by exchange, timeframe and version of the candles. The
+    version of a dataframe is calculated once, while the strategies of a
+    chunk are given the same dataframe.
+
+    Every method can be called from any thread, the daemons of several
+    exchanges tick at the same time on the same cache.
+
+    Attributes
+    ----------
+    hits : int
+        Number of indicators served from the cache
+    misses : int
+        Number of indicators calculated
+    """
+
+    def __init__(self):
+        # Reentrant, get builds the panel under the lock
+        self.lock = threading.RLock()
+        self.results = {}
+        self.panels = {}
+        # id of a dataframe to a weak reference to it and its version
+        self.versions = {}
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, data: pd.DataFrame) -> tuple:
+        """Version of the candles, calculated once for every dataframe"""
+
+        held = self.versions.get(id(data))
+        # The id of a dataframe garbage collected is given to another one
+        if held is None or held[0]() is not data:
+            held = (weakref.ref(data), data_version(data))
+            self.versions[id(data)] = held
+        return held[1]
+
+    def key(self, data: pd.DataFrame, exchange: str) -> tuple:
+        """Exchange, timeframe and version of the candles"""
+
+        timeframe = data.timeframe.iloc[0] if 'timeframe' in data.columns and not data.empty else None
+        return (exchange, timeframe, self.version(data))
+
+    def panel(self, data: pd.DataFrame, exchange: str =None) -> engine.Panel:
+        """
+        Panel of the candles, built once for every version of the candles
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles of all symbols
+        exchange : str
+            Name of the exchange of the candles
+
+        Returns
+        -------
+        engine.Panel
+            Panel of the candles
+        """
+
+        with self.lock:
+            key = self.key(data, exchange)
+            if key not in self.panels:
+                self.panels[key] = engine.Panel(data)
+            return self.panels[key]
+
+    def get(self, data: pd.DataFrame, exchange: str, name: str, **params):
+        """
+        Result of an indicator of ta_lib.engine on the candles
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles of all symbols
+        exchange : str
+            Name of the exchange of the candles
+        name : str
+            Name of the indicator function in ta_lib.engine
+        **params
+            Parameters of the indicator function
+
+        Returns
+        -------
+        pd.Series or dict of pd.Series
+            What the indicator function returns, with the index of data
+        """
+
+        with self.lock:
+            frame = self.key(data, exchange)
+            key = frame[:2] + (name, tuple(sorted(params.items()))) + frame[2:]
+
+            if key in self.results:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.results[key] = getattr(engine, name)(self.panel(data, exchange), **params)
+            return self.results[key]
+
+    def clear(self):
+        """Evicts every result and resets the counters, called between runs"""
+
+        with self.lock:
+            self.results.clear()
+            self.panels.clear()
+            self.versions.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __str__(self) -> str:
+        return "Indicator cache: {} hits, {} misses, {} results".format(self.hits, self.misses, len(self.results))
+
+
+INDICATORS = IndicatorCache()
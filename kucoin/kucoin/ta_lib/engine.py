@@ -0,0 +1,473 @@
+"""Grouped computation of technical indicators over many symbols
+
+The candles of all symbols are downloaded in one long dataframe, where a
+rolling window over a column runs across the boundary between two symbols.
+This script calculates every indicator per symbol in a single vectorized
+pass: rolling max/min and shifts run over the whole long column and the
+values that would mix two symbols are blanked, the other indicators run on
+a time x symbols panel (one column per symbol, left aligned and padded with
+NaN) that is mapped back onto the rows of the long dataframe. When the
+candles of the symbols are interleaved in the long dataframe, rolling
+max/min and shifts run on the panel too.
+
+This file can be imported as a module and contains the following:
+
+    * Panel - Time x symbols view of a multi-symbol dataframe
+    * sma - Simple Moving Average
+    * tenkan_sen - Conversion line of the ichimoku strategy
+    * kinjun_sen - Base line of the ichimoku strategy
+    * senkou_span_a - Leading span A of the ichimoku strategy
+    * senkou_span_b - Leading span B of the ichimoku strategy
+    * chikou_span - Lagging span of the ichimoku strategy
+    * bollinger_bands - Bollinger Bands middle band and standard deviation
+    * stoch_rsi - Stochastic RSI (Relative Strength Index)
+
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Panel:
+    """
+    Time x symbols view of a multi-symbol dataframe
+
+    Row i of the panel holds the i-th candle of every symbol, symbols with
+    fewer candles are padded with NaN at the end.
+
+    Attributes
+    ----------
+    data : pd.DataFrame
+        The long dataframe, candles of every symbol in chronological order
+    symbols : np.ndarray
+        Symbols in order of appearance, one per column of the panel
+    lengths : np.ndarray
+        Number of candles of every symbol
+    codes : np.ndarray
+        Column of the panel of every row of the long dataframe
+    rows : np.ndarray
+        Row of the panel (position inside its symbol) of every row of the
+        long dataframe
+    contiguous : bool
+        Whether the candles of every symbol are contiguous in the long
+        dataframe
+    """
+
+    def __init__(self, data: pd.DataFrame):
+        symbol = data['symbol'].to_numpy()
+        starts = np.flatnonzero(np.r_[True, symbol[1:] != symbol[:-1]]) if len(symbol) else np.array([], dtype=int)
+
+        self.contiguous = len(set(symbol[starts])) == len(starts)
+        if self.contiguous:
+            # The candles of every symbol are contiguous, as downloaded
+            self.symbols = symbol[starts]
+            self.lengths = np.diff(np.r_[starts, len(symbol)])
+            self.codes = np.repeat(np.arange(len(starts)), self.lengths)
+            self.rows = np.arange(len(symbol)) - np.repeat(starts, self.lengths)
+        else:
+            codes, symbols = pd.factorize(data['symbol'], sort=False)
+            self.symbols = np.asarray(symbols)
+            self.codes = codes
+            self.rows = pd.Series(codes).groupby(codes, sort=False).cumcount().to_numpy()
+            self.lengths = np.bincount(codes, minlength=len(self.symbols))
+
+        self.data = data
+        self.columns = {}
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        """
+        Panel of a column of the dataframe, built once and kept
+
+        Parameters
+        ----------
+        column : str
+            Name of the column
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (candles, symbols)
+        """
+
+        if column not in self.columns:
+            self.columns[column] = self.to_panel(self.data[column].to_numpy(dtype='float64'))
+        return self.columns[column]
+
+    def to_panel(self, values: np.ndarray) -> np.ndarray:
+        """
+        Maps the values of the rows of the long dataframe onto a panel
+
+        Parameters
+        ----------
+        values : np.ndarray
+            One value per row of the long dataframe
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (candles, symbols), padded with NaN
+        """
+
+        panel = np.full((self.lengths.max(initial=0), len(self.symbols)), np.nan)
+        panel[self.rows, self.codes] = values
+        return panel
+
+    def to_long(self, values: np.ndarray) -> np.ndarray:
+        """
+        Maps a panel back onto the rows of the long dataframe
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Array of shape (candles, symbols)
+
+        Returns
+        -------
+        np.ndarray
+            One value per row of the long dataframe
+        """
+
+        return values[self.rows, self.codes]
+
+    def to_series(self, values: np.ndarray) -> pd.Series:
+        """
+        Wraps the values of the rows of the long dataframe into a series
+
+        Parameters
+        ----------
+        values : np.ndarray
+            One value per row of the long dataframe
+
+        Returns
+        -------
+        pd.Series
+            Series with the index of the long dataframe
+        """
+
+        return pd.Series(values, index=self.data.index)
+
+
+def rolling(values: np.ndarray, period: int, how: str) -> np.ndarray:
+    """
+    Rolling aggregation of every column of a panel
+
+    Parameters
+    ----------
+    values : np.ndarray
+        Array of shape (candles, symbols)
+    period : int
+        Number of periods of the window
+    how : str
+        Name of the aggregation (mean, max, min, std)
+
+    Returns
+    -------
+    np.ndarray
+        Aggregated panel, NaN until the window is full
+    """
+
+    return getattr(pd.DataFrame(values).rolling(window=period), how)().to_numpy()
+
+
+def rolling_extreme(panel: Panel, column: str, period: int, how: str) -> np.ndarray:
+    """
+    Rolling max or min of a column, per symbol
+
+    The maximum and minimum of a window do not depend on the order in which
+    values enter it, so they are calculated over the whole long column at
+    once and the windows that start in the previous symbol are blanked.
+    When the candles of the symbols are interleaved, the windows run on the
+    panel instead.
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    column : str
+        Name of the column
+    period : int
+        Number of periods of the window
+    how : str
+        max or min
+
+    Returns
+    -------
+    np.ndarray
+        One value per row of the long dataframe
+    """
+
+    if not panel.contiguous:
+        return panel.to_long(rolling(panel[column], period, how))
+    values = pd.Series(panel.data[column].to_numpy(dtype='float64')).rolling(window=period)
+    values = getattr(values, how)().to_numpy(copy=True)
+    values[panel.rows < period - 1] = np.nan
+    return values
+
+
+def shift_rows(values: np.ndarray, periods: int) -> np.ndarray:
+    """Shifts an array along its first axis, filling with NaN"""
+
+    shifted = np.full_like(values, np.nan)
+    if periods > 0:
+        shifted[periods:] = values[:-periods]
+    elif periods < 0:
+        shifted[:periods] = values[-periods:]
+    else:
+        shifted[:] = values
+    return shifted
+
+
+def shift(panel: Panel, values: np.ndarray, periods: int) -> np.ndarray:
+    """
+    Shifts the values of every symbol, filling with NaN
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    values : np.ndarray
+        One value per row of the long dataframe
+    periods : int
+        Number of periods to shift forward (backward if negative)
+
+    Returns
+    -------
+    np.ndarray
+        Shifted values
+    """
+
+    if not panel.contiguous:
+        # The previous candle of a symbol is not the previous row, the panel is shifted
+        return panel.to_long(shift_rows(panel.to_panel(values), periods))
+    shifted = shift_rows(values, periods)
+    if periods > 0:
+        shifted[panel.rows < periods] = np.nan
+    elif periods < 0:
+        shifted[panel.rows >= panel.lengths[panel.codes] + periods] = np.nan
+    return shifted
+
+
+def midpoint(panel: Panel, period: int) -> np.ndarray:
+    """
+    Middle of the highest high and lowest low of the period
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    period : int
+        Number of periods of the window
+
+    Returns
+    -------
+    np.ndarray
+        One value per row of the long dataframe
+    """
+
+    return (rolling_extreme(panel, 'high', period, 'max') + rolling_extreme(panel, 'low', period, 'min')) / 2
+
+
+def sma(panel: Panel, column: str, period: int) -> pd.Series:
+    """
+    Simple Moving Average
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    column : str
+        Column to calculate the SMA on
+    period : int
+        Number of periods to calculate the SMA on
+
+    Returns
+    -------
+    pd.Series
+        SMA of the column on a given period
+    """
+
+    return panel.to_series(panel.to_long(rolling(panel[column], period, 'mean')))
+
+
+def tenkan_sen(panel: Panel, period: int =20) -> pd.Series:
+    """
+    Tenkan-sen (Conversion Line)
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    period : int
+        Number of periods to calculate the Tenkan-sen on
+
+    Returns
+    -------
+    pd.Series
+        Tenkan-sen of the data on a given period
+    """
+
+    return panel.to_series(midpoint(panel, period))
+
+
+def kinjun_sen(panel: Panel, period: int =60) -> pd.Series:
+    """
+    Kinjun-sen (Base Line)
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    period : int
+        Number of periods to calculate the Kinjun-sen on
+
+    Returns
+    -------
+    pd.Series
+        Kinjun-sen of the data on a given period
+    """
+
+    return panel.to_series(midpoint(panel, period))
+
+
+def senkou_span_a(panel: Panel, tenkan_period: int =20, kinjun_period: int =60, period: int =30) -> pd.Series:
+    """
+    Senkou Span A (Leading Span A)
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    tenkan_period : int
+        Number of periods of the Tenkan-sen
+    kinjun_period : int
+        Number of periods of the Kinjun-sen
+    period : int
+        Number of periods the span is shifted forward
+
+    Returns
+    -------
+    pd.Series
+        Senkou Span A of the data on a given period
+    """
+
+    span = (midpoint(panel, tenkan_period) + midpoint(panel, kinjun_period)) / 2
+    return panel.to_series(shift(panel, span, period))
+
+
+def senkou_span_b(panel: Panel, period: int =120, shift_period: int =30) -> pd.Series:
+    """
+    Senkou Span B (Leading Span B)
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    period : int
+        Number of periods to calculate the Senkou Span B on
+    shift_period : int
+        Number of periods the span is shifted forward
+
+    Returns
+    -------
+    pd.Series
+        Senkou Span B of the data on a given period
+    """
+
+    return panel.to_series(shift(panel, midpoint(panel, period), shift_period))
+
+
+def chikou_span(panel: Panel, period: int =30) -> pd.Series:
+    """
+    Chikou Span (Lagging Span)
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    period : int
+        Number of periods the close is shifted backward
+
+    Returns
+    -------
+    pd.Series
+        Chikou Span of the data on a given period
+    """
+
+    return panel.to_series(shift(panel, panel.data['close'].to_numpy(dtype='float64'), -period))
+
+
+def bollinger_bands(panel: Panel, period: int =20) -> dict:
+    """
+    Bollinger Bands
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    period : int
+        Number of periods to calculate the Bollinger Bands on
+
+    Returns
+    -------
+    dict of pd.Series
+        Middle band (bb_middle) and standard deviation (bb_std) of the close
+    """
+
+    return {'bb_middle': panel.to_series(panel.to_long(rolling(panel['close'], period, 'mean'))),
+            'bb_std': panel.to_series(panel.to_long(rolling(panel['close'], period, 'std')))}
+
+
+def stoch_rsi(panel: Panel, period: int =14, k_period: int =3, d_period: int =3) -> dict:
+    """
+    Stochastic RSI, calculated like indicators.stoch_rsi on every symbol
+
+    Parameters
+    ----------
+    panel : Panel
+        Panel of the candles
+    period : int
+        Number of periods to calculate the Stochastic RSI on
+    k_period : int
+        Number of periods to calculate the Stochastic RSI K on
+    d_period : int
+        Number of periods to calculate the Stochastic RSI D on
+
+    Returns
+    -------
+    dict of pd.Series
+        Stochastic RSI (stoch_rsi), its K (stoch_rsi_k) and D (stoch_rsi_d)
+    """
+
+    close = panel['close']
+    if close.shape[0] <= period:
+        empty = panel.to_series(np.full(len(panel.rows), np.nan))
+        return {'stoch_rsi': empty, 'stoch_rsi_k': empty.copy(), 'stoch_rsi_d': empty.copy()}
+
+    delta = np.full_like(close, np.nan)
+    delta[1:] = close[1:] - close[:-1]
+    ups = np.where(delta > 0, delta, 0.0)
+    downs = np.where(delta < 0, -delta, 0.0)
+    ups[np.isnan(delta)] = np.nan
+    downs[np.isnan(delta)] = np.nan
+
+    # The first average is the mean of the first `period` moves (rows 1 to
+    # period), the smoothing starts from it on row `period`
+    ups[period] = np.mean(ups[1:period + 1], axis=0)
+    downs[period] = np.mean(downs[1:period + 1], axis=0)
+    ups[:period] = np.nan
+    downs[:period] = np.nan
+
+    ewm = dict(com=period - 1, min_periods=0, adjust=False, ignore_na=False)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = pd.DataFrame(ups).ewm(**ewm).mean().to_numpy() / pd.DataFrame(downs).ewm(**ewm).mean().to_numpy()
+        rsi = 100 - 100 / (1 + rs)
+        rsi[:period] = np.nan
+
+        lowest = rolling(rsi, period, 'min')
+        stoch = (rsi - lowest) / (rolling(rsi, period, 'max') - lowest)
+    stoch_k = rolling(stoch, k_period, 'mean') * 100
+    stoch_d = rolling(stoch_k, d_period, 'mean') * 100
+
+    return {'stoch_rsi': panel.to_series(panel.to_long(stoch)),
+            'stoch_rsi_k': panel.to_series(panel.to_long(stoch_k)),
+            'stoch_rsi_d': panel.to_series(panel.to_long(stoch_d))}
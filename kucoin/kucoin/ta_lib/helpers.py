@@ -9,9 +9,13 @@ This file can be imported as a module and contains the following functions:
     * is_support - Support Detection
     * is_resistance - Resistance Detection
     * is_far_from_level - Decide if a support or resistance is far from the price
+    * supports - Support Detection on every candle at once
+    * resistances - Resistance Detection on every candle at once
+    * run_lengths - Length of the runs of equal consecutive values
     
 """
 
+import numpy as np
 import pandas as pd
 
 
@@ -85,7 +89,8 @@ def is_resistance(data: pd.Series, i: int) -> bool:
     return (cond1 and cond2 and cond3 and cond4)
 
 
-def is_far_from_level(value: float, levels: list, data_high: pd.Series, data_low: pd.Series) -> bool:
+def is_far_from_level(value: float, levels: list, data_high: pd.Series =None, data_low: pd.Series =None,
+                      average: float =None) -> bool:
     """
     Decide if a support or resistance is far from the price
 
@@ -99,6 +104,9 @@ def is_far_from_level(value: float, levels: list, data_high: pd.Series, data_low
         High column of the data
     data_low : pd.Series
         Low column of the data
+    average : float
+        Average range of the candles, (data_high - data_low).mean(), to
+        avoid calculating it again for every value
 
     Returns
     -------
@@ -106,6 +114,90 @@ def is_far_from_level(value: float, levels: list, data_high: pd.Series, data_low
         True if the support or resistance is far from the levels
     """
     
-    average = (data_high - data_low).mean()
+    if average is None:
+        average = (data_high - data_low).mean()
     
     return len([abs(value - l) < average for l in levels]) == 0
+
+
+def supports(data: np.ndarray) -> np.ndarray:
+    """
+    Support Detection on every candle at once, is_support of every index
+    
+    Parameters
+    ----------
+    data : np.ndarray
+        Low column of the data, or a time x symbols panel of it
+        
+    Returns
+    -------
+    np.ndarray
+        If the price of every candle is a support level, False on the first
+        and last two candles
+    """
+    
+    data = np.asarray(data, dtype='float64')
+    support = np.zeros(data.shape, dtype=bool)
+    if data.shape[0] >= 5:
+        cond1 = data[2:-2] < data[1:-3]
+        cond2 = data[2:-2] < data[3:-1]
+        cond3 = data[3:-1] < data[4:]
+        cond4 = data[1:-3] < data[:-4]
+        support[2:-2] = cond1 & cond2 & cond3 & cond4
+    
+    return support
+
+
+def resistances(data: np.ndarray) -> np.ndarray:
+    """
+    Resistance Detection on every candle at once, is_resistance of every index
+    
+    Parameters
+    ----------
+    data : np.ndarray
+        High column of the data, or a time x symbols panel of it
+        
+    Returns
+    -------
+    np.ndarray
+        If the price of every candle is a resistance level, False on the
+        first and last two candles
+    """
+    
+    data = np.asarray(data, dtype='float64')
+    resistance = np.zeros(data.shape, dtype=bool)
+    if data.shape[0] >= 5:
+        cond1 = data[2:-2] > data[1:-3]
+        cond2 = data[2:-2] > data[3:-1]
+        cond3 = data[3:-1] > data[4:]
+        cond4 = data[1:-3] > data[:-4]
+        resistance[2:-2] = cond1 & cond2 & cond3 & cond4
+    
+    return resistance
+
+
+def run_lengths(data: np.ndarray) -> np.ndarray:
+    """
+    Length of the run of equal consecutive values every value belongs to,
+    counted up to it
+    
+    Parameters
+    ----------
+    data : np.ndarray
+        Values, or a time x symbols panel of them
+        
+    Returns
+    -------
+    np.ndarray
+        1 for a value different from the previous one (NaN included), the
+        length of the run so far otherwise
+    """
+    
+    data = np.asarray(data)
+    same = np.zeros(data.shape, dtype=bool)
+    same[1:] = data[1:] == data[:-1]
+    
+    steps = np.arange(data.shape[0]).reshape((-1,) + (1,) * (data.ndim - 1))
+    run_start = np.maximum.accumulate(np.where(same, 0, steps), axis=0)
+    
+    return steps - run_start + 1
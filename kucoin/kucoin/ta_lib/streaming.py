@@ -0,0 +1,489 @@
+"""Incremental calculation of technical indicators, one candle at a time
+
+The indicators of ta_lib.engine are calculated again over the whole history
+on every run. This script keeps, for every symbol, the state needed to
+update them in constant time when a new candle closes: running mean and
+variance for the SMA and Bollinger Bands, monotonic deques for the rolling
+highs and lows of the ichimoku lines, and the smoothed averages of the RSI.
+The state of every symbol can be saved and loaded back, so a long running
+process can resume where it stopped.
+
+The values are the ones of ta_lib.engine on the last candle of the symbol
+(the Chikou Span looks into the future and is not part of them).
+
+This file can be imported as a module and contains the following:
+
+    * RollingStats - Mean and standard deviation of the last candles
+    * RollingExtreme - Highest or lowest value of the last candles
+    * Lag - Value of a number of candles ago
+    * StochRSI - Stochastic RSI, updated one close at a time
+    * SymbolIndicators - State of all the indicators of one symbol
+    * StreamingIndicators - State of the indicators of every symbol
+
+"""
+
+import json
+import math
+from collections import deque
+import pandas as pd
+
+
+class Streaming:
+    """Base of the incremental indicators, saves and loads their state"""
+
+    params: tuple = ()
+
+    def to_dict(self) -> dict:
+        """
+        State of the indicator
+
+        Returns
+        -------
+        dict
+            JSON serializable state, loaded back with from_dict
+        """
+
+        state = {}
+        for name, value in vars(self).items():
+            if isinstance(value, Streaming):
+                value = value.to_dict()
+            elif isinstance(value, deque):
+                value = [list(item) if isinstance(item, tuple) else item for item in value]
+            state[name] = value
+        return state
+
+    @classmethod
+    def from_dict(cls, state: dict):
+        """
+        Indicator with the given state
+
+        Parameters
+        ----------
+        state : dict
+            State returned by to_dict
+
+        Returns
+        -------
+        Streaming
+            The indicator, as it was when the state was taken
+        """
+
+        indicator = cls(**{name: state[name] for name in cls.params})
+        for name, value in state.items():
+            current = getattr(indicator, name)
+            if isinstance(current, Streaming):
+                value = type(current).from_dict(value)
+            elif isinstance(current, deque):
+                value = deque([tuple(item) if isinstance(item, list) else item for item in value],
+                              maxlen=current.maxlen)
+            setattr(indicator, name, value)
+        return indicator
+
+
+class RollingStats(Streaming):
+    """
+    Mean and standard deviation of the last candles
+
+    The mean and the sum of squared deviations are updated when a value
+    enters and leaves the window (Welford), like rolling(period).mean() and
+    .std() they are NaN while the window holds a NaN or is not full.
+
+    Attributes
+    ----------
+    period : int
+        Number of candles of the window
+    """
+
+    params = ('period',)
+
+    def __init__(self, period: int):
+        self.period = period
+        self.values = deque(maxlen=period)
+        self.count = 0
+        self.average = 0.0
+        self.m2 = 0.0
+
+    def update(self, value: float):
+        """
+        Adds the value of a new candle
+
+        Parameters
+        ----------
+        value : float
+            The value of the candle
+        """
+
+        if len(self.values) == self.period:
+            self.remove(self.values[0])
+        self.values.append(value)
+        if not math.isnan(value):
+            self.count += 1
+            delta = value - self.average
+            self.average += delta / self.count
+            self.m2 += delta * (value - self.average)
+
+    def remove(self, value: float):
+        if math.isnan(value):
+            return
+        if self.count == 1:
+            self.count = 0
+            self.average = 0.0
+            self.m2 = 0.0
+        else:
+            self.count -= 1
+            delta = value - self.average
+            self.average -= delta / self.count
+            self.m2 -= delta * (value - self.average)
+
+    @property
+    def ready(self) -> bool:
+        return self.count == self.period
+
+    @property
+    def mean(self) -> float:
+        return self.average if self.ready else math.nan
+
+    @property
+    def std(self) -> float:
+        if not self.ready or self.period < 2:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.period - 1))
+
+
+class RollingExtreme(Streaming):
+    """
+    Highest or lowest value of the last candles
+
+    A monotonic deque keeps the candles that can still become the extreme,
+    so every update is constant time on average. Like rolling(period).max()
+    and .min() the extreme is NaN while the window holds a NaN or is not full.
+
+    Attributes
+    ----------
+    period : int
+        Number of candles of the window
+    how : str
+        max or min
+    """
+
+    params = ('period', 'how')
+
+    def __init__(self, period: int, how: str ='max'):
+        self.period = period
+        self.how = how
+        self.index = -1
+        self.candidates = deque()
+        self.last_nan = -period
+
+    def update(self, value: float):
+        """
+        Adds the value of a new candle
+
+        Parameters
+        ----------
+        value : float
+            The value of the candle
+        """
+
+        self.index += 1
+        if math.isnan(value):
+            self.last_nan = self.index
+        else:
+            while self.candidates and (self.candidates[-1][1] <= value if self.how == 'max'
+                                       else self.candidates[-1][1] >= value):
+                self.candidates.pop()
+            self.candidates.append((self.index, value))
+        while self.candidates and self.candidates[0][0] <= self.index - self.period:
+            self.candidates.popleft()
+
+    @property
+    def value(self) -> float:
+        if self.index < self.period - 1 or self.last_nan > self.index - self.period or not self.candidates:
+            return math.nan
+        return self.candidates[0][1]
+
+
+class Lag(Streaming):
+    """
+    Value of a number of candles ago, like shift(periods)
+
+    Attributes
+    ----------
+    periods : int
+        Number of candles
+    """
+
+    params = ('periods',)
+
+    def __init__(self, periods: int):
+        self.periods = periods
+        self.values = deque(maxlen=periods + 1)
+
+    def update(self, value: float):
+        self.values.append(value)
+
+    @property
+    def value(self) -> float:
+        return self.values[0] if len(self.values) == self.periods + 1 else math.nan
+
+
+class StochRSI(Streaming):
+    """
+    Stochastic RSI, updated one close at a time like engine.stoch_rsi
+
+    The first averages of the ups and downs are the mean of the first
+    `period` moves, they are smoothed from there with alpha = 1 / period.
+
+    Attributes
+    ----------
+    period : int
+        Number of periods of the RSI and of the Stochastic RSI
+    k_period : int
+        Number of periods of the Stochastic RSI K
+    d_period : int
+        Number of periods of the Stochastic RSI D
+    """
+
+    params = ('period', 'k_period', 'd_period')
+
+    def __init__(self, period: int =14, k_period: int =3, d_period: int =3):
+        self.period = period
+        self.k_period = k_period
+        self.d_period = d_period
+        self.close = math.nan
+        self.moves = 0
+        self.ups = 0.0
+        self.downs = 0.0
+        self.lowest = RollingExtreme(period, 'min')
+        self.highest = RollingExtreme(period, 'max')
+        self.k = RollingStats(k_period)
+        self.d = RollingStats(d_period)
+        self.stoch = math.nan
+        self.stoch_k = math.nan
+        self.stoch_d = math.nan
+
+    def update(self, close: float):
+        """
+        Adds the close of a new candle
+
+        Parameters
+        ----------
+        close : float
+            The close of the candle
+        """
+
+        rsi = math.nan
+        if not math.isnan(self.close):
+            delta = close - self.close
+            up, down = max(delta, 0.0), max(-delta, 0.0)
+            self.moves += 1
+            if self.moves <= self.period:
+                # Sums of the first moves, their mean starts the smoothing
+                self.ups += up
+                self.downs += down
+                if self.moves == self.period:
+                    self.ups /= self.period
+                    self.downs /= self.period
+            else:
+                alpha = 1 / self.period
+                self.ups = (1 - alpha) * self.ups + alpha * up
+                self.downs = (1 - alpha) * self.downs + alpha * down
+            if self.moves >= self.period:
+                rsi = 100 - 100 / (1 + self.ups / self.downs) if self.downs else \
+                    (math.nan if not self.ups else 100.0)
+        self.close = close
+
+        self.lowest.update(rsi)
+        self.highest.update(rsi)
+        lowest, highest = self.lowest.value, self.highest.value
+        # A flat window gives 0 / 0, NaN like in engine.stoch_rsi
+        self.stoch = (rsi - lowest) / (highest - lowest) if highest != lowest else math.nan
+        self.k.update(self.stoch)
+        self.stoch_k = self.k.mean * 100
+        self.d.update(self.stoch_k)
+        self.stoch_d = self.d.mean * 100
+
+
+class SymbolIndicators(Streaming):
+    """
+    State of all the indicators of one symbol, with the parameters used by
+    the strategies
+
+    Attributes
+    ----------
+    time : int
+        Time of the last candle added
+    """
+
+    def __init__(self):
+        self.time = None
+        self.sma_close = RollingStats(25)
+        self.sma_open = RollingStats(25)
+        self.bollinger = RollingStats(20)
+        self.tenkan_high = RollingExtreme(20, 'max')
+        self.tenkan_low = RollingExtreme(20, 'min')
+        self.kinjun_high = RollingExtreme(60, 'max')
+        self.kinjun_low = RollingExtreme(60, 'min')
+        self.span_b_high = RollingExtreme(120, 'max')
+        self.span_b_low = RollingExtreme(120, 'min')
+        self.senkou_span_a = Lag(30)
+        self.senkou_span_b = Lag(30)
+        self.stoch_rsi = StochRSI(14, 3, 3)
+
+    def update(self, candle) -> bool:
+        """
+        Adds a new closed candle
+
+        Parameters
+        ----------
+        candle : dict or pd.Series
+            Candle with its time, open, close, high and low
+
+        Returns
+        -------
+        bool
+            False if the candle is not newer than the last one added, it is
+            then ignored
+        """
+
+        time = int(candle['time'])
+        if self.time is not None and time <= self.time:
+            return False
+        self.time = time
+
+        high, low, close = float(candle['high']), float(candle['low']), float(candle['close'])
+        self.sma_close.update(close)
+        self.sma_open.update(float(candle['open']))
+        self.bollinger.update(close)
+        for extreme in (self.tenkan_high, self.kinjun_high, self.span_b_high):
+            extreme.update(high)
+        for extreme in (self.tenkan_low, self.kinjun_low, self.span_b_low):
+            extreme.update(low)
+        self.senkou_span_a.update((self.tenkan_sen + self.kinjun_sen) / 2)
+        self.senkou_span_b.update((self.span_b_high.value + self.span_b_low.value) / 2)
+        self.stoch_rsi.update(close)
+        return True
+
+    @property
+    def tenkan_sen(self) -> float:
+        return (self.tenkan_high.value + self.tenkan_low.value) / 2
+
+    @property
+    def kinjun_sen(self) -> float:
+        return (self.kinjun_high.value + self.kinjun_low.value) / 2
+
+    def values(self) -> dict:
+        """
+        Value of the indicators on the last candle, named like the columns
+        the strategies add
+
+        Returns
+        -------
+        dict
+            Indicator name to value
+        """
+
+        return {'sma_25': self.sma_close.mean, 'pandas_SMA_25': self.sma_open.mean,
+                'tenkan_sen': self.tenkan_sen, 'kinjun_sen': self.kinjun_sen,
+                'senkou_span_a': self.senkou_span_a.value, 'senkou_span_b': self.senkou_span_b.value,
+                'bb_middle': self.bollinger.mean, 'bb_std': self.bollinger.std,
+                'stoch_rsi': self.stoch_rsi.stoch, 'stoch_rsi_k': self.stoch_rsi.stoch_k,
+                'stoch_rsi_d': self.stoch_rsi.stoch_d}
+
+
+class StreamingIndicators:
+    """
+    State of the indicators of every symbol of a timeframe
+
+    Attributes
+    ----------
+    symbols : dict
+        Symbol to SymbolIndicators
+    """
+
+    def __init__(self):
+        self.symbols = {}
+
+    def update(self, symbol: str, candle) -> dict:
+        """
+        Adds a new closed candle of a symbol
+
+        Parameters
+        ----------
+        symbol : str
+            The symbol of the candle
+        candle : dict or pd.Series
+            Candle with its time, open, close, high and low
+
+        Returns
+        -------
+        dict
+            Value of the indicators of the symbol after the candle
+        """
+
+        state = self.symbols.setdefault(symbol, SymbolIndicators())
+        state.update(candle)
+        return state.values()
+
+    def warm_up(self, data: pd.DataFrame):
+        """
+        Adds every candle of a dataframe, the ones already added are skipped
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Candles of all symbols, in chronological order for every symbol
+        """
+
+        columns = ['symbol', 'time', 'open', 'close', 'high', 'low']
+        for symbol, time, open_, close, high, low in data[columns].itertuples(index=False, name=None):
+            self.symbols.setdefault(symbol, SymbolIndicators()).update(
+                {'time': time, 'open': open_, 'close': close, 'high': high, 'low': low})
+
+    def values(self) -> pd.DataFrame:
+        """
+        Value of the indicators of every symbol on its last candle
+
+        Returns
+        -------
+        pd.DataFrame
+            One row per symbol, indexed by symbol
+        """
+
+        return pd.DataFrame.from_dict({symbol: state.values() for symbol, state in self.symbols.items()},
+                                      orient='index')
+
+    def save(self, path: str):
+        """
+        Writes the state of every symbol to a JSON file
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        """
+
+        with open(path, 'w') as file:
+            json.dump({symbol: state.to_dict() for symbol, state in self.symbols.items()}, file)
+
+    @classmethod
+    def load(cls, path: str):
+        """
+        Reads the state of every symbol back from a JSON file
+
+        Parameters
+        ----------
+        path : str
+            Path of the file written by save
+
+        Returns
+        -------
+        StreamingIndicators
+            The indicators as they were when saved
+        """
+
+        indicators = cls()
+        with open(path) as file:
+            indicators.symbols = {symbol: SymbolIndicators.from_dict(state)
+                                  for symbol, state in json.load(file).items()}
+        return indicators